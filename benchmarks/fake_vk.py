@@ -0,0 +1,390 @@
+"""
+Локальная заглушка VK API для нагрузочных тестов и замеров задержек
+
+Поддерживает long poll сервер бота и методы users.search, users.get,
+photos.get, groups.get, messages.send, groups.getLongPollServer и execute.
+Задержка ответа, доля ошибок 6 (слишком много запросов) и размер
+синтетической базы пользователей настраиваются.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+VK_API_HOST = "https://api.vk.com"
+
+FIRST_NAMES = {
+    1: ["Анна", "Мария", "Екатерина", "Ольга", "Дарья", "Алиса", "Полина"],
+    2: ["Иван", "Алексей", "Дмитрий", "Сергей", "Максим", "Артем", "Никита"],
+}
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов"]
+INTERESTS = ["музыка", "путешествия", "книги", "спорт", "кино", "фотография", "программирование",
+             "йога", "походы", "кулинария", "танцы", "рисование", "шахматы", "театр"]
+MUSIC = ["рок", "джаз", "классика", "рэп", "поп", "инди", "электроника", "метал"]
+BOOKS = ["фантастика", "детективы", "классика", "фэнтези", "поэзия", "психология", "история"]
+CITIES = [(1, "Москва"), (2, "Санкт-Петербург"), (49, "Екатеринбург"), (99, "Новосибирск")]
+
+
+class SyntheticPopulation:
+    """Синтетическая база пользователей VK с фотографиями и группами"""
+
+    def __init__(self, size: int = 1000, seed: int = 42, first_id: int = 1000000):
+        rnd = random.Random(seed)
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.photos: Dict[int, List[Dict[str, Any]]] = {}
+        self.groups: Dict[int, List[int]] = {}
+
+        for user_id in range(first_id, first_id + size):
+            sex = rnd.choice((1, 2))
+            city_id, city_title = rnd.choice(CITIES)
+            user = {
+                "id": user_id,
+                "first_name": rnd.choice(FIRST_NAMES[sex]),
+                "last_name": rnd.choice(LAST_NAMES) + ("а" if sex == 1 else ""),
+                "domain": f"id{user_id}",
+                "sex": sex,
+                "bdate": f"{rnd.randint(1, 28)}.{rnd.randint(1, 12)}.{rnd.randint(1965, 2005)}",
+                "city": {"id": city_id, "title": city_title},
+                "interests": ", ".join(rnd.sample(INTERESTS, rnd.randint(0, 5))),
+                "music": ", ".join(rnd.sample(MUSIC, rnd.randint(0, 3))),
+                "books": ", ".join(rnd.sample(BOOKS, rnd.randint(0, 3))),
+                "is_closed": rnd.random() < 0.2,
+                "can_access_closed": True,
+            }
+            # Часть анкет без даты рождения или только с днем и месяцем, как в реальном VK
+            if rnd.random() < 0.1:
+                user.pop("bdate")
+            elif rnd.random() < 0.1:
+                user["bdate"] = user["bdate"].rsplit(".", 1)[0]
+            self.users[user_id] = user
+
+            self.photos[user_id] = [
+                {
+                    "id": photo_id,
+                    "owner_id": user_id,
+                    "likes": {"count": int(rnd.paretovariate(1.2) * 5)},
+                    "sizes": [{"type": "x", "width": 604, "height": 604,
+                               "url": f"https://example.invalid/{user_id}_{photo_id}.jpg"}],
+                }
+                for photo_id in range(1, rnd.randint(1, 8) + 1)
+            ]
+            # Подписки с тяжелым хвостом: большинство на десятки групп, некоторые на сотни
+            self.groups[user_id] = sorted(rnd.sample(range(1, 20000), min(int(rnd.paretovariate(1.1) * 20), 1000)))
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Аналог users.search по полу, городу и возрасту"""
+        now_year = datetime.now().year
+        sex = int(params.get("sex", 0) or 0)
+        city = int(params.get("city", 0) or 0)
+        age_from = int(params.get("age_from", 0) or 0)
+        age_to = int(params.get("age_to", 200) or 200)
+        count = min(int(params.get("count", 20)), 1000)
+        offset = int(params.get("offset", 0) or 0)
+
+        items = []
+        for user in self.users.values():
+            if sex and user["sex"] != sex:
+                continue
+            if city and user["city"]["id"] != city:
+                continue
+            parts = user.get("bdate", "").split(".")
+            if (age_from or age_to < 200) and len(parts) == 3:
+                if not age_from <= now_year - int(parts[2]) <= age_to:
+                    continue
+            items.append(user)
+        return {"count": len(items), "items": items[offset:offset + count]}
+
+
+class FakeVKServer:
+    """
+    HTTP сервер, отвечающий как api.vk.com и long poll сервер сообщества
+
+    Args:
+        population: синтетическая база пользователей
+        latency: базовая задержка ответа метода API в секундах
+        jitter: случайная добавка к задержке (равномерно от 0 до jitter)
+        error_rate: доля вызовов, на которые возвращается ошибка 6
+        rps_limit: лимит запросов в секунду на токен (0 - без лимита)
+    """
+
+    def __init__(self,
+                 population: Optional[SyntheticPopulation] = None,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 rps_limit: int = 0,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.population = population or SyntheticPopulation()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rps_limit = rps_limit
+
+        self.stats: Dict[str, int] = {}
+        self.sent_messages: List[Dict[str, Any]] = []
+        self.message_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+        self._lock = threading.Lock()
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_ready = threading.Condition(self._lock)
+        self._calls_changed = threading.Condition(self._lock)
+        self._calls_by_token: Dict[str, List[float]] = {}
+        self._message_id = 0
+        self._random = random.Random()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "users.get": self._users_get,
+            "users.search": self._users_search,
+            "photos.get": self._photos_get,
+            "groups.get": self._groups_get,
+            "groups.getLongPollServer": self._get_longpoll_server,
+            "messages.send": self._messages_send,
+            "messages.sendMessageEventAnswer": lambda params: 1,
+            "messages.edit": lambda params: 1,
+            "execute": self._execute,
+        }
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeVKServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-vk", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._updates_ready.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # === События long poll ===
+    def wait_for_call(self, method: str, count: int = 1, timeout: Optional[float] = None) -> bool:
+        """Ждет, пока метод будет вызван count раз ("longpoll" - запрос к long poll серверу)"""
+        with self._lock:
+            return self._calls_changed.wait_for(lambda: self.stats.get(method, 0) >= count, timeout)
+
+    def _count_call(self, method: str):
+        """Вызывается под self._lock"""
+        self.stats[method] = self.stats.get(method, 0) + 1
+        self._calls_changed.notify_all()
+
+    def push_message(self, peer_id: int, text: str, payload: Optional[Dict] = None):
+        """Имитирует входящее сообщение пользователя боту"""
+        message = {
+            "date": int(time.time()),
+            "from_id": peer_id,
+            "peer_id": peer_id,
+            "id": 0,
+            "text": text,
+            "payload": json.dumps(payload) if payload else None,
+        }
+        self.push_update({"type": "message_new", "object": {"message": message, "client_info": {
+            "button_actions": ["text", "callback"], "keyboard": True, "inline_keyboard": True,
+            "carousel": True, "lang_id": 0}}})
+
+    def push_callback(self, peer_id: int, payload: Dict[str, Any]):
+        """Имитирует нажатие callback кнопки"""
+        self.push_update({"type": "message_event", "object": {
+            "user_id": peer_id,
+            "peer_id": peer_id,
+            "event_id": f"{peer_id:x}{self._random.getrandbits(32):08x}",
+            "payload": payload,
+            "conversation_message_id": 1,
+        }})
+
+    def push_update(self, update: Dict[str, Any]):
+        update.setdefault("group_id", 1)
+        update.setdefault("event_id", f"{self._random.getrandbits(64):016x}")
+        with self._lock:
+            self._updates.append(update)
+            self._updates_ready.notify_all()
+
+    # === Методы API ===
+    def _users_get(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ids = [int(user_id) for user_id in str(params.get("user_ids", "")).split(",") if user_id]
+        return [self.population.users[user_id] for user_id in ids if user_id in self.population.users] or [
+            {"id": user_id, "first_name": "Тест", "last_name": "Пользователь", "domain": f"id{user_id}",
+             "sex": 2, "bdate": "1.1.1990", "city": {"id": CITIES[0][0], "title": CITIES[0][1]}}
+            for user_id in ids
+        ]
+
+    def _users_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.population.search(params)
+
+    def _photos_get(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        photos = self.population.photos.get(int(params.get("owner_id", 0)), [])
+        return {"count": len(photos), "items": photos}
+
+    def _groups_get(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        groups = self.population.groups.get(int(params.get("user_id", 0)), [])
+        count = int(params.get("count", 1000))
+        offset = int(params.get("offset", 0))
+        return {"count": len(groups), "items": groups[offset:offset + count]}
+
+    def _get_longpoll_server(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            ts = len(self._updates)
+        return {"key": "fake", "server": f"{self.base_url}/longpoll", "ts": str(ts)}
+
+    def _messages_send(self, params: Dict[str, Any]) -> Any:
+        peer_ids = params.get("peer_ids") or params.get("peer_id") or params.get("user_id")
+        recipients = [int(peer_id) for peer_id in str(peer_ids).split(",") if peer_id]
+        now = time.perf_counter()
+        responses = []
+
+        for peer_id in recipients:
+            with self._lock:
+                self._message_id += 1
+                message = {
+                    "peer_id": peer_id,
+                    "message_id": self._message_id,
+                    "random_id": params.get("random_id"),
+                    "message": params.get("message", ""),
+                    "template": params.get("template"),
+                    "received_at": now,
+                }
+                self.sent_messages.append(message)
+            for listener in self.message_listeners:
+                listener(message)
+            responses.append({"peer_id": peer_id, "message_id": message["message_id"]})
+
+        return responses if "peer_ids" in params else responses[0]["message_id"]
+
+    def _execute(self, params: Dict[str, Any]) -> List[Any]:
+        """
+        Упрощенный execute: выполняет вызовы вида API.method({...}) по порядку
+
+        Аргументы должны быть записаны в JSON-совместимом виде, что
+        соответствует коду, который бот генерирует для пакетных запросов.
+        """
+        results = []
+        for method, raw_args in re.findall(r"API\.([\w.]+)\((\{.*?\})\)", params.get("code", ""), re.S):
+            handler = self.methods.get(method)
+            results.append(handler(json.loads(raw_args)) if handler else False)
+        return results
+
+    # === HTTP ===
+    def _dispatch(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._count_call(method)
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if self._is_rate_limited(params.get("access_token", "")) or self._random.random() < self.error_rate:
+            with self._lock:
+                self.stats["error_6"] = self.stats.get("error_6", 0) + 1
+            return {"error": {"error_code": 6, "error_msg": "Too many requests per second",
+                              "request_params": [{"key": "method", "value": method}]}}
+
+        handler = self.methods.get(method)
+        if handler is None:
+            return {"error": {"error_code": 3, "error_msg": f"Unknown method passed: {method}"}}
+        return {"response": handler(params)}
+
+    def _is_rate_limited(self, token: str) -> bool:
+        if not self.rps_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            calls = [t for t in self._calls_by_token.get(token, []) if now - t < 1.0]
+            limited = len(calls) >= self.rps_limit
+            if not limited:
+                calls.append(now)
+            self._calls_by_token[token] = calls
+        return limited
+
+    def _longpoll(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ts = int(params.get("ts", 0))
+        wait = min(float(params.get("wait", 25)), 25)
+        deadline = time.monotonic() + wait
+
+        with self._lock:
+            self._count_call("longpoll")
+            while len(self._updates) <= ts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread or not self._thread.is_alive():
+                    break
+                self._updates_ready.wait(remaining)
+            updates = self._updates[ts:]
+            return {"ts": str(ts + len(updates)), "updates": updates}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _params(self) -> Dict[str, Any]:
+                parsed = urlparse(self.path)
+                params = dict(parse_qsl(parsed.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    params.update(parse_qsl(self.rfile.read(length).decode("utf-8")))
+                return params
+
+            def _reply(self, data: Dict[str, Any]):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                path = urlparse(self.path).path
+                params = self._params()
+                if path == "/longpoll":
+                    self._reply(server._longpoll(params))
+                elif path.startswith("/method/"):
+                    self._reply(server._dispatch(path[len("/method/"):], params))
+                else:
+                    self.send_error(404)
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """Транспорт requests, перенаправляющий запросы api.vk.com на локальный сервер"""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(VK_API_HOST):]
+        return super().send(request, **kwargs)
+
+
+def redirect_session(session: requests.Session, base_url: str):
+    """Направляет все вызовы api.vk.com из сессии requests на заглушку"""
+    session.mount(VK_API_HOST + "/", _RedirectAdapter(base_url))
@@ -0,0 +1,220 @@
+"""
+Нагрузочный прогон DatingBot против локальной заглушки VK API
+
+Запускает FakeVKServer, поднимает бота с перенаправленными на заглушку
+сессиями и имитирует N пользователей, каждый из которых отправляет
+команды и ждет ответа. Задержка считается от публикации события в
+long poll до получения заглушкой messages.send для этого пользователя.
+Ошибки, записанные ботом в лог за прогон (например, недоступная база
+при команде "найти"), попадают в отчет в поле errors: без них сообщение
+без ответа видно только как таймаут.
+
+Пример:
+    python -m benchmarks.load --chatters 20 --messages 10 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_vk import FakeVKServer, SyntheticPopulation, redirect_session
+
+FAKE_TOKEN = "x" * 85
+FIRST_CHATTER_ID = 500000000
+
+
+def _prepare_environment():
+    """Настройки бота по умолчанию, если .env для прогона не задан"""
+    defaults = {
+        "POSTGRES_DB": "dating_bot_bench",
+        "POSTGRES_USER": "postgres",
+        "POSTGRES_PASSWORD": "postgres",
+        "VK_GROUP_TOKEN": FAKE_TOKEN,
+        "VK_USER_TOKEN": FAKE_TOKEN,
+        "VK_GROUP_ID": "1",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ErrorCollector(logging.Handler):
+    """Подсчет ошибок из лога бота по тексту исключения"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.errors: Counter = Counter()
+
+    def emit(self, record: logging.LogRecord):
+        error = record.exc_info[1] if record.exc_info else None
+        if error is not None:
+            lines = str(error).strip().splitlines()
+            text = f"{type(error).__name__}: {lines[0] if lines else ''}"
+        else:
+            text = record.getMessage()
+        self.errors[text[:200]] += 1
+
+
+class Chatter(threading.Thread):
+    """Имитация пользователя: отправляет команду и ждет ответ перед следующей"""
+
+    def __init__(self, server: FakeVKServer, peer_id: int, commands: List[str], messages: int, timeout: float):
+        super().__init__(name=f"chatter-{peer_id}", daemon=True)
+        self.server = server
+        self.peer_id = peer_id
+        self.commands = commands
+        self.messages = messages
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.timeouts = 0
+        self._reply = threading.Event()
+        self._reply_at = 0.0
+
+    def on_message(self, message: Dict[str, Any]):
+        if message["peer_id"] == self.peer_id and not self._reply.is_set():
+            self._reply_at = message["received_at"]
+            self._reply.set()
+
+    def run(self):
+        for i in range(self.messages):
+            self._reply.clear()
+            sent_at = time.perf_counter()
+            self.server.push_message(self.peer_id, self.commands[i % len(self.commands)])
+            if self._reply.wait(self.timeout):
+                self.latencies.append(self._reply_at - sent_at)
+            else:
+                self.timeouts += 1
+
+
+def run_benchmark(chatters: int = 10,
+                  messages: int = 10,
+                  commands: Optional[List[str]] = None,
+                  latency: float = 0.0,
+                  jitter: float = 0.0,
+                  error_rate: float = 0.0,
+                  rps_limit: int = 0,
+                  population: int = 1000,
+                  timeout: float = 10.0,
+                  client_throttle: bool = True) -> Dict[str, Any]:
+    """
+    Прогон нагрузки и сбор метрик
+
+    Returns:
+        Словарь с перцентилями задержки (в миллисекундах), пропускной
+        способностью, ошибками из лога бота и статистикой вызовов заглушки
+    """
+    _prepare_environment()
+    from core.bot_core import DatingBot
+
+    commands = commands or ["начать", "помощь"]
+    collector = ErrorCollector()
+    logging.getLogger().addHandler(collector)
+    server = FakeVKServer(
+        population=SyntheticPopulation(size=population),
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        rps_limit=rps_limit,
+    ).start()
+
+    try:
+        bot = DatingBot()
+        for client in (bot.vk, bot.user_vk):
+            redirect_session(client.session.http, server.base_url)
+            if not client_throttle:
+                client.session.RPS_DELAY = 0
+
+        threading.Thread(target=bot.run, name="dating-bot", daemon=True).start()
+        # События, опубликованные до первого запроса к long poll, бот не увидит
+        if not server.wait_for_call("longpoll", timeout=timeout):
+            raise RuntimeError("Bot did not connect to long poll server")
+
+        workers = [
+            Chatter(server, FIRST_CHATTER_ID + i, commands, messages, timeout)
+            for i in range(chatters)
+        ]
+        for worker in workers:
+            server.message_listeners.append(worker.on_message)
+
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+    finally:
+        server.stop()
+        logging.getLogger().removeHandler(collector)
+
+    latencies = [value for worker in workers for value in worker.latencies]
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "chatters": chatters,
+        "messages_per_chatter": messages,
+        "commands": commands,
+        "completed": len(latencies),
+        "timeouts": sum(worker.timeouts for worker in workers),
+        "elapsed_sec": round(elapsed, 3),
+        "events_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 50)),
+            "p95": to_ms(percentile(latencies, 95)),
+            "p99": to_ms(percentile(latencies, 99)),
+            "max": to_ms(max(latencies) if latencies else None),
+        },
+        "errors": dict(collector.errors.most_common()),
+        "api_calls": dict(server.stats),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против заглушки VK API")
+    parser.add_argument("--chatters", type=int, default=10, help="количество одновременных пользователей")
+    parser.add_argument("--messages", type=int, default=10, help="сообщений от каждого пользователя")
+    parser.add_argument("--commands", default="начать,помощь", help="команды через запятую, по кругу")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов с ошибкой 6")
+    parser.add_argument("--rps-limit", type=int, default=0, help="лимит запросов в секунду на токен")
+    parser.add_argument("--population", type=int, default=1000, help="размер синтетической базы")
+    parser.add_argument("--timeout", type=float, default=10.0, help="ожидание ответа на сообщение, сек")
+    parser.add_argument("--no-client-throttle", action="store_true",
+                        help="отключить задержку vk_api между запросами (3 rps)")
+    parser.add_argument("--output", help="сохранить результат в JSON файл")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        chatters=args.chatters,
+        messages=args.messages,
+        commands=[command.strip() for command in args.commands.split(",") if command.strip()],
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rps_limit=args.rps_limit,
+        population=args.population,
+        timeout=args.timeout,
+        client_throttle=not args.no_client_throttle,
+    )
+
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Время запуска бота: от старта процесса до ответа на первое событие
+
+Родительский процесс поднимает FakeVKServer и запускает бота в отдельном
+интерпретаторе (как `python bot.py`, но с сессиями, перенаправленными на
+заглушку). Замеряются:
+- ready_ms: от запуска процесса до первого запроса к long poll серверу;
+- first_event_ms: от запуска процесса до messages.send в ответ на
+  первое сообщение, опубликованное сразу после подключения к long poll.
+
+При превышении бюджета (--budget, по медиане first_event_ms) процесс
+завершается с кодом 1, поэтому прогон можно использовать как проверку
+в CI. С --importtime выводятся самые медленные импорты процесса бота.
+
+Пример:
+    python -m benchmarks.startup --runs 5 --budget 2.0 --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_vk import FakeVKServer, redirect_session
+from benchmarks.load import FIRST_CHATTER_ID, _prepare_environment
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_child(base_url: str):
+    """Процесс бота: импорт точки входа и запуск long poll на заглушке"""
+    _prepare_environment()
+    import bot as entry_point
+
+    bot = entry_point.DatingBot()
+    for client in (bot.vk, bot.user_vk):
+        redirect_session(client.session.http, base_url)
+    bot.run()
+
+
+def parse_importtime(stderr: str, top: int = 10) -> List[Tuple[str, float]]:
+    """Самые медленные модули по собственному времени импорта (-X importtime), мс"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, _cumulative, name = line[len("import time:"):].split("|", 2)
+            modules.append((name.strip(), int(self_us) / 1000))
+        except ValueError:
+            continue
+    return sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure_once(timeout: float = 30.0, importtime: bool = False) -> Dict[str, Any]:
+    """Один запуск процесса бота"""
+    _prepare_environment()
+    replied = threading.Event()
+    replied_at = [0.0]
+
+    def on_message(message: Dict[str, Any]):
+        if message["peer_id"] == FIRST_CHATTER_ID and not replied.is_set():
+            replied_at[0] = message["received_at"]
+            replied.set()
+
+    server = FakeVKServer().start()
+    server.message_listeners.append(on_message)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [
+        "-m", "benchmarks.startup", "--child", server.base_url
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, stderr=subprocess.PIPE, text=True)
+    # stderr читается в отдельном потоке, чтобы переполненный pipe не остановил бота
+    stderr_lines: List[str] = []
+    reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    reader.start()
+    try:
+        if not server.wait_for_call("longpoll", timeout=timeout):
+            raise RuntimeError("Bot did not connect to long poll server")
+        ready_at = time.perf_counter()
+        server.push_message(FIRST_CHATTER_ID, "помощь")
+        if not replied.wait(timeout):
+            raise RuntimeError("Bot did not reply to the first event")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        reader.join(timeout)
+        server.stop()
+
+    result = {
+        "ready_ms": round((ready_at - started) * 1000, 1),
+        "first_event_ms": round((replied_at[0] - started) * 1000, 1),
+    }
+    if importtime:
+        result["slowest_imports_ms"] = parse_importtime("".join(stderr_lines))
+    return result
+
+
+def run_benchmark(runs: int = 3, timeout: float = 30.0, importtime: bool = False) -> Dict[str, Any]:
+    """
+    Несколько запусков подряд
+
+    Returns:
+        Словарь с медианой и максимумом ready_ms / first_event_ms и
+        результатами каждого запуска
+    """
+    samples = [measure_once(timeout, importtime and i == 0) for i in range(runs)]
+    result = {"runs": runs}
+    for key in ("ready_ms", "first_event_ms"):
+        values = [sample[key] for sample in samples]
+        result[key] = {"median": round(statistics.median(values), 1), "max": max(values)}
+    if importtime:
+        result["slowest_imports_ms"] = samples[0]["slowest_imports_ms"]
+    result["samples"] = [{key: sample[key] for key in ("ready_ms", "first_event_ms")} for sample in samples]
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Время запуска бота до ответа на первое событие")
+    parser.add_argument("--runs", type=int, default=3, help="количество запусков")
+    parser.add_argument("--timeout", type=float, default=30.0, help="ожидание запуска и ответа, сек")
+    parser.add_argument("--budget", type=float, help="допустимая медиана first_event, сек")
+    parser.add_argument("--importtime", action="store_true", help="показать самые медленные импорты")
+    parser.add_argument("--output", help="сохранить результат в JSON файл")
+    parser.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _run_child(args.child)
+        return
+
+    result = run_benchmark(runs=args.runs, timeout=args.timeout, importtime=args.importtime)
+    if args.budget is not None:
+        result["budget_ms"] = args.budget * 1000
+        result["within_budget"] = result["first_event_ms"]["median"] <= result["budget_ms"]
+
+    report = json.dumps(result, ensure_ascii=False, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    if args.budget is not None and not result["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
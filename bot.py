@@ -1,15 +1,88 @@
+import os
+import signal
+import sys
+from typing import Optional
+
 from core.bot_core import DatingBot
 from core.db.connector import Database
+from core.db.counters import CounterReconciliation
+from core.db.migrations import backfill_seen_profiles
+from core.db.retention import ViewHistoryRetention
+from core.metrics import start_metrics_server, MetricsDumper
+from core.profiling import profiler
+from core.sharding import WorkerSupervisor
+from core.vk_api.client import VKClient
+from config.settings import settings
+
+def start_observability(worker_id: Optional[int] = None) -> Optional[MetricsDumper]:
+    """
+    Метрики и профилировщик процесса
+
+    Реестр метрик и стеки у каждого процесса свои, поэтому в многопроцессном
+    режиме процесс-обработчик N отдает /metrics на METRICS_PORT + 1 + N,
+    пишет METRICS_DUMP_PATH.worker-N и сохраняет профили в PROFILE_DIR/worker-N.
+    Супервизор остается на METRICS_PORT (очереди обработчиков) и пересылает
+    SIGUSR1 обработчикам.
+    """
+    suffix = f"worker-{worker_id}" if worker_id is not None else None
+    if settings.METRICS_PORT:
+        start_metrics_server(settings.METRICS_PORT + (worker_id + 1 if suffix else 0))
+    dumper = None
+    if settings.METRICS_DUMP_PATH:
+        path = f"{settings.METRICS_DUMP_PATH}.{suffix}" if suffix else settings.METRICS_DUMP_PATH
+        dumper = MetricsDumper(path, settings.METRICS_DUMP_INTERVAL)
+        dumper.start()
+    profiler.output_dir = os.path.join(settings.PROFILE_DIR, suffix) if suffix else settings.PROFILE_DIR
+    profiler.interval = settings.PROFILE_INTERVAL_MS / 1000
+    profiler.install_signal_handler(settings.PROFILE_DURATION)
+    return dumper
+
+def run_supervisor():
+    """Прием событий в главном процессе и обработка в BOT_WORKERS процессах"""
+    # SIGTERM завершает прием событий так же, как Ctrl+C: с дообработкой очередей
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    supervisor = WorkerSupervisor(settings.BOT_WORKERS, shutdown_timeout=settings.WORKER_SHUTDOWN_TIMEOUT,
+                                  worker_init=start_observability)
+    supervisor.start()
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid супервизора> профилирует и его, и все процессы-обработчики
+        profiler.install_signal_handler(
+            settings.PROFILE_DURATION,
+            on_signal=lambda: supervisor.signal_workers(signal.SIGUSR1)
+        )
+    supervisor.run_longpoll(VKClient(settings.VK_GROUP_TOKEN).session, settings.VK_GROUP_ID)
 
 def main():
-    Database.initialize()
-    bot = DatingBot()
+    dumper = start_observability()
+    if settings.SEEN_PROFILES_BITMAP:
+        # До приема событий: поиск не должен читать еще не заполненные множества
+        backfill_seen_profiles()
+    retention = None
+    if settings.VIEW_HISTORY_RETENTION_DAYS:
+        retention = ViewHistoryRetention(settings.VIEW_HISTORY_RETENTION_DAYS, settings.VIEW_HISTORY_PURGE_INTERVAL,
+                                         rebuild_seen=settings.SEEN_PROFILES_BITMAP)
+        retention.start()
+    reconciliation = None
+    if settings.COUNTERS_RECONCILE_INTERVAL:
+        reconciliation = CounterReconciliation(settings.COUNTERS_RECONCILE_INTERVAL)
+        reconciliation.start()
     try:
-        bot.run()
-    except KeyboardInterrupt:
+        if settings.BOT_WORKERS > 1:
+            run_supervisor()
+        else:
+            Database.initialize()
+            DatingBot().run()
+    except (KeyboardInterrupt, SystemExit):
         print("Bot stopped")
     finally:
-        Database.close_all()
+        if dumper:
+            dumper.stop()
+        if retention:
+            retention.stop()
+        if reconciliation:
+            reconciliation.stop()
+        if Database._connection_pool:
+            Database.close_all()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
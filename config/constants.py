@@ -1,9 +1,18 @@
 class VkConstants:
     API_VERSION = "5.131"
     MAX_SEARCH_RESULTS = 1000
-    USER_FIELDS = "bdate,sex,city,interests,music,books,groups,domain,counters"
+    USER_FIELDS = "bdate,sex,city,interests,music,books,groups,domain,counters,photo_id"
     PHOTO_SIZES = ["photo_50", "photo_100", "photo_200"]
     SEARCH_DELAY = 0.34
+    MAX_MESSAGE_LENGTH = 4096
+    MAX_ATTACHMENTS = 10
+    MAX_PEER_IDS = 100
+    MAX_GROUPS = 1000
+    EXECUTE_BATCH_SIZE = 25
+    SEARCH_PAGE_SIZE = 100
+    MAX_SNACKBAR_LENGTH = 90
+    SEND_RETRIES = 3
+    SEND_BACKOFF = 0.5
 
 class DbConstants:
     TABLES = {
@@ -12,6 +21,11 @@ class DbConstants:
         'photo_likes': "photo_likes"
     }
     MAX_RETRIES = 3
+    EXPORT_BATCH_SIZE = 1000
+    PURGE_BATCH_SIZE = 5000
+    REPLICA_LAG_CHECK_INTERVAL = 5
+    REPLICA_RETRY_AFTER = 30
+    COUNTERS_BATCH_SIZE = 1000
 
 class BotConstants:
     AGE_RANGE = 5
@@ -24,13 +38,35 @@ class BotConstants:
         'interests': 0.2,
         'music': 0.1,
         'books': 0.1,
-        'groups': 0.1
+        'groups': 0.1,
+        'likes': 0.1,
+        'text': 0.1
     }
+    INTEREST_CACHE_SIZE = 10000
+    GROUP_CACHE_SIZE = 50000
+    GROUP_CACHE_TTL = 86400
+    MINHASH_PERMUTATIONS = 128  # Длина MinHash-сигнатуры групп, погрешность оценки ~0.09
+    PAGE_SIZE = 10
+    RANK_CHUNK_SIZE = 25
+    MAX_CONCURRENT_EVENTS = 64  # Событий в обработке одновременно, дальше прием ждет
+    SHORTLIST_SIZE = 30      # Кандидатов с лучшим предварительным рейтингом, для которых запрашиваются фото и группы
+    GOOD_COARSE_SCORE = 0.5  # Предварительный рейтинг, после SHORTLIST_SIZE таких кандидатов поиск останавливается
+    CAROUSEL_SIZE = 10
+    SEARCH_RESULTS_CACHE_SIZE = 10000
+    SEARCH_RESULTS_TTL = 3600
 
 class Messages:
     WELCOME = "Привет! Я бот для знакомств. Нажми 'Найти' чтобы начать."
     NO_MATCHES = "Не найдено подходящих пользователей."
+    SEARCH_RESULTS = "Подходящие анкеты {start}–{end} из {total}:"
     FAVORITE_ADDED = "Добавлено в избранное!"
+    FAVORITE_EXISTS = "Уже в избранном"
+    PHOTO_LIKED = "❤️ Лайк поставлен"
+    PHOTO_UNLIKED = "Лайк снят"
+    ACTION_CONFIRMED = "Действие подтверждено"
+    ACTION_REJECTED = "Действие отменено"
+    CALLBACK_ERROR = "Не удалось выполнить действие, попробуйте еще раз"
+    MUTUAL_MATCH = "У вас взаимная симпатия! 💞\nhttps://vk.com/id{user_id}"
     PROFILE_TEMPLATE = """{name}
 Возраст: {age}
 Город: {city}
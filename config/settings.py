@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field, PostgresDsn
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -12,6 +12,23 @@ class Settings(BaseSettings):
     VK_GROUP_TOKEN: str = Field(..., min_length=85)
     VK_GROUP_ID: int = Field(..., gt=0)
     VK_USER_TOKEN: Optional[str] = Field(None, min_length=85)
+    METRICS_PORT: Optional[int] = None
+    METRICS_DUMP_PATH: Optional[str] = None
+    METRICS_DUMP_INTERVAL: int = Field(60, gt=0)
+    ADMIN_IDS: List[int] = []
+    PROFILE_DIR: str = "profiles"
+    PROFILE_DURATION: int = Field(30, gt=0)
+    PROFILE_INTERVAL_MS: int = Field(5, gt=0)
+    BOT_WORKERS: int = Field(1, gt=0)
+    RANKING_WORKERS: int = Field(2, ge=0)  # Процессов ранжирования, 0 - ранжировать в цикле событий
+    WORKER_SHUTDOWN_TIMEOUT: int = Field(30, gt=0)
+    VIEW_HISTORY_RETENTION_DAYS: Optional[int] = Field(None, gt=0)
+    VIEW_HISTORY_PURGE_INTERVAL: int = Field(3600, gt=0)
+    SEEN_PROFILES_BITMAP: bool = False
+    POSTGRES_REPLICA_DSNS: List[str] = []
+    REPLICA_STICKY_SECONDS: float = Field(5.0, ge=0)
+    REPLICA_MAX_LAG_SECONDS: float = Field(10.0, gt=0)
+    COUNTERS_RECONCILE_INTERVAL: Optional[int] = Field(86400, gt=0)
 
     @property
     def database_url(self) -> str:
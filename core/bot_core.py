@@ -1,21 +1,143 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, wait
+from typing import Dict, Optional, Set
 from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
-from config import settings
+from config import constants
+from config.settings import settings
 from core.vk_api.client import VKClient
+from core.vk_api.outbox import OutboundQueue, Priority
+from core.db.repositories import UserRepository
+from core.matching import MatchFinder
+from core.ranking import RankingExecutor
+from core.sharding import event_user_id
+from services.analyzer import analyzer
 from handlers.message import MessageHandler
 from handlers.callback import CallbackHandler
 
+logger = logging.getLogger(__name__)
+
 
 class DatingBot:
+    """
+    Прием событий VK и их обработка в одном цикле событий
+
+    Цикл работает в отдельном потоке, а handle_raw только ставит событие
+    в очередь, поэтому события разных пользователей обрабатываются
+    одновременно: пока поиск одного пользователя ждет пул ранжирования,
+    цикл отвечает остальным. События одного пользователя выполняются по
+    порядку поступления. Одновременно в обработке не больше
+    MAX_CONCURRENT_EVENTS событий, дальше прием ждет.
+    """
+
     def __init__(self):
         self.vk = VKClient(settings.VK_GROUP_TOKEN)
+        self.outbox = OutboundQueue(self.vk.api).start()
+        self.vk.outbox = self.outbox
         self.user_vk = VKClient(settings.VK_USER_TOKEN)
-        self.message_handler = MessageHandler(self.vk, self.user_vk)
-        self.callback_handler = CallbackHandler(self.vk, self.user_vk)
+        self.user_repo = UserRepository()
+        self.user_repo.add_mutual_listener(self._notify_mutual_match)
+        # users.search доступен только с ключом пользователя, поэтому поиск идет через user_vk
+        self.ranking = self._create_ranking_executor()
+        self.match_finder = MatchFinder(self.user_vk, self.user_vk, self.user_repo, executor=self.ranking)
+        self.message_handler = MessageHandler(self.vk, self.user_repo, self.match_finder)
+        self.callback_handler = CallbackHandler(self.vk, self.user_repo)
+        self._user_tails: Dict[int, asyncio.Task] = {}
+        self._pending: Set[Future] = set()
+        self._slots = threading.BoundedSemaphore(constants.BotConstants.MAX_CONCURRENT_EVENTS)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="bot-event-loop", daemon=True)
+        self._loop_thread.start()
+
+    @staticmethod
+    def _create_ranking_executor() -> Optional[RankingExecutor]:
+        """
+        Пул ранжирования; векторизатор берется из общего анализатора,
+        который MatchFinder обучает на первой пачке анкет
+        """
+        if not settings.RANKING_WORKERS:
+            return None
+        if multiprocessing.current_process().daemon:
+            # Процесс-обработчик шардированного режима не может запускать
+            # дочерние процессы; параллельность там дают сами обработчики
+            return None
+        return RankingExecutor(settings.RANKING_WORKERS, analyzer=analyzer)
 
     def run(self):
-        longpoll = VkBotLongPoll(self.vk.api, settings.VK_GROUP_ID)
-        for event in longpoll.listen():
-            if event.type == VkBotEventType.MESSAGE_NEW:
-                self.message_handler.handle(event)
-            elif event.type == VkBotEventType.MESSAGE_EVENT:
-                self.callback_handler.handle(event)
\ No newline at end of file
+        longpoll = VkBotLongPoll(self.vk.session, settings.VK_GROUP_ID)
+        try:
+            for event in longpoll.listen():
+                self.handle_event(event)
+        finally:
+            self.close()
+
+    def close(self):
+        """Дожидается обработки принятых событий и отправки сообщений из очереди исходящих"""
+        wait(list(self._pending), timeout=settings.WORKER_SHUTDOWN_TIMEOUT)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        if self.ranking:
+            self.ranking.shutdown()
+        self.outbox.stop()
+
+    def handle_event(self, event):
+        """Передает событие long poll в соответствующий асинхронный обработчик"""
+        return self.handle_raw(event.raw)
+
+    def handle_raw(self, raw_event: dict) -> Optional[Future]:
+        """
+        Ставит событие в исходном JSON виде (long poll, Callback API,
+        процесс-обработчик) в цикл событий
+
+        Returns:
+            Future с результатом обработчика или None для неподдерживаемых событий
+        """
+        event_type = raw_event.get('type')
+        if event_type == VkBotEventType.MESSAGE_NEW.value:
+            coro = self.message_handler.handle({'type': VkBotEventType.MESSAGE_NEW, 'object': raw_event['object']})
+        elif event_type == VkBotEventType.MESSAGE_EVENT.value:
+            coro = self.callback_handler.handle(raw_event)
+        else:
+            return None
+
+        self._slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(self._in_user_order(event_user_id(raw_event), coro), self._loop)
+        self._pending.add(future)
+        future.add_done_callback(self._event_done)
+        return future
+
+    def _event_done(self, future: Future):
+        self._pending.discard(future)
+        self._slots.release()
+        if not future.cancelled() and future.exception():
+            logger.error(f"Event handling failed: {future.exception()}", exc_info=future.exception())
+
+    async def _in_user_order(self, user_id: Optional[int], coro):
+        """Выполняет обработчик после предыдущего события того же пользователя"""
+        if user_id is None:
+            return await coro
+        current = asyncio.current_task()
+        previous = self._user_tails.get(user_id)
+        self._user_tails[user_id] = current
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            return await coro
+        finally:
+            if self._user_tails.get(user_id) is current:
+                del self._user_tails[user_id]
+
+    def _notify_mutual_match(self, user_id: int, favorite_id: int):
+        """Уведомляет обоих пользователей о взаимной симпатии"""
+        for recipient, partner in ((user_id, favorite_id), (favorite_id, user_id)):
+            try:
+                self.outbox.send(
+                    recipient,
+                    constants.Messages.MUTUAL_MATCH.format(user_id=partner),
+                    priority=Priority.NOTIFICATION
+                )
+            except Exception as e:
+                logger.error(f"Failed to notify {recipient} about mutual match: {e}")
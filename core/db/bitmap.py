@@ -0,0 +1,143 @@
+"""
+Сжатое битовое множество ID в стиле Roaring
+
+Диапазон 32-битных ID делится на блоки по 65536 значений (по старшим
+16 битам). Блок с небольшим количеством элементов хранится
+отсортированным array('H') младших 16 бит (2 байта на ID), плотный блок
+(больше 4096 элементов) - битовой картой 8 КБ. Проверка принадлежности -
+поиск блока в словаре и бинарный поиск или чтение бита.
+
+Сериализация (to_bytes/from_bytes) используется для хранения
+просмотренных профилей одной строкой в таблице seen_profiles.
+"""
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Union
+
+_ARRAY_LIMIT = 4096
+_BITMAP_BYTES = 8192
+_MAGIC = b'RBM1'
+_HEADER = struct.Struct('<4sI')
+_CONTAINER = struct.Struct('<HBI')  # старшие 16 бит, тип блока, количество элементов
+_ARRAY, _BITMAP = 0, 1
+
+Container = Union[array, bytearray]
+
+
+def _to_bitmap(lows: Iterable[int]) -> bytearray:
+    bitmap = bytearray(_BITMAP_BYTES)
+    for low in lows:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bitmap
+
+
+def _bitmap_count(bitmap: bytearray) -> int:
+    return bin(int.from_bytes(bitmap, 'little')).count('1')
+
+
+class RoaringBitmap:
+    """Множество неотрицательных 32-битных ID"""
+
+    __slots__ = ('_containers',)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: Dict[int, Container] = {}
+        self.update(values)
+
+    def add(self, value: int):
+        self.update((value,))
+
+    def update(self, values: Iterable[int]):
+        """Добавляет пачку ID: каждый затронутый блок перестраивается один раз"""
+        grouped = defaultdict(list)
+        for value in values:
+            if not 0 <= value <= 0xFFFFFFFF:
+                raise ValueError(f"Value out of uint32 range: {value}")
+            grouped[value >> 16].append(value & 0xFFFF)
+
+        for key, lows in grouped.items():
+            container = self._containers.get(key)
+            if isinstance(container, bytearray):
+                for low in lows:
+                    container[low >> 3] |= 1 << (low & 7)
+                continue
+            merged = sorted(set(container or ()).union(lows))
+            self._containers[key] = _to_bitmap(merged) if len(merged) > _ARRAY_LIMIT else array('H', merged)
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int) or not 0 <= value <= 0xFFFFFFFF:
+            return False
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] >> (low & 7) & 1)
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __len__(self) -> int:
+        return sum(
+            _bitmap_count(container) if isinstance(container, bytearray) else len(container)
+            for container in self._containers.values()
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            high = key << 16
+            if isinstance(container, bytearray):
+                for index, byte in enumerate(container):
+                    while byte:
+                        bit = byte & -byte
+                        yield high | (index << 3) | (bit.bit_length() - 1)
+                        byte ^= bit
+            else:
+                for low in container:
+                    yield high | low
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RoaringBitmap) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"RoaringBitmap(len={len(self)}, containers={len(self._containers)})"
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(_MAGIC, len(self._containers))]
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            if isinstance(container, bytearray):
+                parts.append(_CONTAINER.pack(key, _BITMAP, _bitmap_count(container)))
+                parts.append(bytes(container))
+            else:
+                parts.append(_CONTAINER.pack(key, _ARRAY, len(container)))
+                data = array('H', container)
+                if sys.byteorder == 'big':
+                    data.byteswap()
+                parts.append(data.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RoaringBitmap":
+        bitmap = cls()
+        magic, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Unknown bitmap format")
+        offset = _HEADER.size
+        for _ in range(count):
+            key, kind, size = _CONTAINER.unpack_from(data, offset)
+            offset += _CONTAINER.size
+            if kind == _BITMAP:
+                bitmap._containers[key] = bytearray(data[offset:offset + _BITMAP_BYTES])
+                offset += _BITMAP_BYTES
+            else:
+                container = array('H')
+                container.frombytes(data[offset:offset + size * 2])
+                if sys.byteorder == 'big':
+                    container.byteswap()
+                bitmap._containers[key] = container
+                offset += size * 2
+        return bitmap
@@ -4,7 +4,8 @@ from core.db.models import Base
 
 import psycopg2
 from psycopg2 import pool
-from config import settings, constants
+from config import constants
+from config.settings import settings
 
 class Database:
     _connection_pool = None
@@ -0,0 +1,175 @@
+"""
+Счетчики пользователя: избранное, черный список, лайки фото
+
+user_counters хранит по строке на пользователя, и счетчики в меню
+читаются по первичному ключу вместо COUNT(*). UserRepository меняет их
+в той же транзакции, что и сами записи (counter_delta). Записи в обход
+репозитория (ручные правки, сбои между версиями) могут дать
+расхождение; CounterReconciliation периодически пересчитывает счетчики
+пачками пользователей и исправляет только расходящиеся строки.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config import constants
+from core.db.connector import get_session
+from core.db.models import Blacklist, Favorite, PhotoLike, User, UserCounters
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("favorites", "blacklist", "photo_likes")
+
+# Источник каждого счетчика: колонка владельца и дополнительное условие
+_SOURCES = {
+    "favorites": (Favorite.user_id, None),
+    "blacklist": (Blacklist.user_id, None),
+    "photo_likes": (PhotoLike.user_id, PhotoLike.liked.is_(True)),
+}
+
+
+def counter_delta(user_id: int, **deltas: int):
+    """
+    Upsert, прибавляющий deltas к счетчикам пользователя
+
+    Новая строка создается с неотрицательными значениями; отрицательная
+    дельта для отсутствующей строки означает расхождение, которое
+    исправит сверка.
+    """
+    now = datetime.now()
+    stmt = insert(UserCounters).values(
+        user_id=user_id, updated_at=now, **{name: max(delta, 0) for name, delta in deltas.items()}
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserCounters.user_id],
+        set_={
+            **{name: getattr(UserCounters, name) + delta for name, delta in deltas.items()},
+            "updated_at": now,
+        }
+    )
+
+
+def actual_counts(session: Session, user_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Фактические значения счетчиков по исходным таблицам (GROUP BY на каждый счетчик)"""
+    user_ids = list(user_ids)
+    counts = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    for name, (owner, condition) in _SOURCES.items():
+        query = select(owner, func.count()).where(owner.in_(user_ids)).group_by(owner)
+        if condition is not None:
+            query = query.where(condition)
+        for user_id, count in session.execute(query):
+            counts[user_id][name] = count
+    return counts
+
+
+def reconcile_counters(session: Session,
+                       user_ids: Optional[Iterable[int]] = None,
+                       batch_size: Optional[int] = None) -> int:
+    """
+    Сверка user_counters с исходными таблицами
+
+    Пользователи обходятся пачками по ID, каждая пачка - отдельная
+    транзакция. Строки счетчиков пачки блокируются до пересчета, поэтому
+    одновременные изменения через репозиторий не теряются.
+
+    :param user_ids: только эти пользователи (по умолчанию все из users)
+    :return: количество исправленных строк
+    """
+    batch_size = batch_size or constants.DbConstants.COUNTERS_BATCH_SIZE
+    fixed = 0
+    for batch in _user_batches(session, user_ids, batch_size):
+        stored = {
+            row.user_id: row
+            for row in session.query(UserCounters).filter(UserCounters.user_id.in_(batch)).with_for_update()
+        }
+        for user_id, counts in actual_counts(session, batch).items():
+            row = stored.get(user_id)
+            if row is None:
+                if any(counts.values()):
+                    # Строку мог создать одновременный upsert репозитория
+                    stmt = insert(UserCounters).values(user_id=user_id, updated_at=datetime.now(), **counts)
+                    session.execute(stmt.on_conflict_do_update(
+                        index_elements=[UserCounters.user_id],
+                        set_={name: getattr(stmt.excluded, name) for name in (*COUNTER_FIELDS, "updated_at")}
+                    ))
+                    fixed += 1
+                continue
+            before = {name: getattr(row, name) for name in COUNTER_FIELDS}
+            if before != counts:
+                logger.warning(f"Counters drift for user {user_id}: {before} -> {counts}")
+                for name, value in counts.items():
+                    setattr(row, name, value)
+                row.updated_at = datetime.now()
+                fixed += 1
+        session.commit()
+    return fixed
+
+
+def _user_batches(session: Session, user_ids: Optional[Iterable[int]], batch_size: int):
+    if user_ids is not None:
+        user_ids = sorted(set(user_ids))
+        for start in range(0, len(user_ids), batch_size):
+            yield user_ids[start:start + batch_size]
+        return
+
+    last_id = None
+    while True:
+        query = select(User.id).order_by(User.id).limit(batch_size)
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        batch = list(session.execute(query).scalars())
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+class CounterReconciliation(threading.Thread):
+    """
+    Фоновая сверка счетчиков
+
+    Args:
+        interval: пауза между сверками, сек
+        batch_size: пользователей в одной транзакции
+        session_factory: фабрика сессий SQLAlchemy
+    """
+
+    def __init__(self,
+                 interval: float = 86400.0,
+                 batch_size: Optional[int] = None,
+                 session_factory: Callable[[], Session] = get_session):
+        super().__init__(name="counter-reconciliation", daemon=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self._stopped = threading.Event()
+
+    def reconcile(self) -> int:
+        session = self.session_factory()
+        try:
+            fixed = reconcile_counters(session, batch_size=self.batch_size)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        if fixed:
+            logger.info(f"Reconciled counters for {fixed} users")
+        return fixed
+
+    def run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"Counter reconciliation failed: {e}", exc_info=True)
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,236 @@
+"""
+Обновление схемы существующей базы
+
+init_db (create_all) создает только отсутствующие таблицы и не меняет
+уже созданные. Колонки, индексы и ограничения, добавленные в модели
+позже, и заполнение новых полей по старым данным описаны здесь
+шагами. Каждый шаг идемпотентен, поэтому все шаги выполняются при
+каждом запуске, без таблицы версий.
+
+Запуск: python -m core.db.migrations (с SEEN_PROFILES_BITMAP заодно
+заполняет seen_profiles по истории просмотров)
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, exists, func, or_, select, text, true, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import aliased
+
+from core.db.models import Base, Blacklist, Favorite, PhotoLike, PhotoLikeEdge, User, UserCounters
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_mutual_favorites(connection: Connection, user_id: Optional[int] = None) -> int:
+    """
+    Приводит is_mutual в соответствие с обратными записями избранного
+
+    Пары, ставшие взаимными до появления флага или вставленные в обход
+    репозитория (импорт), получают is_mutual, а флаг без обратной записи
+    снимается.
+
+    :param user_id: только пары с участием этого пользователя (по умолчанию все)
+    :return: количество исправленных строк
+    """
+    reverse = aliased(Favorite)
+    has_reverse = exists().where(reverse.user_id == Favorite.favorite_id, reverse.favorite_id == Favorite.user_id)
+    scope = true() if user_id is None else or_(Favorite.user_id == user_id, Favorite.favorite_id == user_id)
+    marked = connection.execute(
+        update(Favorite).where(scope, Favorite.is_mutual.isnot(True), has_reverse).values(is_mutual=True)
+    ).rowcount
+    cleared = connection.execute(
+        update(Favorite).where(scope, Favorite.is_mutual.is_(True), ~has_reverse).values(is_mutual=False)
+    ).rowcount
+    return marked + cleared
+
+
+def backfill_photo_owners(connection: Connection, batch_size: int = 1000) -> int:
+    """
+    Заполняет photo_likes.owner_id по photo_id у лайков, поставленных до появления колонки
+
+    :return: количество заполненных строк
+    """
+    from core.db.repositories import UserRepository
+    filled = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(PhotoLike.id, PhotoLike.photo_id)
+            .where(PhotoLike.owner_id.is_(None), PhotoLike.id > last_id)
+            .order_by(PhotoLike.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return filled
+        last_id = rows[-1].id
+        owners = [{"row_id": row.id, "owner": UserRepository._parse_photo_owner(row.photo_id)} for row in rows]
+        owners = [item for item in owners if item["owner"] is not None]
+        if owners:
+            connection.execute(
+                update(PhotoLike).where(PhotoLike.id == bindparam("row_id")).values(owner_id=bindparam("owner")),
+                owners
+            )
+            filled += len(owners)
+
+
+def backfill_like_edges(connection: Connection) -> int:
+    """
+    Пересчитывает photo_like_edges по текущим лайкам
+
+    Ребра без оставшихся лайков обнуляются, как при снятии лайка в
+    репозитории. Изменяются только расходящиеся строки.
+
+    :return: количество исправленных строк
+    """
+    now = datetime.now()
+    counts = (
+        select(PhotoLike.user_id, PhotoLike.owner_id, func.count(), bindparam("now", now))
+        .where(PhotoLike.liked.is_(True), PhotoLike.owner_id.isnot(None))
+        .group_by(PhotoLike.user_id, PhotoLike.owner_id)
+    )
+    stmt = insert(PhotoLikeEdge).from_select(["liker_id", "owner_id", "likes_count", "updated_at"], counts)
+    upserted = connection.execute(stmt.on_conflict_do_update(
+        index_elements=[PhotoLikeEdge.liker_id, PhotoLikeEdge.owner_id],
+        set_={"likes_count": stmt.excluded.likes_count, "updated_at": stmt.excluded.updated_at},
+        where=PhotoLikeEdge.likes_count != stmt.excluded.likes_count
+    )).rowcount
+    has_likes = exists().where(
+        PhotoLike.user_id == PhotoLikeEdge.liker_id, PhotoLike.owner_id == PhotoLikeEdge.owner_id,
+        PhotoLike.liked.is_(True)
+    )
+    cleared = connection.execute(
+        update(PhotoLikeEdge).where(PhotoLikeEdge.likes_count > 0, ~has_likes).values(likes_count=0, updated_at=now)
+    ).rowcount
+    return upserted + cleared
+
+
+def backfill_user_counters(connection: Connection) -> int:
+    """
+    Заполняет user_counters по исходным таблицам для всех пользователей
+
+    То же, что reconcile_counters, одним запросом: на существующей базе
+    счетчики в меню не нулевые до первой фоновой сверки.
+
+    :return: количество созданных или исправленных строк
+    """
+    def count(owner, *conditions):
+        return select(func.count()).where(owner == User.id, *conditions).scalar_subquery()
+
+    values = select(
+        User.id, count(Favorite.user_id), count(Blacklist.user_id), count(PhotoLike.user_id, PhotoLike.liked.is_(True)),
+        bindparam("now", datetime.now())
+    ).where(true())  # WHERE снимает неоднозначность INSERT ... SELECT ... ON CONFLICT в SQLite
+    stmt = insert(UserCounters).from_select(["user_id", "favorites", "blacklist", "photo_likes", "updated_at"], values)
+    fields = ("favorites", "blacklist", "photo_likes")
+    return connection.execute(stmt.on_conflict_do_update(
+        index_elements=[UserCounters.user_id],
+        set_={name: getattr(stmt.excluded, name) for name in (*fields, "updated_at")},
+        where=or_(*(getattr(UserCounters, name) != getattr(stmt.excluded, name) for name in fields))
+    )).rowcount
+
+
+def _sql(statement: str) -> Callable[[Connection], None]:
+    return lambda connection: connection.execute(text(statement))
+
+
+def _unique(table: str, name: str, columns: Tuple[str, ...]) -> Callable[[Connection], int]:
+    """
+    Шаг добавления ограничения уникальности
+
+    Дубликаты, накопившиеся без ограничения, удаляются заранее: остается
+    строка с наименьшим id (ее изменяли запросы с .first()).
+    """
+    same = " AND ".join(f"a.{column} = b.{column}" for column in columns)
+
+    def step(connection: Connection) -> int:
+        removed = connection.execute(text(f"DELETE FROM {table} a USING {table} b WHERE {same} AND a.id > b.id"))
+        connection.execute(text(
+            f"DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{name}') THEN "
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE ({', '.join(columns)}); END IF; END $$"
+        ))
+        return removed.rowcount
+
+    return step
+
+
+# (название, шаг); шаги PostgreSQL, выполняются по порядку
+MIGRATIONS: List[Tuple[str, Callable[[Connection], Optional[int]]]] = [
+    # photo_like_edges, match_view_history, seen_profiles, user_counters на базах до их появления
+    ("create missing tables", lambda connection: Base.metadata.create_all(connection)),
+    ("favorites.is_mutual", _sql("ALTER TABLE favorites ADD COLUMN IF NOT EXISTS is_mutual boolean DEFAULT false")),
+    ("ix_favorites_user_mutual", _sql(
+        "CREATE INDEX IF NOT EXISTS ix_favorites_user_mutual ON favorites (user_id, favorite_id) WHERE is_mutual"
+    )),
+    ("backfill favorites.is_mutual", backfill_mutual_favorites),
+    ("photo_likes.owner_id", _sql("ALTER TABLE photo_likes ADD COLUMN IF NOT EXISTS owner_id integer")),
+    ("ix_photo_likes_owner_id", _sql("CREATE INDEX IF NOT EXISTS ix_photo_likes_owner_id ON photo_likes (owner_id)")),
+    # Цели ON CONFLICT импорта (UserDataTransfer)
+    ("uq_favorites_user_favorite", _unique("favorites", "uq_favorites_user_favorite", ("user_id", "favorite_id"))),
+    ("uq_blacklist_user_banned", _unique("blacklist", "uq_blacklist_user_banned", ("user_id", "banned_id"))),
+    ("uq_photo_likes_user_photo", _unique("photo_likes", "uq_photo_likes_user_photo", ("user_id", "photo_id"))),
+    # Keyset-пагинация списков и очистка старых просмотров
+    ("ix_favorites_user_added", _sql(
+        "CREATE INDEX IF NOT EXISTS ix_favorites_user_added ON favorites (user_id, added_at, id)"
+    )),
+    ("ix_blacklist_user_created", _sql(
+        "CREATE INDEX IF NOT EXISTS ix_blacklist_user_created ON blacklist (user_id, created_at, id)"
+    )),
+    ("ix_view_history_user_viewed", _sql(
+        "CREATE INDEX IF NOT EXISTS ix_view_history_user_viewed ON match_view_history (user_id, viewed_at, id)"
+    )),
+    ("ix_view_history_viewed_at", _sql(
+        "CREATE INDEX IF NOT EXISTS ix_view_history_viewed_at ON match_view_history (viewed_at)"
+    )),
+    # Производные данные по записям, сделанным до их появления
+    ("backfill photo_likes.owner_id", backfill_photo_owners),
+    ("backfill photo_like_edges", backfill_like_edges),
+    ("backfill user_counters", backfill_user_counters),
+]
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[str]:
+    """
+    Применяет шаги MIGRATIONS, каждый в своей транзакции
+
+    Returns:
+        Названия выполненных шагов
+    """
+    if engine is None:
+        from core.db.connector import get_engine
+        engine = get_engine()
+    applied = []
+    for name, step in MIGRATIONS:
+        with engine.begin() as connection:
+            result = step(connection)
+        logger.info(f"Migration step '{name}' applied" + (f": {result} rows" if result else ""))
+        applied.append(name)
+    return applied
+
+
+def backfill_seen_profiles() -> int:
+    """
+    Заполняет seen_profiles пользователей, у которых его еще нет
+
+    Нужно при включении SEEN_PROFILES_BITMAP на работающей базе: иначе
+    исключения для поиска читаются из пустого множества, и просмотренные
+    профили показываются снова. Выполняется при запуске бота и из CLI.
+
+    Returns:
+        Количество пересобранных пользователей
+    """
+    from core.db.repositories import UserRepository
+    repo = UserRepository()
+    try:
+        return repo.backfill_seen_profiles()
+    finally:
+        repo.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    upgrade()
+    from config.settings import settings
+    if settings.SEEN_PROFILES_BITMAP:
+        backfill_seen_profiles()
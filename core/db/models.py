@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Index, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -20,6 +20,14 @@ class Favorite(Base):
     user = relationship("User", foreign_keys=[user_id], back_populates="favorites_added")
     favorite_user = relationship("User", foreign_keys=[favorite_id], back_populates="favorites_received")
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'favorite_id', name='uq_favorites_user_favorite'),
+        # Индекс для keyset-пагинации по (added_at, id)
+        Index('ix_favorites_user_added', 'user_id', 'added_at', 'id'),
+        # Частичный индекс: взаимные избранные читаются без сканирования всех записей
+        Index('ix_favorites_user_mutual', 'user_id', 'favorite_id', postgresql_where=text('is_mutual')),
+    )
+
     def __repr__(self):
         return f"<Favorite(user_id={self.user_id}, favorite_id={self.favorite_id}, is_mutual={self.is_mutual})>"
 
@@ -37,6 +45,11 @@ class Blacklist(Base):
     user = relationship("User", foreign_keys=[user_id], back_populates="blacklists_created")
     banned_user = relationship("User", foreign_keys=[banned_id], back_populates="blacklists_received")
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'banned_id', name='uq_blacklist_user_banned'),
+        Index('ix_blacklist_user_created', 'user_id', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<Blacklist(user_id={self.user_id}, banned_id={self.banned_id}, created_at={self.created_at})>"
 
@@ -47,6 +60,7 @@ class PhotoLike(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     photo_id = Column(String(36), nullable=False)  # UUID обычно 36 символов
+    owner_id = Column(Integer, nullable=True, index=True)  # Владелец фотографии
     liked = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -56,12 +70,30 @@ class PhotoLike(Base):
 
     # Composite index
     __table_args__ = (
+        UniqueConstraint('user_id', 'photo_id', name='uq_photo_likes_user_photo'),
         {'sqlite_autoincrement': True},
     )
 
     def __repr__(self):
         return f"<PhotoLike(user_id={self.user_id}, photo_id={self.photo_id}, liked={self.liked})>"
 
+class PhotoLikeEdge(Base):
+    """Агрегат лайков: сколько фотографий владельца лайкнул пользователь"""
+    __tablename__ = 'photo_like_edges'
+
+    liker_id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, primary_key=True)
+    likes_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # Обратный индекс для поиска "кто лайкнул мои фото"
+    __table_args__ = (
+        Index('ix_photo_like_edges_owner_liker', 'owner_id', 'liker_id'),
+    )
+
+    def __repr__(self):
+        return f"<PhotoLikeEdge(liker_id={self.liker_id}, owner_id={self.owner_id}, likes_count={self.likes_count})>"
+
 class MatchViewHistory(Base):
     """Модель истории просмотров профилей"""
     __tablename__ = 'match_view_history'
@@ -78,12 +110,39 @@ class MatchViewHistory(Base):
 
     # Composite index для быстрого поиска
     __table_args__ = (
+        Index('ix_view_history_user_viewed', 'user_id', 'viewed_at', 'id'),
+        # Для пакетной очистки старых просмотров (core/db/retention.py)
+        Index('ix_view_history_viewed_at', 'viewed_at'),
         {'sqlite_autoincrement': True},
     )
 
     def __repr__(self):
         return f"<MatchViewHistory(user_id={self.user_id}, viewed_user_id={self.viewed_user_id}, viewed_at={self.viewed_at})>"
 
+class SeenProfiles(Base):
+    """Просмотренные профили пользователя одной строкой (RoaringBitmap.to_bytes) для исключения из поиска"""
+    __tablename__ = 'seen_profiles'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    bitmap = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<SeenProfiles(user_id={self.user_id}, size={len(self.bitmap or b'')})>"
+
+class UserCounters(Base):
+    """Счетчики пользователя для меню, поддерживаются репозиторием (core/db/counters.py)"""
+    __tablename__ = 'user_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    favorites = Column(Integer, default=0, nullable=False)
+    blacklist = Column(Integer, default=0, nullable=False)
+    photo_likes = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<UserCounters(user_id={self.user_id}, favorites={self.favorites}, blacklist={self.blacklist}, photo_likes={self.photo_likes})>"
+
 class User(Base):
     """Модель пользователя (добавлена для связей)"""
     __tablename__ = 'users'
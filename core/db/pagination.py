@@ -0,0 +1,35 @@
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации поврежден или подделан"""
+    pass
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """
+    Кодирует позицию (timestamp, id) последней записи страницы в непрозрачный курсор
+
+    Курсор короткий (~20 символов) и безопасен для URL, поэтому помещается
+    в payload кнопки клавиатуры VK (лимит 255 символов).
+    """
+    micros = (timestamp - _EPOCH) // timedelta(microseconds=1)
+    raw = f"{micros:x}.{row_id:x}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Декодирует курсор обратно в (timestamp, id); None для первой страницы"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        micros, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("ascii").split(".")
+        return _EPOCH + timedelta(microseconds=int(micros, 16)), int(row_id, 16)
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor}") from e
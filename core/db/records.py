@@ -0,0 +1,36 @@
+"""
+Легкие записи для чтения списков без ORM
+
+UserRepository выбирает для списков только нужные колонки через Core
+select и отдает NamedTuple: без объектов модели, identity map и
+отслеживания изменений. as_dict() дает прежний формат словаря с датой
+в ISO для кода, которому нужен JSON.
+"""
+from datetime import datetime
+from typing import Any, Dict, NamedTuple
+
+
+class FavoriteRecord(NamedTuple):
+    user_id: int
+    favorite_id: int
+    added_at: datetime
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"user_id": self.user_id, "favorite_id": self.favorite_id, "added_at": self.added_at.isoformat()}
+
+
+class BlacklistRecord(NamedTuple):
+    user_id: int
+    banned_id: int
+    created_at: datetime
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"user_id": self.user_id, "banned_id": self.banned_id, "created_at": self.created_at.isoformat()}
+
+
+class ViewRecord(NamedTuple):
+    viewed_user_id: int
+    viewed_at: datetime
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"viewed_user_id": self.viewed_user_id, "viewed_at": self.viewed_at.isoformat()}
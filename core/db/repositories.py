@@ -1,21 +1,106 @@
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Iterable, Set, Tuple, Callable, Union, NamedTuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
-from core.db.models import Favorite, Blacklist, PhotoLike, User, MatchViewHistory
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, or_, func, tuple_, update, exists, select, bindparam, Select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.postgresql import insert
+from core.db.bitmap import RoaringBitmap
+from core.db.models import (Favorite, Blacklist, PhotoLike, PhotoLikeEdge, User, MatchViewHistory, SeenProfiles,
+                            UserCounters)
+from core.db.counters import COUNTER_FIELDS, counter_delta
 from core.db.connector import get_session
+from core.db.pagination import encode_cursor, decode_cursor
+from core.db.records import FavoriteRecord, BlacklistRecord, ViewRecord
+from core.db.retention import delete_in_batches, view_history_cutoff
+from core.db.routing import ReplicaRouter, replica_router
+from core.metrics import instrument_methods, REPOSITORY_LATENCY
 from config import constants
+from config.settings import settings
 import logging
 from uuid import UUID
 
 logger = logging.getLogger(__name__)
 
 
+def _list_statement(table, columns, ts_column):
+    """Core select списка пользователя: параметры user_id, limit, offset"""
+    return (
+        select(*(table.c[name] for name in columns))
+        .where(table.c.user_id == bindparam("user_id"))
+        .order_by(table.c[ts_column].desc())
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+
+# Запросы строятся один раз при импорте; значения передаются параметрами,
+# поэтому SQL компилируется один раз на движок (compiled cache SQLAlchemy)
+_FAVORITES_SELECT = _list_statement(Favorite.__table__, FavoriteRecord._fields, "added_at")
+_BLACKLIST_SELECT = _list_statement(Blacklist.__table__, BlacklistRecord._fields, "created_at")
+_VIEW_HISTORY_SELECT = _list_statement(MatchViewHistory.__table__, ViewRecord._fields, "viewed_at")
+
+
+class _PageStatements(NamedTuple):
+    """Пара Core select для keyset-страницы: первая страница и страница после курсора"""
+    first: Select
+    after: Select
+    ts_column: str
+
+
+def _page_statements(table, columns, ts_column) -> _PageStatements:
+    """
+    Core select страницы по ключу (ts_column, id) в порядке убывания
+
+    Параметры: user_id, limit и для страницы после курсора ts, id - позиция
+    последней выданной записи. Последняя колонка строки - id записи.
+    """
+    first = (
+        select(*(table.c[name] for name in columns), table.c.id)
+        .where(table.c.user_id == bindparam("user_id"))
+        .order_by(table.c[ts_column].desc(), table.c.id.desc())
+        .limit(bindparam("limit"))
+    )
+    after = first.where(
+        tuple_(table.c[ts_column], table.c.id)
+        < tuple_(bindparam("ts", type_=table.c[ts_column].type), bindparam("id", type_=table.c.id.type))
+    )
+    return _PageStatements(first, after, ts_column)
+
+
+_FAVORITES_PAGE = _page_statements(Favorite.__table__, FavoriteRecord._fields, "added_at")
+_BLACKLIST_PAGE = _page_statements(Blacklist.__table__, BlacklistRecord._fields, "created_at")
+_VIEW_HISTORY_PAGE = _page_statements(MatchViewHistory.__table__, ViewRecord._fields, "viewed_at")
+_PHOTO_LIKES_SELECT = select(PhotoLike.__table__.c.photo_id, PhotoLike.__table__.c.liked).where(
+    PhotoLike.__table__.c.user_id == bindparam("user_id")
+)
+_COUNTERS_SELECT = select(*(UserCounters.__table__.c[name] for name in COUNTER_FIELDS)).where(
+    UserCounters.__table__.c.user_id == bindparam("user_id")
+)
+
+
+@instrument_methods(REPOSITORY_LATENCY)
 class UserRepository:
-    """Репозиторий для работы с пользовательскими данными: избранное, черный список, лайки фото"""
+    """
+    Репозиторий для работы с пользовательскими данными: избранное, черный список, лайки фото
 
-    def __init__(self, session: Session = None):
+    Списки и счетчики читаются с реплик (POSTGRES_REPLICA_DSNS) через
+    ReplicaRouter, записи и проверки перед записью - с основного сервера.
+    Если передана своя сессия, а router не указан, все запросы идут в нее.
+    """
+
+    def __init__(self, session: Session = None, router: Optional[ReplicaRouter] = None):
+        self.router = router if router is not None or session is not None else replica_router
         self.session = session or get_session()
+        self._mutual_listeners: List[Callable[[int, int], Any]] = []
+
+    def add_mutual_listener(self, callback: Callable[[int, int], Any]):
+        """
+        Подписка на появление взаимной симпатии
+
+        :param callback: функция (user_id, favorite_id), вызывается после коммита,
+                         когда добавление в избранное сделало пару взаимной
+        """
+        self._mutual_listeners.append(callback)
 
     # === Работа с избранным ===
     def add_favorite(self, user_id: int, favorite_id: int) -> Tuple[bool, str]:
@@ -39,7 +124,15 @@ class UserRepository:
                 added_at=datetime.now()
             )
             self.session.add(favorite)
+            self.session.flush()
+            self.session.execute(counter_delta(user_id, favorites=1))
+            self._lock_pair(user_id, favorite_id)
+            is_mutual = self._update_mutual(user_id, favorite_id, True) == 2
             self.session.commit()
+            self._wrote(user_id)
+
+            if is_mutual:
+                self._notify_mutual(user_id, favorite_id)
             return True, "Пользователь добавлен в избранное"
 
         except Exception as e:
@@ -50,16 +143,28 @@ class UserRepository:
     def remove_favorite(self, user_id: int, favorite_id: int) -> bool:
         """Удаление пользователя из избранного"""
         try:
+            self._lock_pair(user_id, favorite_id)
             favorite = self.session.query(Favorite).filter_by(
                 user_id=user_id,
                 favorite_id=favorite_id
             ).first()
 
             if not favorite:
+                self.session.rollback()
                 return False
 
+            was_mutual = favorite.is_mutual
             self.session.delete(favorite)
+            self.session.execute(counter_delta(user_id, favorites=-1))
+            if was_mutual:
+                self.session.execute(
+                    update(Favorite)
+                    .where(Favorite.user_id == favorite_id, Favorite.favorite_id == user_id)
+                    .values(is_mutual=False),
+                    execution_options={"synchronize_session": False}
+                )
             self.session.commit()
+            self._wrote(user_id)
             return True
 
         except Exception as e:
@@ -67,38 +172,49 @@ class UserRepository:
             self.session.rollback()
             return False
 
-    def get_favorites(self, user_id: int, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    def get_favorites(self, user_id: int, limit: int = 100, offset: int = 0) -> List[FavoriteRecord]:
         """
         Получение списка избранных с пагинацией
 
+        Читаются только колонки через Core, объекты Favorite не создаются.
+
         :param user_id: ID пользователя
         :param limit: количество записей
         :param offset: смещение
-        :return: список словарей с информацией об избранных
+        :return: список FavoriteRecord (as_dict() - словарь с датой в ISO)
         """
         try:
-            favorites = self.session.query(Favorite).filter_by(
-                user_id=user_id
-            ).order_by(
-                desc(Favorite.added_at)
-            ).offset(offset).limit(limit).all()
-
-            return [
-                {
-                    "user_id": fav.user_id,
-                    "favorite_id": fav.favorite_id,
-                    "added_at": fav.added_at.isoformat()
-                }
-                for fav in favorites
-            ]
+            return self._select_records(user_id, _FAVORITES_SELECT, FavoriteRecord, limit=limit, offset=offset)
         except Exception as e:
             logger.error(f"Error getting favorites: {e}", exc_info=True)
             return []
 
+    def get_favorites_page(
+            self,
+            user_id: int,
+            limit: int = constants.BotConstants.PAGE_SIZE,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Получение страницы избранных по курсору (keyset-пагинация по (added_at, id))
+
+        Время ответа не зависит от глубины страницы, в отличие от OFFSET.
+
+        :param user_id: ID пользователя
+        :param limit: количество записей на странице
+        :param cursor: курсор из предыдущей страницы или None для первой
+        :return: (записи страницы, курсор следующей страницы или None)
+        """
+        try:
+            return self._get_page(user_id, _FAVORITES_PAGE, FavoriteRecord, limit, cursor)
+        except Exception as e:
+            logger.error(f"Error getting favorites page: {e}", exc_info=True)
+            return [], None
+
     def count_favorites(self, user_id: int) -> int:
-        """Получение количества избранных пользователей"""
+        """Получение количества избранных пользователей (из user_counters)"""
         try:
-            return self.session.query(Favorite).filter_by(user_id=user_id).count()
+            return self.get_counters(user_id)["favorites"]
         except Exception as e:
             logger.error(f"Error counting favorites: {e}", exc_info=True)
             return 0
@@ -130,7 +246,10 @@ class UserRepository:
                 created_at=datetime.now()
             )
             self.session.add(blacklist)
+            self.session.flush()
+            self.session.execute(counter_delta(user_id, blacklist=1))
             self.session.commit()
+            self._wrote(user_id)
             return True, "Пользователь добавлен в черный список"
 
         except Exception as e:
@@ -150,7 +269,9 @@ class UserRepository:
                 return False
 
             self.session.delete(blacklist)
+            self.session.execute(counter_delta(user_id, blacklist=-1))
             self.session.commit()
+            self._wrote(user_id)
             return True
 
         except Exception as e:
@@ -158,27 +279,27 @@ class UserRepository:
             self.session.rollback()
             return False
 
-    def get_blacklist(self, user_id: int, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """Получение черного списка с пагинацией"""
+    def get_blacklist(self, user_id: int, limit: int = 100, offset: int = 0) -> List[BlacklistRecord]:
+        """Получение черного списка с пагинацией (записи BlacklistRecord)"""
         try:
-            blacklist = self.session.query(Blacklist).filter_by(
-                user_id=user_id
-            ).order_by(
-                desc(Blacklist.created_at)
-            ).offset(offset).limit(limit).all()
-
-            return [
-                {
-                    "user_id": item.user_id,
-                    "banned_id": item.banned_id,
-                    "created_at": item.created_at.isoformat()
-                }
-                for item in blacklist
-            ]
+            return self._select_records(user_id, _BLACKLIST_SELECT, BlacklistRecord, limit=limit, offset=offset)
         except Exception as e:
             logger.error(f"Error getting blacklist: {e}", exc_info=True)
             return []
 
+    def get_blacklist_page(
+            self,
+            user_id: int,
+            limit: int = constants.BotConstants.PAGE_SIZE,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Получение страницы черного списка по курсору (created_at, id)"""
+        try:
+            return self._get_page(user_id, _BLACKLIST_PAGE, BlacklistRecord, limit, cursor)
+        except Exception as e:
+            logger.error(f"Error getting blacklist page: {e}", exc_info=True)
+            return [], None
+
     def is_in_blacklist(self, user_id: int, banned_id: int) -> bool:
         """Проверка, находится ли пользователь в черном списке"""
         try:
@@ -191,21 +312,29 @@ class UserRepository:
             return False
 
     def count_blacklist(self, user_id: int) -> int:
-        """Получение количества пользователей в черном списке"""
+        """Получение количества пользователей в черном списке (из user_counters)"""
         try:
-            return self.session.query(Blacklist).filter_by(user_id=user_id).count()
+            return self.get_counters(user_id)["blacklist"]
         except Exception as e:
             logger.error(f"Error counting blacklist: {e}", exc_info=True)
             return 0
 
     # === Работа с лайками фотографий ===
-    def toggle_photo_like(self, user_id: int, photo_id: str) -> Tuple[bool, Optional[bool]]:
+    def toggle_photo_like(
+            self,
+            user_id: int,
+            photo_id: str,
+            owner_id: Optional[int] = None
+    ) -> Tuple[bool, Optional[bool]]:
         """
         Переключение статуса лайка фотографии
 
+        :param owner_id: ID владельца фото; если не указан, берется из photo_id
+                         вида "photo{owner_id}_{id}" или "{owner_id}_{id}"
         :return: (success, like_status) - статус операции и текущее состояние лайка
         """
         try:
+            owner_id = owner_id if owner_id is not None else self._parse_photo_owner(photo_id)
             like = self.session.query(PhotoLike).filter_by(
                 user_id=user_id,
                 photo_id=photo_id
@@ -214,16 +343,24 @@ class UserRepository:
             if like:
                 like.liked = not like.liked
                 like.updated_at = datetime.now()
+                if like.owner_id is None:
+                    like.owner_id = owner_id
             else:
                 like = PhotoLike(
                     user_id=user_id,
                     photo_id=photo_id,
+                    owner_id=owner_id,
                     liked=True,
                     created_at=datetime.now()
                 )
                 self.session.add(like)
 
+            self.session.execute(counter_delta(user_id, photo_likes=1 if like.liked else -1))
+            if like.owner_id is not None:
+                self._update_like_edge(user_id, like.owner_id, 1 if like.liked else -1)
+
             self.session.commit()
+            self._wrote(user_id)
             return True, like.liked
 
         except Exception as e:
@@ -234,26 +371,36 @@ class UserRepository:
     def get_photo_likes(self, user_id: int) -> Dict[str, bool]:
         """Получение всех лайков фотографий пользователя"""
         try:
-            likes = self.session.query(PhotoLike).filter_by(
-                user_id=user_id
-            ).all()
-
-            return {like.photo_id: like.liked for like in likes}
+            return dict(self._read(user_id, lambda session: session.connection().execute(
+                _PHOTO_LIKES_SELECT, {"user_id": user_id}
+            ).all()))
         except Exception as e:
             logger.error(f"Error getting photo likes: {e}", exc_info=True)
             return {}
 
     def count_photo_likes(self, user_id: int) -> int:
-        """Получение количества лайков фотографий пользователя"""
+        """Получение количества лайков фотографий пользователя (из user_counters)"""
         try:
-            return self.session.query(PhotoLike).filter_by(
-                user_id=user_id,
-                liked=True
-            ).count()
+            return self.get_counters(user_id)["photo_likes"]
         except Exception as e:
             logger.error(f"Error counting photo likes: {e}", exc_info=True)
             return 0
 
+    # === Счетчики ===
+    def get_counters(self, user_id: int) -> Dict[str, int]:
+        """
+        Все счетчики пользователя одним чтением по первичному ключу user_counters
+
+        Счетчики меняются в тех же транзакциях, что и записи; расхождения
+        исправляет core.db.counters.CounterReconciliation.
+
+        :return: словарь favorites, blacklist, photo_likes
+        """
+        row = self._read(user_id, lambda session: session.connection().execute(
+            _COUNTERS_SELECT, {"user_id": user_id}
+        ).first())
+        return dict(zip(COUNTER_FIELDS, row or (0,) * len(COUNTER_FIELDS)))
+
     # === Работа с историей просмотров ===
     def add_to_view_history(self, user_id: int, viewed_user_id: int) -> bool:
         """Добавление пользователя в историю просмотров"""
@@ -277,7 +424,10 @@ class UserRepository:
                 )
                 self.session.add(view)
 
+            if settings.SEEN_PROFILES_BITMAP:
+                self._merge_seen(user_id, [viewed_user_id])
             self.session.commit()
+            self._wrote(user_id)
             return True
 
         except Exception as e:
@@ -285,34 +435,86 @@ class UserRepository:
             self.session.rollback()
             return False
 
-    def get_view_history(self, user_id: int, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
-        """Получение истории просмотренных профилей"""
+    def record_views(self, user_id: int, viewed_ids: Iterable[int], source: Optional[str] = None) -> bool:
+        """
+        Пакетная запись показанных профилей (страница карусели поиска) одной
+        транзакцией: как add_to_view_history для каждой карточки - история
+        просмотров и, с SEEN_PROFILES_BITMAP, битовое множество
+
+        Найденные в VK пользователи могут еще не быть в таблице users,
+        строки для них создаются (ON CONFLICT DO NOTHING).
+
+        :param source: откуда пришел просмотр (колонка source истории)
+        """
         try:
-            history = self.session.query(MatchViewHistory).filter_by(
-                user_id=user_id
-            ).order_by(
-                desc(MatchViewHistory.viewed_at)
-            ).offset(offset).limit(limit).all()
-
-            return [
-                {
-                    "viewed_user_id": item.viewed_user_id,
-                    "viewed_at": item.viewed_at.isoformat()
-                }
-                for item in history
-            ]
+            viewed_ids = [viewed_id for viewed_id in dict.fromkeys(viewed_ids) if viewed_id != user_id]
+            if not viewed_ids:
+                return True
+
+            now = datetime.now()
+            self.session.execute(insert(User).values(
+                [{"id": uid} for uid in (user_id, *viewed_ids)]
+            ).on_conflict_do_nothing(index_elements=[User.id]))
+
+            existing = set(self.session.execute(
+                select(MatchViewHistory.viewed_user_id).where(
+                    MatchViewHistory.user_id == user_id,
+                    MatchViewHistory.viewed_user_id.in_(viewed_ids)
+                )
+            ).scalars())
+            if existing:
+                self.session.execute(
+                    update(MatchViewHistory)
+                    .where(MatchViewHistory.user_id == user_id, MatchViewHistory.viewed_user_id.in_(existing))
+                    .values(viewed_at=now),
+                    execution_options={"synchronize_session": False}
+                )
+            new_ids = [viewed_id for viewed_id in viewed_ids if viewed_id not in existing]
+            if new_ids:
+                self.session.execute(insert(MatchViewHistory).values([
+                    {"user_id": user_id, "viewed_user_id": viewed_id, "viewed_at": now, "source": source}
+                    for viewed_id in new_ids
+                ]))
+
+            if settings.SEEN_PROFILES_BITMAP:
+                self._merge_seen(user_id, viewed_ids)
+            self.session.commit()
+            self._wrote(user_id)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error recording views: {e}", exc_info=True)
+            self.session.rollback()
+            return False
+
+    def get_view_history(self, user_id: int, limit: int = 50, offset: int = 0) -> List[ViewRecord]:
+        """Получение истории просмотренных профилей (записи ViewRecord)"""
+        try:
+            return self._select_records(user_id, _VIEW_HISTORY_SELECT, ViewRecord, limit=limit, offset=offset)
         except Exception as e:
             logger.error(f"Error getting view history: {e}", exc_info=True)
             return []
 
-    def clear_view_history(self, user_id: int) -> bool:
-        """Очистка истории просмотров"""
+    def get_view_history_page(
+            self,
+            user_id: int,
+            limit: int = constants.BotConstants.PAGE_SIZE,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Получение страницы истории просмотров по курсору (viewed_at, id)"""
         try:
-            self.session.query(MatchViewHistory).filter_by(
-                user_id=user_id
-            ).delete()
+            return self._get_page(user_id, _VIEW_HISTORY_PAGE, ViewRecord, limit, cursor)
+        except Exception as e:
+            logger.error(f"Error getting view history page: {e}", exc_info=True)
+            return [], None
 
+    def clear_view_history(self, user_id: int) -> bool:
+        """Очистка истории просмотров (пачками, без загрузки строк в сессию)"""
+        try:
+            delete_in_batches(self.session, MatchViewHistory, MatchViewHistory.user_id == user_id)
+            self.session.query(SeenProfiles).filter_by(user_id=user_id).delete()
             self.session.commit()
+            self._wrote(user_id)
             return True
 
         except Exception as e:
@@ -320,52 +522,269 @@ class UserRepository:
             self.session.rollback()
             return False
 
+    # === Просмотренные профили (битовое множество) ===
+    def get_seen_profiles(self, user_id: int) -> RoaringBitmap:
+        """Просмотренные профили одним чтением строки seen_profiles"""
+        data = self.session.query(SeenProfiles.bitmap).filter(SeenProfiles.user_id == user_id).scalar()
+        return RoaringBitmap.from_bytes(data) if data else RoaringBitmap()
+
+    def mark_seen(self, user_id: int, viewed_ids: Iterable[int]) -> bool:
+        """Пакетное добавление просмотренных профилей в битовое множество"""
+        try:
+            self._merge_seen(user_id, viewed_ids)
+            self.session.commit()
+            self._wrote(user_id)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error marking profiles as seen: {e}", exc_info=True)
+            self.session.rollback()
+            return False
+
+    def rebuild_seen_profiles(self, user_id: int, since: Optional[datetime] = None) -> int:
+        """
+        Пересборка битового множества из истории просмотров: при включении
+        SEEN_PROFILES_BITMAP и после удаления старых просмотров
+
+        Строка seen_profiles создается (если ее нет) и блокируется до
+        чтения истории: просмотр, добавленный одновременно, либо попадает
+        в прочитанную историю, либо ждет блокировку и сливается с уже
+        пересобранным множеством.
+
+        :param since: учитывать просмотры не раньше (по умолчанию срок хранения из настроек)
+        :return: количество профилей в множестве
+        """
+        row = self._lock_seen_row(user_id)
+
+        since = since or view_history_cutoff(settings.VIEW_HISTORY_RETENTION_DAYS)
+        query = self.session.query(MatchViewHistory.viewed_user_id).filter(MatchViewHistory.user_id == user_id)
+        if since is not None:
+            query = query.filter(MatchViewHistory.viewed_at >= since)
+        bitmap = RoaringBitmap(row[0] for row in query.yield_per(constants.DbConstants.EXPORT_BATCH_SIZE))
+
+        row.bitmap = bitmap.to_bytes()
+        self.session.commit()
+        return len(bitmap)
+
+    def backfill_seen_profiles(self, batch_size: Optional[int] = None) -> int:
+        """
+        Создает seen_profiles для пользователей с историей просмотров, но без
+        строки множества (первое включение SEEN_PROFILES_BITMAP на работающей базе)
+
+        Пользователи обходятся пачками, каждый пересобирается в своей транзакции;
+        повторный запуск продолжает с оставшихся.
+
+        :return: количество пересобранных пользователей
+        """
+        batch_size = batch_size or constants.DbConstants.COUNTERS_BATCH_SIZE
+        rebuilt = 0
+        while True:
+            user_ids = self.session.execute(
+                select(MatchViewHistory.user_id).distinct()
+                .where(~exists().where(SeenProfiles.user_id == MatchViewHistory.user_id))
+                .order_by(MatchViewHistory.user_id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                self.rebuild_seen_profiles(user_id)
+            rebuilt += len(user_ids)
+        if rebuilt:
+            logger.info(f"Seen profiles rebuilt for {rebuilt} users")
+        return rebuilt
+
+    def _merge_seen(self, user_id: int, viewed_ids: Iterable[int]):
+        """Слияние новых ID с сохраненным множеством (без коммита)"""
+        row = self._lock_seen_row(user_id)
+        bitmap = RoaringBitmap.from_bytes(row.bitmap)
+        bitmap.update(viewed_ids)
+        row.bitmap = bitmap.to_bytes()
+
+    def _lock_seen_row(self, user_id: int) -> SeenProfiles:
+        """
+        Строка seen_profiles пользователя, заблокированная до конца транзакции
+
+        Пустая строка создается через ON CONFLICT DO NOTHING до блокировки:
+        два поиска, впервые отмечающие просмотры, не падают на уникальном
+        ключе, а второй ждет блокировку и сливает свои ID с записанными.
+        """
+        self.session.execute(insert(SeenProfiles).values(
+            user_id=user_id, bitmap=RoaringBitmap().to_bytes(), updated_at=datetime.now()
+        ).on_conflict_do_nothing(index_elements=[SeenProfiles.user_id]))
+        return self.session.query(SeenProfiles).filter_by(user_id=user_id).with_for_update().one()
+
     # === Взаимные действия ===
     def get_mutual_favorites(self, user_id: int) -> List[int]:
         """Получение списка взаимных избранных (кто добавил меня и я его)"""
         try:
-            # Пользователи, которых я добавил в избранное
-            my_favorites = {f.favorite_id for f in
-                            self.session.query(Favorite).filter_by(user_id=user_id).all()}
-
-            # Пользователи, которые добавили меня в избранное
-            favorited_me = {f.user_id for f in
-                            self.session.query(Favorite).filter_by(favorite_id=user_id).all()}
-
-            return list(my_favorites & favorited_me)
+            # Флаг is_mutual поддерживается при записи, поэтому достаточно
+            # одного чтения по частичному индексу ix_favorites_user_mutual
+            rows = self._read(user_id, lambda session: session.query(Favorite.favorite_id).filter(
+                Favorite.user_id == user_id,
+                Favorite.is_mutual.is_(True)
+            ).all())
+            return [row.favorite_id for row in rows]
 
         except Exception as e:
             logger.error(f"Error getting mutual favorites: {e}", exc_info=True)
             return []
 
+    def _lock_pair(self, user_id: int, other_id: int):
+        """
+        Блокировка пары пользователей до конца транзакции (pg_advisory_xact_lock)
+
+        Без нее встречные добавления в избранное не видят незакоммиченные
+        записи друг друга, и пара остается невзаимной. С блокировкой второе
+        добавление ждет коммита первого, и его UPDATE уже видит обратную запись.
+        """
+        if self.session.get_bind().dialect.name != "postgresql":
+            return
+        self.session.execute(select(func.pg_advisory_xact_lock(min(user_id, other_id), max(user_id, other_id))))
+
+    def _update_mutual(self, user_id: int, favorite_id: int, is_mutual: bool) -> int:
+        """
+        Выставляет is_mutual обеим записям пары одним UPDATE
+
+        Обновление выполняется только если обратная запись существует,
+        поэтому количество обновленных строк 2 означает взаимность.
+        """
+        reverse = aliased(Favorite)
+        stmt = update(Favorite).where(
+            or_(
+                and_(Favorite.user_id == user_id, Favorite.favorite_id == favorite_id),
+                and_(Favorite.user_id == favorite_id, Favorite.favorite_id == user_id)
+            ),
+            exists().where(reverse.user_id == favorite_id, reverse.favorite_id == user_id)
+        ).values(is_mutual=is_mutual)
+
+        result = self.session.execute(stmt, execution_options={"synchronize_session": False})
+        return result.rowcount
+
+    def _notify_mutual(self, user_id: int, favorite_id: int):
+        """Вызов подписчиков на взаимную симпатию"""
+        for callback in self._mutual_listeners:
+            try:
+                callback(user_id, favorite_id)
+            except Exception as e:
+                logger.error(f"Mutual match listener failed: {e}", exc_info=True)
+
     def get_mutual_likes(self, user_id: int) -> List[int]:
         """Получение списка пользователей с взаимными лайками фото"""
-        # Здесь должна быть более сложная логика анализа лайков
-        return []
+        try:
+            # Я лайкал фото владельца, и владелец лайкал мои фото:
+            # одно соединение агрегата с самим собой по первичному ключу
+            reverse = aliased(PhotoLikeEdge)
+            rows = self._read(user_id, lambda session: session.query(PhotoLikeEdge.owner_id).join(
+                reverse,
+                and_(reverse.liker_id == PhotoLikeEdge.owner_id, reverse.owner_id == PhotoLikeEdge.liker_id)
+            ).filter(
+                PhotoLikeEdge.liker_id == user_id,
+                PhotoLikeEdge.likes_count > 0,
+                reverse.likes_count > 0
+            ).all())
+            return [row.owner_id for row in rows]
 
-    # === Поиск и рекомендации ===
-    def get_next_match(self, user_id: int, current_match_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
-        """Получение следующего подходящего пользователя"""
+        except Exception as e:
+            logger.error(f"Error getting mutual likes: {e}", exc_info=True)
+            return []
+
+    def get_like_counts(self, user_id: int, candidate_ids: List[int]) -> Dict[int, int]:
+        """
+        Сигнал лайков для ранжирования: сколько лайков пользователь и кандидат
+        поставили фотографиям друг друга
+
+        :return: словарь candidate_id -> суммарное количество лайков в обе стороны
+        """
+        if not candidate_ids:
+            return {}
         try:
-            # Получаем черный список и избранное
-            blacklist = {item.banned_id for item in
-                         self.session.query(Blacklist).filter_by(user_id=user_id).all()}
+            rows = self.session.query(
+                PhotoLikeEdge.liker_id, PhotoLikeEdge.owner_id, PhotoLikeEdge.likes_count
+            ).filter(
+                or_(
+                    and_(PhotoLikeEdge.liker_id == user_id, PhotoLikeEdge.owner_id.in_(candidate_ids)),
+                    and_(PhotoLikeEdge.owner_id == user_id, PhotoLikeEdge.liker_id.in_(candidate_ids))
+                ),
+                PhotoLikeEdge.likes_count > 0
+            ).all()
+
+            counts: Dict[int, int] = {}
+            for liker_id, owner_id, likes_count in rows:
+                other = owner_id if liker_id == user_id else liker_id
+                counts[other] = counts.get(other, 0) + likes_count
+            return counts
 
-            favorites = {item.favorite_id for item in
-                         self.session.query(Favorite).filter_by(user_id=user_id).all()}
+        except Exception as e:
+            logger.error(f"Error getting like counts: {e}", exc_info=True)
+            return {}
 
-            viewed_users = {item.viewed_user_id for item in
-                            self.session.query(MatchViewHistory).filter_by(user_id=user_id).all()}
+    def _update_like_edge(self, liker_id: int, owner_id: int, delta: int):
+        """Инкрементальное обновление агрегата лайков в той же транзакции"""
+        stmt = insert(PhotoLikeEdge).values(
+            liker_id=liker_id,
+            owner_id=owner_id,
+            likes_count=max(delta, 0),
+            updated_at=datetime.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PhotoLikeEdge.liker_id, PhotoLikeEdge.owner_id],
+            set_={
+                "likes_count": func.greatest(PhotoLikeEdge.likes_count + delta, 0),
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.session.execute(stmt)
+
+    @staticmethod
+    def _parse_photo_owner(photo_id: str) -> Optional[int]:
+        """Извлекает ID владельца из идентификатора фото VK ("photo-1_2", "1_2")"""
+        owner = str(photo_id).replace("photo", "", 1).split("_", 1)[0]
+        try:
+            return int(owner) if "_" in str(photo_id) else None
+        except ValueError:
+            return None
+
+    # === Поиск и рекомендации ===
+    def get_excluded_ids(self, user_id: int) -> Union[Set[int], RoaringBitmap]:
+        """
+        ID, которые не нужно показывать в поиске: сам пользователь, черный
+        список, избранное и уже просмотренные (выбираются только ID, без строк)
 
+        Просмотры старше VIEW_HISTORY_RETENTION_DAYS не учитываются, даже
+        если фоновая очистка их еще не удалила. С SEEN_PROFILES_BITMAP
+        просмотренные читаются одной строкой seen_profiles (старые просмотры
+        из нее убирает фоновая очистка) и результат - RoaringBitmap.
+        """
+        excluded = {user_id}
+        for column, owner in ((Blacklist.banned_id, Blacklist.user_id),
+                              (Favorite.favorite_id, Favorite.user_id)):
+            excluded.update(row[0] for row in self.session.query(column).filter(owner == user_id))
+
+        if settings.SEEN_PROFILES_BITMAP:
+            seen = self.get_seen_profiles(user_id)
+            seen.update(excluded)
+            return seen
+
+        viewed = self.session.query(MatchViewHistory.viewed_user_id).filter(MatchViewHistory.user_id == user_id)
+        cutoff = view_history_cutoff(settings.VIEW_HISTORY_RETENTION_DAYS)
+        if cutoff is not None:
+            viewed = viewed.filter(MatchViewHistory.viewed_at >= cutoff)
+        excluded.update(row[0] for row in viewed)
+        return excluded
+
+    def get_next_match(self, user_id: int, current_match_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Получение следующего подходящего пользователя"""
+        try:
             # Исключаем себя, черный список, избранное и уже просмотренных
-            excluded_users = blacklist | favorites | viewed_users | {user_id}
+            excluded_users = self.get_excluded_ids(user_id)
 
             # Здесь должна быть логика поиска следующего пользователя
             # Например, через внешний API или сложный запрос к базе
 
             # Заглушка - просто берем случайного пользователя
             next_user = self.session.query(User).filter(
-                User.id.notin_(excluded_users)
+                User.id.notin_(list(excluded_users))
             ).order_by(func.random()).first()
 
             if not next_user:
@@ -385,6 +804,70 @@ class UserRepository:
             logger.error(f"Error getting next match: {e}", exc_info=True)
             return None
 
+    # === Маршрутизация чтений ===
+    def _read(self, user_id: int, query_fn: Callable[[Session], Any]) -> Any:
+        """
+        Выполняет чтение на реплике, если роутер ее выбрал, иначе в основной сессии
+
+        query_fn получает сессию и должен вернуть готовый результат (список,
+        число), а не ленивый запрос: сессия реплики закрывается сразу после
+        вызова. При ошибке соединения с репликой она временно исключается,
+        и чтение повторяется на основном сервере.
+        """
+        replica = self.router.choose(user_id) if self.router else None
+        if replica is None:
+            return query_fn(self.session)
+
+        session = replica.session()
+        try:
+            return query_fn(session)
+        except DBAPIError as e:
+            logger.warning(f"Read from {replica} failed, falling back to primary: {e}")
+            self.router.mark_failed(replica)
+        finally:
+            session.close()
+        return query_fn(self.session)
+
+    def _select_records(self, user_id: int, statement, record, **params) -> list:
+        """Выполняет готовый Core select на соединении сессии и упаковывает строки в record"""
+        rows = self._read(user_id, lambda session: session.connection().execute(
+            statement, {"user_id": user_id, **params}
+        ).all())
+        return [record._make(row) for row in rows]
+
+    def _wrote(self, user_id: int):
+        """Окно "читай свои записи": следующие чтения пользователя - с основного сервера"""
+        if self.router:
+            self.router.record_write(user_id)
+
+    # === Пагинация ===
+    def _get_page(self, user_id: int, statements: _PageStatements, record, limit: int,
+                  cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Выборка одной страницы по ключу (timestamp, id) в порядке убывания
+
+        Запросы готовые (_page_statements), позиция курсора передается
+        параметрами ts и id. Запрашивается limit + 1 строка: лишняя строка
+        означает, что есть следующая страница, и курсор строится по последней
+        выданной записи.
+        """
+        position = decode_cursor(cursor)
+        params = {"user_id": user_id, "limit": limit + 1}
+        statement = statements.first
+        if position:
+            params["ts"], params["id"] = position
+            statement = statements.after
+
+        rows = self._read(user_id, lambda session: session.connection().execute(statement, params).all())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last._mapping[statements.ts_column], last.id)
+
+        return [record._make(row[:-1]).as_dict() for row in rows], next_cursor
+
     def close(self):
         """Закрытие сессии"""
         try:
@@ -0,0 +1,127 @@
+"""
+Срок хранения истории просмотров
+
+match_view_history получает строку на каждый показанный профиль и без
+очистки растет бесконечно. ViewHistoryRetention удаляет просмотры старше
+VIEW_HISTORY_RETENTION_DAYS пачками по первичному ключу (индекс по
+viewed_at), с коммитом после каждой пачки: блокировки короткие, а
+autovacuum успевает за удалением. Забытые профили снова появляются в
+поиске, потому что исключения строятся только по свежим просмотрам
+(в режиме SEEN_PROFILES_BITMAP множества затронутых пользователей
+пересобираются после удаления).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from config import constants
+from core.db.connector import get_session
+from core.db.models import MatchViewHistory
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_batches(session: Session, model, condition, batch_size: Optional[int] = None,
+                      pause: float = 0.0) -> int:
+    """
+    Удаляет строки модели по условию пачками не больше batch_size
+
+    Каждая пачка - отдельная транзакция: DELETE ... WHERE id IN
+    (SELECT id ... LIMIT batch_size).
+
+    Returns:
+        Количество удаленных строк
+    """
+    batch_size = batch_size or constants.DbConstants.PURGE_BATCH_SIZE
+    total = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        deleted = session.execute(
+            delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def view_history_cutoff(retention_days: Optional[int], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Момент, раньше которого просмотры забываются (None - хранить всегда)"""
+    if not retention_days:
+        return None
+    return (now or datetime.now()) - timedelta(days=retention_days)
+
+
+class ViewHistoryRetention(threading.Thread):
+    """
+    Фоновая очистка истории просмотров
+
+    Args:
+        retention_days: сколько дней помнить просмотр
+        interval: пауза между запусками очистки, сек
+        batch_size: строк в одной транзакции удаления
+        pause: пауза между пачками, сек
+        session_factory: фабрика сессий SQLAlchemy
+        rebuild_seen: пересобирать seen_profiles пользователей, у которых
+                      удалены просмотры (режим SEEN_PROFILES_BITMAP)
+    """
+
+    def __init__(self,
+                 retention_days: int,
+                 interval: float = 3600.0,
+                 batch_size: Optional[int] = None,
+                 pause: float = 0.1,
+                 session_factory: Callable[[], Session] = get_session,
+                 rebuild_seen: bool = False):
+        super().__init__(name="view-history-retention", daemon=True)
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size or constants.DbConstants.PURGE_BATCH_SIZE
+        self.pause = pause
+        self.session_factory = session_factory
+        self.rebuild_seen = rebuild_seen
+        self._stopped = threading.Event()
+
+    def purge(self, now: Optional[datetime] = None) -> int:
+        """Удаляет просмотры старше срока хранения, возвращает количество строк"""
+        cutoff = view_history_cutoff(self.retention_days, now)
+        session = self.session_factory()
+        expired = MatchViewHistory.viewed_at < cutoff
+        try:
+            affected = set()
+            if self.rebuild_seen:
+                affected = {row[0] for row in session.query(MatchViewHistory.user_id).filter(expired).distinct()}
+            deleted = delete_in_batches(session, MatchViewHistory, expired, self.batch_size, self.pause)
+            if affected:
+                # repositories импортирует этот модуль, поэтому импорт здесь
+                from core.db.repositories import UserRepository
+                repo = UserRepository(session)
+                for user_id in affected:
+                    repo.rebuild_seen_profiles(user_id, since=cutoff)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        if deleted:
+            logger.info(f"Purged {deleted} view history rows older than {cutoff:%Y-%m-%d}")
+        return deleted
+
+    def run(self):
+        while True:
+            try:
+                self.purge()
+            except Exception as e:
+                logger.error(f"View history purge failed: {e}", exc_info=True)
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stopped.set()
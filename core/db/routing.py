@@ -0,0 +1,153 @@
+"""
+Маршрутизация чтений на реплики PostgreSQL
+
+Списки и счетчики (избранное, черный список, история, лайки) можно
+читать с реплик, разгружая основной сервер. ReplicaRouter выбирает
+реплику по кругу и возвращает None (читать с основного сервера), если:
+- пользователь недавно что-то записал: в течение REPLICA_STICKY_SECONDS
+  его чтения идут на основной сервер, чтобы он сразу видел свои изменения;
+- все реплики отстают больше REPLICA_MAX_LAG_SECONDS или недоступны.
+
+Окно "читай свои записи" хранится в памяти процесса. В многопроцессном
+режиме все события пользователя обрабатывает один процесс, поэтому его
+записи и чтения видят одно и то же окно.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from config import constants
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики в секундах; 0, если все полученные изменения уже применены
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    """Реплика: движок создается при первом обращении"""
+
+    __slots__ = ('dsn', '_engine', '_engine_factory', 'down_until', 'lag', 'lag_checked_at')
+
+    def __init__(self, dsn: str, engine_factory: Callable = create_engine):
+        self.dsn = dsn
+        self._engine = None
+        self._engine_factory = engine_factory
+        self.down_until = 0.0
+        self.lag = 0.0
+        self.lag_checked_at = float('-inf')
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = self._engine_factory(self.dsn, pool_pre_ping=True)
+        return self._engine
+
+    def session(self) -> Session:
+        return Session(bind=self.engine)
+
+    def __repr__(self) -> str:
+        host = self.dsn.rsplit('@', 1)[-1]
+        return f"Replica({host})"
+
+
+class ReplicaRouter:
+    """
+    Выбор реплики для чтения с учетом недавних записей пользователя
+
+    Args:
+        dsns: строки подключения к репликам
+        sticky_seconds: сколько читать с основного сервера после записи пользователя
+        max_lag: допустимое отставание реплики, сек
+        lag_check_interval: как часто проверять отставание реплики, сек
+        retry_after: через сколько повторно пробовать упавшую реплику, сек
+        clock: источник времени (для тестов)
+    """
+
+    def __init__(self,
+                 dsns: Sequence[str] = (),
+                 sticky_seconds: float = 5.0,
+                 max_lag: float = 10.0,
+                 lag_check_interval: Optional[float] = None,
+                 retry_after: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 engine_factory: Callable = create_engine):
+        self.replicas = [Replica(dsn, engine_factory) for dsn in dsns]
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.lag_check_interval = (constants.DbConstants.REPLICA_LAG_CHECK_INTERVAL
+                                   if lag_check_interval is None else lag_check_interval)
+        self.retry_after = constants.DbConstants.REPLICA_RETRY_AFTER if retry_after is None else retry_after
+        self.clock = clock
+        # user_id -> момент окончания окна; порядок вставки совпадает с порядком окончания
+        self._sticky: "OrderedDict[int, float]" = OrderedDict()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def record_write(self, user_id: int):
+        """Пользователь записал данные: его чтения на время идут на основной сервер"""
+        if not self.replicas or not self.sticky_seconds:
+            return
+        now = self.clock()
+        with self._lock:
+            self._sticky.pop(user_id, None)
+            self._sticky[user_id] = now + self.sticky_seconds
+            while self._sticky:
+                expires = next(iter(self._sticky.values()))
+                if expires > now:
+                    break
+                self._sticky.popitem(last=False)
+
+    def choose(self, user_id: Optional[int] = None) -> Optional[Replica]:
+        """Реплика для чтения или None, если читать нужно с основного сервера"""
+        if not self.replicas:
+            return None
+        now = self.clock()
+        with self._lock:
+            expires = self._sticky.get(user_id)
+            if expires is not None and expires > now:
+                return None
+            start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._usable(replica, now):
+                return replica
+        return None
+
+    def mark_failed(self, replica: Replica):
+        """Ошибка запроса к реплике: не использовать ее retry_after секунд"""
+        replica.down_until = self.clock() + self.retry_after
+        logger.warning(f"{replica} failed, reading from primary for {self.retry_after:.0f}s")
+
+    def _usable(self, replica: Replica, now: float) -> bool:
+        if replica.down_until > now:
+            return False
+        if now - replica.lag_checked_at >= self.lag_check_interval:
+            replica.lag_checked_at = now
+            try:
+                with replica.engine.connect() as connection:
+                    replica.lag = float(connection.execute(LAG_QUERY).scalar() or 0)
+            except Exception as e:
+                logger.warning(f"Lag check failed for {replica}: {e}")
+                self.mark_failed(replica)
+                return False
+            if replica.lag > self.max_lag:
+                logger.warning(f"{replica} lags {replica.lag:.1f}s, reading from primary")
+        return replica.lag <= self.max_lag
+
+
+replica_router = ReplicaRouter(
+    settings.POSTGRES_REPLICA_DSNS,
+    sticky_seconds=settings.REPLICA_STICKY_SECONDS,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+)
@@ -0,0 +1,244 @@
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from sqlalchemy import func, null, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config import constants
+from core.db.connector import get_session
+from core.db.counters import reconcile_counters
+from core.db.migrations import backfill_mutual_favorites
+from core.db.models import Favorite, Blacklist, PhotoLike, PhotoLikeEdge, User
+from core.db.repositories import UserRepository
+
+logger = logging.getLogger(__name__)
+
+CSV_FIELDS = ["kind", "target_id", "created_at", "liked"]
+
+
+class UserDataTransfer:
+    """
+    Потоковый экспорт и импорт пользовательских данных: избранное, черный список, лайки фото
+
+    Экспорт читает строки через серверный курсор (yield_per) и пишет их в файл
+    по одной, импорт вставляет записи пачками с обработкой конфликтов.
+    Память не зависит от количества перемещаемых строк.
+
+    Импорт выполняется одной транзакцией: при ошибке не остается
+    частично перенесенных данных, и повторный запуск начинается с чистого
+    состояния. Производные данные (is_mutual, владельцы фото, агрегат
+    photo_like_edges, счетчики) пересчитываются в той же транзакции.
+    """
+
+    FORMATS = ("jsonl", "csv")
+
+    def __init__(self, session: Session = None, batch_size: Optional[int] = None):
+        self.session = session or get_session()
+        self.batch_size = batch_size or constants.DbConstants.EXPORT_BATCH_SIZE
+
+    # === Экспорт ===
+    def iter_user_data(self, user_id: int) -> Iterator[Dict[str, Any]]:
+        """Последовательно выдает все записи пользователя в виде словарей"""
+        queries = (
+            ("favorite", select(Favorite.favorite_id, Favorite.added_at, null())
+             .where(Favorite.user_id == user_id)),
+            ("blacklist", select(Blacklist.banned_id, Blacklist.created_at, null())
+             .where(Blacklist.user_id == user_id)),
+            ("photo_like", select(PhotoLike.photo_id, PhotoLike.created_at, PhotoLike.liked)
+             .where(PhotoLike.user_id == user_id)),
+        )
+
+        for kind, query in queries:
+            result = self.session.execute(query.execution_options(yield_per=self.batch_size))
+            for target_id, created_at, liked in result:
+                yield {
+                    "kind": kind,
+                    "target_id": target_id,
+                    "created_at": created_at.isoformat() if created_at else None,
+                    "liked": liked,
+                }
+
+    def export_user_data(self, user_id: int, stream: TextIO, fmt: str = "jsonl") -> int:
+        """
+        Экспорт данных пользователя в поток
+
+        :param user_id: ID пользователя
+        :param stream: текстовый поток для записи (файл, sys.stdout и т.п.)
+        :param fmt: формат - jsonl (JSON построчно) или csv
+        :return: количество выгруженных записей
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}. Allowed: {self.FORMATS}")
+
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+        count = 0
+        for record in self.iter_user_data(user_id):
+            if writer:
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record, ensure_ascii=False))
+                stream.write("\n")
+            count += 1
+
+        logger.info(f"Exported {count} records for user {user_id}")
+        return count
+
+    # === Импорт ===
+    def import_user_data(self, user_id: int, stream: TextIO, fmt: str = "jsonl") -> Dict[str, int]:
+        """
+        Импорт данных пользователя из потока пачками в одной транзакции
+
+        Уже существующие записи избранного и черного списка пропускаются,
+        для лайков фото обновляется статус. Уведомления о взаимной симпатии
+        при импорте не отправляются.
+
+        :param user_id: ID пользователя, которому принадлежат данные (может отличаться
+                        от исходного при переносе аккаунта)
+        :param stream: текстовый поток с данными в формате export_user_data
+        :param fmt: формат - jsonl или csv
+        :return: количество вставленных (для лайков - вставленных и обновленных) записей по типам
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}. Allowed: {self.FORMATS}")
+
+        records = csv.DictReader(stream) if fmt == "csv" else self._read_jsonl(stream)
+        stats = {"favorite": 0, "blacklist": 0, "photo_like": 0}
+        batches: Dict[str, List[Dict[str, Any]]] = {kind: [] for kind in stats}
+
+        try:
+            self._ensure_users([user_id])
+            for record in records:
+                kind = record.get("kind")
+                if kind not in batches:
+                    logger.warning(f"Skipping record of unknown kind: {kind}")
+                    continue
+
+                batches[kind].append(self._to_row(user_id, kind, record))
+                if len(batches[kind]) >= self.batch_size:
+                    stats[kind] += self._flush(kind, batches[kind])
+                    batches[kind] = []
+
+            for kind, rows in batches.items():
+                if rows:
+                    stats[kind] += self._flush(kind, rows)
+
+            # Пачки вставляются в обход репозитория, производные данные пересчитываются целиком
+            backfill_mutual_favorites(self.session.connection(), user_id)
+            self._rebuild_like_edges(user_id)
+            reconcile_counters(self.session, user_ids=[user_id])
+            self.session.commit()
+
+            logger.info(f"Imported records for user {user_id}: {stats}")
+            return stats
+
+        except Exception as e:
+            logger.error(f"Error importing user data: {e}", exc_info=True)
+            self.session.rollback()
+            raise
+
+    @staticmethod
+    def _read_jsonl(stream: TextIO) -> Iterator[Dict[str, Any]]:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    @staticmethod
+    def _to_row(user_id: int, kind: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Преобразует запись экспорта в строку для вставки"""
+        created_at = record.get("created_at")
+        created_at = datetime.fromisoformat(created_at) if created_at else datetime.now()
+
+        if kind == "favorite":
+            return {"user_id": user_id, "favorite_id": int(record["target_id"]), "added_at": created_at}
+        if kind == "blacklist":
+            return {"user_id": user_id, "banned_id": int(record["target_id"]), "created_at": created_at}
+
+        liked = record.get("liked")
+        if isinstance(liked, str):
+            liked = liked.lower() in ("true", "1")
+        photo_id = str(record["target_id"])
+        return {
+            "user_id": user_id,
+            "photo_id": photo_id,
+            "owner_id": UserRepository._parse_photo_owner(photo_id),
+            "liked": True if liked is None else bool(liked),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    def _flush(self, kind: str, rows: List[Dict[str, Any]]) -> int:
+        """Вставка одной пачки записей с обработкой конфликтов (без коммита)"""
+        if kind == "favorite":
+            self._ensure_users(row["favorite_id"] for row in rows)
+            stmt = insert(Favorite).values(rows).on_conflict_do_nothing(
+                index_elements=[Favorite.user_id, Favorite.favorite_id]
+            )
+        elif kind == "blacklist":
+            self._ensure_users(row["banned_id"] for row in rows)
+            stmt = insert(Blacklist).values(rows).on_conflict_do_nothing(
+                index_elements=[Blacklist.user_id, Blacklist.banned_id]
+            )
+        else:
+            stmt = insert(PhotoLike).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[PhotoLike.user_id, PhotoLike.photo_id],
+                set_={
+                    "liked": stmt.excluded.liked,
+                    "owner_id": func.coalesce(PhotoLike.owner_id, stmt.excluded.owner_id),
+                    "updated_at": stmt.excluded.updated_at
+                }
+            )
+
+        return self.session.execute(stmt).rowcount
+
+    def _rebuild_like_edges(self, liker_id: int):
+        """Пересчет агрегата photo_like_edges пользователя по его лайкам"""
+        now = datetime.now()
+        counts = dict(self.session.execute(
+            select(PhotoLike.owner_id, func.count())
+            .where(PhotoLike.user_id == liker_id, PhotoLike.liked.is_(True), PhotoLike.owner_id.isnot(None))
+            .group_by(PhotoLike.owner_id)
+        ).all())
+        self.session.execute(
+            update(PhotoLikeEdge)
+            .where(PhotoLikeEdge.liker_id == liker_id, PhotoLikeEdge.owner_id.notin_(list(counts)))
+            .values(likes_count=0, updated_at=now)
+        )
+        if counts:
+            stmt = insert(PhotoLikeEdge).values([
+                {"liker_id": liker_id, "owner_id": owner_id, "likes_count": count, "updated_at": now}
+                for owner_id, count in counts.items()
+            ])
+            self.session.execute(stmt.on_conflict_do_update(
+                index_elements=[PhotoLikeEdge.liker_id, PhotoLikeEdge.owner_id],
+                set_={"likes_count": stmt.excluded.likes_count, "updated_at": stmt.excluded.updated_at}
+            ))
+
+    def _ensure_users(self, user_ids: Iterable[int]):
+        """Создает недостающие записи users, на которые ссылаются внешние ключи"""
+        rows = [{"id": user_id} for user_id in set(user_ids)]
+        if rows:
+            self.session.execute(insert(User).values(rows).on_conflict_do_nothing(index_elements=[User.id]))
+
+    def close(self):
+        """Закрытие сессии"""
+        try:
+            if self.session:
+                self.session.close()
+        except Exception as e:
+            logger.error(f"Error closing session: {e}", exc_info=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
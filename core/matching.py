@@ -1,44 +1,315 @@
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import datetime
+
+from vk_api.exceptions import ApiError
+
 from config import constants
-from services.analyzer import InterestAnalyzer
+from services.analyzer import analyzer as shared_analyzer
+from core.metrics import RANKING_LATENCY
+from core.vk_api.models.candidate import Candidate
+
+logger = logging.getLogger(__name__)
+
+# Поиски идут в потоках цикла событий, а словарь TF-IDF обучается один раз
+_fit_lock = threading.Lock()
+
+
+def score_candidate(user, candidate, analyzer, like_count=0, text_similarity=0.0, group_similarity=None):
+    """
+    Рейтинг кандидата: возраст, город, общие интересы, лайки и TF-IDF близость анкет
+
+    Одна формула и для ранжирования в процессе бота, и в пуле процессов.
+    group_similarity - оценка сходства групп, посчитанная для всей пачки
+    (CommonInterestEngine.group_similarities).
+    """
+    weights = constants.BotConstants.WEIGHTS
+    score = 0
+
+    user_age, candidate_age = MatchFinder._get_age(user), MatchFinder._get_age(candidate)
+    if user_age and candidate_age:
+        age_gap = abs(user_age - candidate_age)
+        score += weights['age'] * max(0.0, 1 - age_gap / (constants.BotConstants.AGE_RANGE + 1))
+
+    user_city = MatchFinder._get_city_id(user)
+    if user_city and user_city == MatchFinder._get_city_id(candidate):
+        score += weights['city']
+
+    score += analyzer.interests.score(user, candidate, group_similarity)
+    score += MatchFinder._like_score(like_count)
+    score += weights.get('text', 0) * text_similarity
+    return score
 
 
 class MatchFinder:
-    def __init__(self, vk_client, user_vk_client):
+    def __init__(self, vk_client, user_vk_client, user_repo=None, executor=None):
         self.vk = vk_client
         self.user_vk = user_vk_client
-        self.analyzer = InterestAnalyzer()
+        self.user_repo = user_repo
+        self.executor = executor
+        self.analyzer = shared_analyzer
+
+    def find_matches(self, user_id, user_info=None):
+        """
+        Кандидаты по убыванию рейтинга: список (рейтинг, Candidate)
 
-    def find_matches(self, user_id):
-        user_info = self._get_user_info(user_id)
-        candidates = self._search_candidates(user_info)
-        return self._rank_candidates(user_info, candidates)
+        user_info - уже полученный профиль пользователя (users.get), чтобы не запрашивать его повторно
+        """
+        user_info = user_info or self._get_user_info(user_id)
+        user_info, candidates = self._collect_candidates(user_info)
+        self._ensure_fitted(user_info, candidates)
+        with RANKING_LATENCY.time(stage="rank"):
+            return self._rank_candidates(user_info, candidates)
+
+    async def find_matches_async(self, user_id, user_info=None):
+        """
+        Поиск для асинхронных обработчиков, не блокирующий цикл событий
+
+        Запросы к VK и обучение словаря выполняются в потоке пула цикла
+        событий, ранжирование - в пуле процессов (RankingExecutor) или,
+        без него, тоже в потоке. Запросы к базе остаются в цикле событий:
+        сессия репозитория не потокобезопасна.
+        """
+        loop = asyncio.get_running_loop()
+        user_info = user_info or await loop.run_in_executor(None, self._get_user_info, user_id)
+        excluded = self._get_excluded_ids(user_info)
+        user_info, candidates = await loop.run_in_executor(None, self._collect_and_fit, user_info, excluded)
+        like_counts = self._get_like_counts(user_info, candidates)
+        if self.executor is None:
+            with RANKING_LATENCY.time(stage="rank"):
+                return await loop.run_in_executor(None, self._rank_candidates, user_info, candidates, like_counts)
+        with RANKING_LATENCY.time(stage="rank_pool"):
+            return await self.executor.rank(user_info, candidates, like_counts)
+
+    def _collect_and_fit(self, user_info, excluded):
+        user_info, candidates = self._collect_candidates(user_info, excluded)
+        self._ensure_fitted(user_info, candidates)
+        return user_info, candidates
+
+    def _ensure_fitted(self, user_info, candidates):
+        """
+        Обучает словарь TF-IDF на первой пачке анкет
+
+        Без обученного словаря вес 'text' всегда нулевой. Обучение - один
+        раз на процесс, дальше анкеты только трансформируются, и оценки
+        разных поисков остаются сравнимыми.
+        """
+        if self.analyzer.fitted:
+            return
+        texts = [text for text in map(self.analyzer.profile_text, [user_info, *candidates]) if text]
+        if len(texts) < 2:
+            return
+        with _fit_lock:
+            if self.analyzer.fitted:
+                return
+            try:
+                self.analyzer.fit(texts)
+            except ValueError as e:
+                # Например, в анкетах только стоп-слова
+                logger.warning(f"Failed to fit TF-IDF vocabulary: {e}")
 
     def _get_user_info(self, user_id):
         return self.user_vk.get_user_info(user_id)
 
-    def _search_candidates(self, user_info):
+    def _collect_candidates(self, user_info, excluded=None):
+        """
+        Поиск кандидатов по стадиям, от дешевых к дорогим
+
+        Стадии - генераторы: users.search запрашивается постранично, пока
+        локальные фильтры и предварительный рейтинг не наберут достаточно
+        хороших кандидатов, а photos.get и groups.get вызываются только для
+        короткого списка лучших, пакетно через execute.
+
+        Args:
+            excluded: исключенные ID, если уже получены (по умолчанию из репозитория)
+
+        Returns:
+            (профиль пользователя с группами, кандидаты короткого списка)
+        """
+        if excluded is None:
+            excluded = self._get_excluded_ids(user_info)
+        with RANKING_LATENCY.time(stage="search"):
+            candidates = self._search_candidates(user_info)
+            candidates = self._filter_candidates(user_info, candidates, excluded)
+            shortlist = self._shortlist(self._coarse_scores(user_info, candidates))
+        if not shortlist:
+            return user_info, []
+        with RANKING_LATENCY.time(stage="enrich"):
+            user_id = user_info.get('id') if user_info.get('groups') is None else None
+            missing = [candidate.id for candidate in shortlist if candidate.groups is None]
+            groups = self._fetch_groups(missing + [user_id] if user_id else missing)
+            if user_id:
+                user_info = dict(user_info, groups=groups.get(user_id, ()))
+            photos = self._fetch_photos([candidate.id for candidate in shortlist])
+            return user_info, list(self._enrich(shortlist, groups, photos))
+
+    def _search_params(self, user_info):
+        """Параметры users.search; возраст и город - только если известны из профиля"""
         params = {
-            'age_from': max(user_info['age'] - constants.BotConstants.AGE_RANGE,
-                            constants.BotConstants.MIN_AGE),
-            'age_to': min(user_info['age'] + constants.BotConstants.AGE_RANGE,
-                          constants.BotConstants.MAX_AGE),
-            'sex': 1 if user_info['sex'] == 2 else 2,
-            'city': user_info['city'],
+            'sex': 1 if user_info.get('sex') == 2 else 2,
             'has_photo': 1,
-            'count': 100,
             'fields': constants.VkConstants.USER_FIELDS
         }
-        return self.vk.search_users(params)
+        age = self._get_age(user_info)
+        if age:
+            params['age_from'] = max(age - constants.BotConstants.AGE_RANGE, constants.BotConstants.MIN_AGE)
+            params['age_to'] = min(age + constants.BotConstants.AGE_RANGE, constants.BotConstants.MAX_AGE)
+        city = self._get_city_id(user_info)
+        if city:
+            params['city'] = city
+        return params
 
-    def _rank_candidates(self, user_info, candidates):
-        scored = []
+    def _search_candidates(self, user_info):
+        """Стадия 1: users.search постранично; следующая страница запрашивается, только когда нужна"""
+        params = self._search_params(user_info)
+        page_size = constants.VkConstants.SEARCH_PAGE_SIZE
+        for offset in range(0, constants.VkConstants.MAX_SEARCH_RESULTS, page_size):
+            response = self.vk.search_users(dict(params, offset=offset, count=page_size))
+            items = response.get('items', []) if isinstance(response, dict) else response
+            # Компактные записи с возрастом, вычисленным один раз при разборе
+            for item in items:
+                yield Candidate.from_raw(item)
+            if len(items) < page_size:
+                return
+
+    def _get_excluded_ids(self, user_info):
+        if not self.user_repo or not user_info.get('id'):
+            return set()
+        return self.user_repo.get_excluded_ids(user_info['id'])
+
+    def _filter_candidates(self, user_info, candidates, excluded):
+        """
+        Стадия 2: локальные фильтры без обращений к API
+
+        Отбрасываются исключенные (черный список, избранное, просмотренные),
+        закрытые профили, анкеты без года рождения и из другого города.
+        """
+        user_city = self._get_city_id(user_info)
+        seen = set()  # повторы между страницами поиска; excluded не копируется (может быть RoaringBitmap)
+        for candidate in candidates:
+            if candidate.id in excluded or candidate.id in seen or candidate.is_closed or candidate.age is None:
+                continue
+            if user_city and candidate.city_id != user_city:
+                continue
+            seen.add(candidate.id)
+            yield candidate
+
+    def _coarse_scores(self, user_info, candidates):
+        """Стадия 3: предварительный рейтинг только по полям из ответа users.search"""
+        for candidate in candidates:
+            yield score_candidate(user_info, candidate, self.analyzer), candidate
+
+    @staticmethod
+    def _shortlist(scored, size=None, good_score=None):
+        """
+        Стадия 4: size кандидатов с лучшим предварительным рейтингом
+
+        Поток дочитывается, только пока кандидатов с рейтингом не ниже
+        good_score меньше size; при равном рейтинге выше тот, кто раньше в поиске.
+        """
+        size = size or constants.BotConstants.SHORTLIST_SIZE
+        good_score = constants.BotConstants.GOOD_COARSE_SCORE if good_score is None else good_score
+        heap = []
+        good = 0
+        for position, (score, candidate) in enumerate(scored):
+            item = (score, -position, candidate)
+            if len(heap) < size:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+            if score >= good_score:
+                good += 1
+                if good >= size:
+                    break
+        return [candidate for _, _, candidate in sorted(heap, key=lambda item: item[:2], reverse=True)]
+
+    @staticmethod
+    def _enrich(candidates, groups, photos):
+        """
+        Стадия 5: фото и группы короткого списка из пакетных запросов
+
+        Кандидаты без фото пропускаются. Фото с наибольшим числом лайков
+        становится фото карточки (photo_id сохраняется и в результатах
+        поиска между страницами карусели). Если фото получить не удалось
+        (photos is None), остается фото профиля из users.search.
+        """
         for candidate in candidates:
-            score = self._calculate_match_score(user_info, candidate)
+            if photos is not None:
+                candidate_photos = photos.get(candidate.id)
+                if not candidate_photos:
+                    continue
+                candidate.set_extra('photos', candidate_photos)
+                top = candidate_photos[0]
+                candidate.photo_id = f"{top['owner_id']}_{top['id']}"
+            elif not candidate.has_photo:
+                continue
+            if candidate.id in groups:
+                candidate.set_extra('groups', groups[candidate.id])
+            yield candidate
+
+    def _fetch_groups(self, user_ids):
+        """Подписки всех кандидатов короткого списка пачками через execute"""
+        if not user_ids:
+            return {}
+        try:
+            return self.user_vk.get_groups_bulk(user_ids)
+        except ApiError as e:
+            logger.warning(f"Error fetching groups: {e}")
+            return {}
+
+    def _fetch_photos(self, user_ids):
+        """Лучшие фото кандидатов короткого списка пачками через execute; None при ошибке запроса"""
+        try:
+            return self.user_vk.get_top_photos_bulk(user_ids)
+        except ApiError as e:
+            logger.warning(f"Error fetching photos: {e}")
+            return None
+
+    def _rank_candidates(self, user_info, candidates, like_counts=None):
+        if like_counts is None:
+            like_counts = self._get_like_counts(user_info, candidates)
+        text_similarities = self.analyzer.text_similarities(
+            self.analyzer.profile_text(user_info),
+            [self.analyzer.profile_text(candidate) for candidate in candidates]
+        )
+        group_similarities = self.analyzer.interests.group_similarities(user_info, candidates)
+        scored = []
+        for candidate, text_similarity, group_similarity in zip(candidates, text_similarities, group_similarities):
+            score = score_candidate(user_info, candidate, self.analyzer,
+                                    like_counts.get(candidate.get('id'), 0), text_similarity, group_similarity)
             if score > 0:
                 scored.append((score, candidate))
         return sorted(scored, key=lambda x: x[0], reverse=True)
 
     def _calculate_match_score(self, user, candidate):
-        score = 0
-        # Логика расчета рейтинга
-        return score
\ No newline at end of file
+        return score_candidate(user, candidate, self.analyzer)
+
+    def _get_like_counts(self, user_info, candidates):
+        """Лайки фото между пользователем и кандидатами одним запросом на всю пачку"""
+        if not self.user_repo or not user_info.get('id'):
+            return {}
+        return self.user_repo.get_like_counts(user_info['id'], [c['id'] for c in candidates if c.get('id')])
+
+    @staticmethod
+    def _like_score(like_count):
+        cap = constants.BotConstants.MAX_PHOTOS
+        return constants.BotConstants.WEIGHTS['likes'] * min(like_count, cap) / cap
+
+    @staticmethod
+    def _get_age(profile):
+        """Возраст из поля age или года в bdate (D.M.YYYY); None, если год не указан или некорректен"""
+        if profile.get('age'):
+            return profile['age']
+        parts = (profile.get('bdate') or '').split('.')
+        if len(parts) == 3 and parts[2].isdigit():
+            return datetime.now().year - int(parts[2])
+        return None
+
+    @staticmethod
+    def _get_city_id(profile):
+        if isinstance(profile, Candidate):
+            return profile.city_id
+        city = profile.get('city')
+        return city.get('id') if isinstance(city, dict) else city
\ No newline at end of file
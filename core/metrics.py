@@ -0,0 +1,318 @@
+"""
+Легковесные метрики горячих путей бота
+
+Гистограммы задержек и счетчики хранятся в памяти процесса и отдаются в
+текстовом формате Prometheus через встроенный HTTP сервер или
+периодически сбрасываются в файл.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Текущее значение (например, глубина очереди)"""
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счетчики корзин (+Inf последней), сумма
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HANDLER_LATENCY = registry.histogram(
+    "bot_handler_latency_seconds", "Время обработки команды бота", ("handler", "command"))
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Ошибки при обработке команд", ("handler", "command"))
+REPOSITORY_LATENCY = registry.histogram(
+    "bot_repository_latency_seconds", "Время выполнения методов репозитория", ("method",))
+VK_API_LATENCY = registry.histogram(
+    "bot_vk_api_latency_seconds", "Время вызова методов VK API", ("method",))
+VK_API_ERRORS = registry.counter(
+    "bot_vk_api_errors_total", "Ошибки VK API по кодам", ("method", "code"))
+VK_RATE_LIMIT_WAIT = registry.histogram(
+    "bot_vk_rate_limit_wait_seconds", "Ожидание перед вызовом VK API из-за лимита запросов",
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.34, 0.5, 1.0, 2.0, 5.0))
+RANKING_LATENCY = registry.histogram(
+    "bot_ranking_latency_seconds", "Время ранжирования кандидатов", ("stage",))
+QUEUE_DEPTH = registry.gauge(
+    "bot_queue_depth", "Количество элементов в очередях", ("queue",))
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, **labels):
+    """
+    Декоратор замера времени выполнения синхронной или асинхронной функции
+
+    Если метка method не указана, подставляется имя функции.
+    """
+    def decorator(func):
+        metric_labels = dict(labels)
+        if "method" in histogram.label_names:
+            metric_labels.setdefault("method", func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(**metric_labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **metric_labels)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**metric_labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **metric_labels)
+        return wrapper
+
+    return decorator
+
+
+def instrument_methods(histogram: Histogram):
+    """Декоратор класса: замеряет все публичные методы по метке method"""
+    def decorator(cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or not callable(attr) or isinstance(attr, (staticmethod, classmethod)):
+                continue
+            setattr(cls, name, timed(histogram, method=name)(attr))
+        return cls
+    return decorator
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = registry
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0",
+                         metrics_registry: MetricsRegistry = registry) -> ThreadingHTTPServer:
+    """Запускает HTTP сервер /metrics в фоновом потоке"""
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": metrics_registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics server listening on {host}:{server.server_address[1]}")
+    return server
+
+
+class MetricsDumper(threading.Thread):
+    """Периодическая запись метрик в файл (атомарно через временный файл)"""
+
+    def __init__(self, path: str, interval: float = 60.0, metrics_registry: MetricsRegistry = registry):
+        super().__init__(name="metrics-dumper", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = metrics_registry
+        self._stopped = threading.Event()
+
+    def dump(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Failed to dump metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.dump()
@@ -0,0 +1,215 @@
+"""
+Статистический профилировщик, включаемый во время работы бота
+
+Фоновый поток с заданным интервалом снимает стеки всех потоков через
+sys._current_frames() и по окончании окна записывает их в формате
+collapsed stacks (совместим с flamegraph.pl и speedscope). Каждый стек
+помечается командой, обработчик которой в этот момент выполнялся
+(поток или корутина на цикле событий).
+
+Пока профилирование выключено, накладные расходы сводятся к проверке
+одного флага в profiler.tag().
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профилировщик с ограниченным окном записи
+
+    Args:
+        output_dir: каталог для файлов *.collapsed
+        interval: интервал между снимками стеков в секундах
+        max_depth: максимальная глубина сохраняемого стека
+    """
+
+    def __init__(self, output_dir: str = "profiles", interval: float = 0.005, max_depth: int = 128):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_depth = max_depth
+        self.active = False
+        self.last_output: Optional[str] = None
+        self._tags: Dict[FrameType, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._requested = threading.Event()
+        self._trigger: Optional[threading.Thread] = None
+        self._signal_duration = 0.0
+        self._on_signal: Optional[Callable[[], None]] = None
+
+    def tag(self, name: str) -> "_Tag":
+        """
+        Помечает стеки вызывающей функции и всего, что она вызывает, именем команды
+
+        Метка привязана к кадру вызывающей функции, а не к потоку: у корутин
+        на общем цикле событий она действует, только пока корутина
+        выполняется, и не переходит на другие задачи во время await.
+        """
+        return _Tag(self, name)
+
+    def start(self, duration: float) -> Optional[str]:
+        """
+        Запускает запись профиля на duration секунд
+
+        Returns:
+            Путь к будущему файлу профиля или None, если запись уже идет
+        """
+        with self._lock:
+            if self.active:
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed")
+            self._stop.clear()
+            self.active = True
+            self._thread = threading.Thread(
+                target=self._run, args=(duration, path), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            logger.info(f"Profiling started for {duration}s, output: {path}")
+            return path
+
+    def stop(self):
+        """Досрочная остановка записи (профиль все равно будет сохранен)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, duration: float, path: str):
+        samples: Counter = Counter()
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+
+        try:
+            while time.monotonic() < deadline and not self._stop.is_set():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = self._collapse(frame)
+                    prefix = [names.get(thread_id, str(thread_id))]
+                    tag = self._find_tag(frame)
+                    if tag:
+                        prefix.append(f"[{tag}]")
+                    samples[";".join(prefix + stack)] += 1
+                time.sleep(self.interval)
+
+            self._write(path, samples)
+            self.last_output = path
+            logger.info(f"Profiling finished: {sum(samples.values())} samples written to {path}")
+        except Exception as e:
+            logger.error(f"Profiling failed: {e}", exc_info=True)
+        finally:
+            self._tags.clear()
+            self.active = False
+
+    def _collapse(self, frame) -> List[str]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _find_tag(self, frame) -> Optional[str]:
+        """Метка ближайшего к вершине стека помеченного кадра"""
+        while frame is not None and self._tags:
+            tag = self._tags.get(frame)
+            if tag:
+                return tag
+            frame = frame.f_back
+        return None
+
+    @staticmethod
+    def _write(path: str, samples: Counter):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def install_signal_handler(self, duration: float, signum: Optional[int] = None,
+                               on_signal: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Включает запись профиля по сигналу (по умолчанию SIGUSR1)
+
+        Пример: kill -USR1 <pid>
+
+        Обработчик сигнала только взводит событие: он выполняется в главном
+        потоке между любыми байткодами, и захват self._lock или запуск потока
+        из него может зависнуть, если сигнал пришел, пока главный поток
+        держит ту же блокировку. Запись запускает отдельный поток.
+
+        Повторный вызов заменяет duration и on_signal: поток записи читает
+        их в момент сигнала.
+
+        Args:
+            on_signal: дополнительное действие при сигнале (пересылка сигнала обработчикам),
+                выполняется в том же потоке перед запуском записи
+
+        Returns:
+            False, если на платформе нет такого сигнала
+        """
+        signum = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            return False
+
+        self._signal_duration = duration
+        self._on_signal = on_signal
+        if self._trigger is None:
+            self._trigger = threading.Thread(target=self._wait_for_signal, name="profiler-trigger", daemon=True)
+            self._trigger.start()
+        signal.signal(signum, lambda *_: self._requested.set())
+        return True
+
+    def _wait_for_signal(self):
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            try:
+                on_signal = self._on_signal
+                if on_signal:
+                    on_signal()
+                self.start(self._signal_duration)
+            except Exception as e:
+                logger.error(f"Failed to start profiling on signal: {e}", exc_info=True)
+
+class _Tag:
+    """Контекст profiler.tag(): метит кадр, в котором открыт with"""
+
+    __slots__ = ('profiler', 'name', 'frame', 'previous')
+
+    def __init__(self, profiler: SamplingProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.frame: Optional[FrameType] = None
+        self.previous: Optional[str] = None
+
+    def __enter__(self):
+        if self.profiler.active:
+            self.frame = sys._getframe(1)
+            self.previous = self.profiler._tags.get(self.frame)
+            self.profiler._tags[self.frame] = self.name
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.frame is not None:
+            if self.previous is None:
+                self.profiler._tags.pop(self.frame, None)
+            else:
+                self.profiler._tags[self.frame] = self.previous
+            self.frame = None
+        return False
+
+
+profiler = SamplingProfiler()
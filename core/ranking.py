@@ -0,0 +1,183 @@
+"""
+Ранжирование кандидатов в пуле процессов
+
+Расчет рейтинга (нормализация интересов, TF-IDF) занимает процессор и,
+выполняясь прямо в асинхронном обработчике, останавливает цикл событий.
+RankingExecutor делит кандидатов на пачки и считает их в
+ProcessPoolExecutor, а обработчик в это время только ждет future.
+
+Числовые признаки кандидатов (возраст, город, лайки) кладутся один раз в
+общую память и читаются процессами без сериализации; по пачкам
+передаются только текстовые поля и группы. Обученный TF-IDF векторизатор
+и кэши нормализации живут в каждом процессе пула с момента его запуска.
+
+Пул запускается при первом ранжировании: к этому моменту MatchFinder
+обучает словарь общего анализатора на первой пачке анкет. Если словарь
+обучен позже, пул перезапускается с новым векторизатором. Процессы пула
+создаются через forkserver (или spawn), а не fork: в процессе бота уже
+работают потоки (цикл событий, очередь исходящих, профилировщик), и
+копия их блокировок в дочернем процессе может навсегда остаться занятой.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import constants
+from core.matching import MatchFinder, score_candidate
+from services.interests import CommonInterestEngine
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ('age', 'city', 'likes')
+_PROFILE_FIELDS = ('id',) + CommonInterestEngine.TEXT_FIELDS + ('groups',)
+
+_analyzer = None  # InterestAnalyzer процесса пула, создается в _init_worker
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_worker(vectorizer):
+    """Инициализатор процесса пула: загружает анализатор с обученным векторизатором"""
+    global _analyzer
+    from services.analyzer import InterestAnalyzer
+    _analyzer = InterestAnalyzer(vectorizer)
+
+
+def _slim(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля профиля, которые нужны для сравнения интересов"""
+    return {name: profile.get(name) for name in _PROFILE_FIELDS}
+
+
+def _optional_int(value: float) -> Optional[int]:
+    return None if math.isnan(value) else int(value)
+
+
+def _rank_chunk(shm_name: str, start: int, user: Dict[str, Any],
+                profiles: List[Dict[str, Any]]) -> List[Tuple[float, int]]:
+    """
+    Рейтинг пачки кандидатов в процессе пула
+
+    Returns:
+        Список (рейтинг, индекс кандидата) для кандидатов с рейтингом > 0
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    columns = shm.buf.cast('d')
+    try:
+        text_similarities = _analyzer.text_similarities(
+            _analyzer.profile_text(user), [_analyzer.profile_text(profile) for profile in profiles]
+        )
+        group_similarities = _analyzer.interests.group_similarities(user, profiles)
+        scored = []
+        for offset, (profile, text_similarity, group_similarity) in enumerate(
+                zip(profiles, text_similarities, group_similarities)):
+            row = (start + offset) * len(_COLUMNS)
+            candidate = dict(profile, age=_optional_int(columns[row]), city=_optional_int(columns[row + 1]))
+            score = score_candidate(user, candidate, _analyzer, int(columns[row + 2]), text_similarity,
+                                    group_similarity)
+            if score > 0:
+                scored.append((score, start + offset))
+        return scored
+    finally:
+        columns.release()
+        shm.close()
+
+
+class RankingExecutor:
+    """
+    Пул процессов для ранжирования кандидатов
+
+    Args:
+        workers: количество процессов (по умолчанию по числу ядер)
+        vectorizer: обученный TfidfVectorizer, передается в каждый процесс один раз
+        chunk_size: количество кандидатов в одной задаче пула
+        analyzer: InterestAnalyzer, чей векторизатор берется, если vectorizer не задан
+    """
+
+    def __init__(self, workers: Optional[int] = None, vectorizer=None, chunk_size: Optional[int] = None,
+                 analyzer=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size or constants.BotConstants.RANK_CHUNK_SIZE
+        self.vectorizer = vectorizer
+        self.analyzer = analyzer
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_vectorizer = None
+
+    def _current_vectorizer(self):
+        if self.vectorizer is not None:
+            return self.vectorizer
+        if self.analyzer is not None and self.analyzer.fitted:
+            return self.analyzer.vectorizer
+        return None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Пул, запущенный с актуальным векторизатором"""
+        vectorizer = self._current_vectorizer()
+        if self._pool is not None and self._pool_vectorizer is not vectorizer:
+            logger.info("Restarting ranking pool with a fitted vectorizer")
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=_mp_context(), initializer=_init_worker, initargs=(vectorizer,)
+            )
+            self._pool_vectorizer = vectorizer
+        return self._pool
+
+    async def rank(self, user_info: Dict[str, Any], candidates: List[Dict[str, Any]],
+                   like_counts: Optional[Dict[int, int]] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Ранжирует кандидатов, не блокируя цикл событий
+
+        Returns:
+            Список (рейтинг, кандидат) по убыванию рейтинга, как MatchFinder.find_matches
+        """
+        if not candidates:
+            return []
+        like_counts = like_counts or {}
+        user = dict(_slim(user_info), age=MatchFinder._get_age(user_info), city=MatchFinder._get_city_id(user_info))
+
+        shm = shared_memory.SharedMemory(create=True, size=len(candidates) * len(_COLUMNS) * 8)
+        columns = shm.buf.cast('d')
+        try:
+            for index, candidate in enumerate(candidates):
+                row = index * len(_COLUMNS)
+                age, city = MatchFinder._get_age(candidate), MatchFinder._get_city_id(candidate)
+                columns[row] = float(age) if age else math.nan
+                columns[row + 1] = float(city) if city else math.nan
+                columns[row + 2] = float(like_counts.get(candidate.get('id'), 0))
+
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, _rank_chunk, shm.name, start, user,
+                    [_slim(candidate) for candidate in candidates[start:start + self.chunk_size]]
+                )
+                for start in range(0, len(candidates), self.chunk_size)
+            ))
+        finally:
+            columns.release()
+            shm.close()
+            shm.unlink()
+
+        scored = [(score, candidates[index]) for chunk in chunks for score, index in chunk]
+        return sorted(scored, key=lambda x: x[0], reverse=True)
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -0,0 +1,219 @@
+"""
+Многопроцессный режим бота с шардированием событий по пользователю
+
+Супервизор получает события (long poll или Callback API) в главном
+процессе и отправляет каждое в процесс-обработчик, выбранный
+консистентным хэшированием ID пользователя. Так события одного
+пользователя обрабатываются по порядку одним процессом, а его кэши
+(интересы, кандидаты) остаются в памяти этого процесса.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from bisect import bisect
+from typing import Any, Callable, Dict, List, Optional
+
+from core.metrics import QUEUE_DEPTH
+from core.vk_api.random_id import random_ids
+
+logger = logging.getLogger(__name__)
+
+_STOP = None  # Сигнал процессу-обработчику: дообработать очередь и завершиться
+
+
+class ConsistentHashRing:
+    """
+    Кольцо консистентного хэширования с виртуальными узлами
+
+    При добавлении или удалении узла перемещается только ~1/N ключей.
+    """
+
+    def __init__(self, nodes: List[int], replicas: int = 100):
+        self.replicas = replicas
+        self._ring: List[int] = []
+        self._nodes: Dict[int, int] = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node: int):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}:{replica}")
+            self._nodes[point] = node
+        self._ring = sorted(self._nodes)
+
+    def remove_node(self, node: int):
+        self._nodes = {point: owner for point, owner in self._nodes.items() if owner != node}
+        self._ring = sorted(self._nodes)
+
+    def get_node(self, key: Any) -> int:
+        if not self._ring:
+            raise LookupError("Hash ring is empty")
+        index = bisect(self._ring, self._hash(str(key))) % len(self._ring)
+        return self._nodes[self._ring[index]]
+
+
+def event_user_id(raw_event: Dict[str, Any]) -> Optional[int]:
+    """ID пользователя, которому принадлежит событие VK"""
+    obj = raw_event.get("object") or {}
+    if raw_event.get("type") == "message_new":
+        message = obj.get("message", obj)
+        return message.get("from_id") or message.get("peer_id")
+    return obj.get("user_id") or obj.get("peer_id") or obj.get("from_id")
+
+
+def _default_bot_factory():
+    from core.bot_core import DatingBot
+    return DatingBot()
+
+
+def _worker_main(worker_id: int, queue: multiprocessing.Queue, bot_factory: Callable[[], Any],
+                 worker_init: Optional[Callable[[int], Any]] = None):
+    """Цикл процесса-обработчика"""
+    # Ctrl+C обрабатывает супервизор, обработчик дочитывает очередь до сигнала остановки
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Разные процессы не должны выдавать одинаковые random_id
+    random_ids.worker_id = worker_id % (1 << 5)
+    resources = worker_init(worker_id) if worker_init else None
+    bot = bot_factory()
+    logger.info(f"Worker {worker_id} started")
+
+    while True:
+        raw_event = queue.get()
+        if raw_event is _STOP:
+            break
+        try:
+            bot.handle_raw(raw_event)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed to handle event: {e}", exc_info=True)
+
+    if hasattr(bot, "close"):
+        bot.close()
+    if hasattr(resources, "stop"):
+        resources.stop()
+    logger.info(f"Worker {worker_id} stopped")
+
+
+class WorkerSupervisor:
+    """
+    Супервизор процессов-обработчиков
+
+    Args:
+        workers: количество процессов
+        bot_factory: функция создания бота в процессе-обработчике
+                     (должна быть доступна по имени модуля для pickle)
+        worker_init: функция (worker_id), вызываемая в процессе-обработчике до
+                     создания бота (метрики, профилировщик); у результата при
+                     остановке вызывается stop(), если он есть
+        check_interval: период проверки упавших процессов, сек
+        shutdown_timeout: время на дообработку очередей при остановке, сек
+    """
+
+    def __init__(self, workers: int, bot_factory: Callable[[], Any] = _default_bot_factory,
+                 check_interval: float = 1.0, shutdown_timeout: float = 30.0,
+                 worker_init: Optional[Callable[[int], Any]] = None):
+        self.workers = workers
+        self.bot_factory = bot_factory
+        self.worker_init = worker_init
+        self.check_interval = check_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.ring = ConsistentHashRing(list(range(workers)))
+        self._queues = [multiprocessing.Queue() for _ in range(workers)]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self) -> "WorkerSupervisor":
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self._monitor = threading.Thread(target=self._watch, name="worker-monitor", daemon=True)
+        self._monitor.start()
+        return self
+
+    def _spawn(self, worker_id: int):
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(worker_id, self._queues[worker_id], self.bot_factory, self.worker_init),
+            name=f"bot-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _watch(self):
+        """Перезапуск упавших процессов; очередь сохраняется, события не теряются"""
+        while not self._stopping.wait(self.check_interval):
+            for worker_id, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logger.warning(f"Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    self._spawn(worker_id)
+            for worker_id, queue in enumerate(self._queues):
+                try:
+                    QUEUE_DEPTH.set(queue.qsize(), queue=f"worker-{worker_id}")
+                except NotImplementedError:  # macOS
+                    pass
+
+    def signal_workers(self, signum: int):
+        """Пересылает сигнал живым процессам-обработчикам (например, SIGUSR1 профилировщика)"""
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                try:
+                    os.kill(process.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def dispatch(self, raw_event: Dict[str, Any]) -> int:
+        """
+        Отправляет событие в процесс, отвечающий за пользователя
+
+        Returns:
+            Номер выбранного процесса
+        """
+        if self._stopping.is_set():
+            raise RuntimeError("Supervisor is shutting down")
+        user_id = event_user_id(raw_event)
+        worker_id = self.ring.get_node(user_id if user_id is not None else raw_event.get("event_id", ""))
+        self._queues[worker_id].put(raw_event)
+        return worker_id
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Плавная остановка: обработчики дочитывают свои очереди и завершаются"""
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        self._stopping.set()
+        for queue in self._queues:
+            queue.put(_STOP)
+
+        deadline = time.monotonic() + timeout
+        for worker_id, process in enumerate(self._processes):
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {worker_id} did not stop in time, terminating")
+                process.terminate()
+                process.join()
+
+    def run_longpoll(self, vk_session, group_id: int):
+        """Прием событий через Bots Long Poll в главном процессе"""
+        from vk_api.bot_longpoll import VkBotLongPoll
+
+        longpoll = VkBotLongPoll(vk_session, group_id)
+        try:
+            for event in longpoll.listen():
+                self.dispatch(event.raw)
+        finally:
+            self.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self._stopping.is_set():
+            self.shutdown()
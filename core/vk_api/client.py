@@ -1,15 +1,202 @@
+import json
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Union
+
+import requests
 import vk_api
+from vk_api.exceptions import ApiError, ApiHttpError
+
+from config import constants
 from config.settings import settings
+from core.metrics import timed, VK_API_ERRORS, VK_API_LATENCY, VK_RATE_LIMIT_WAIT
+from core.vk_api.groups import GroupFetcher
+from core.vk_api.outbox import OutboundQueue, Priority
+from core.vk_api.random_id import random_ids
+
+
+class _RateLimitLock:
+    """
+    Блокировка сессии vk_api, которая замеряет ожидание лимита запросов
+
+    VkApi.method под этой блокировкой досыпает до RPS_DELAY с момента
+    предыдущего запроса. Ожидание - время захвата блокировки (другие
+    потоки отправляют или ждут свою очередь) плюс оставшаяся задержка.
+    """
+
+    def __init__(self, session: vk_api.VkApi):
+        self._session = session
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        delay = max(0.0, self._session.RPS_DELAY - (time.time() - self._session.last_request))
+        waited = time.perf_counter() - started + delay
+        if waited > 0.001:
+            VK_RATE_LIMIT_WAIT.observe(waited)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+        return False
+
+
+class _InstrumentedVkApi(vk_api.VkApi):
+    """Сессия vk_api с метриками ошибок и ожидания лимита для всех вызовов методов"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = _RateLimitLock(self)
+
+    def method(self, method, values=None, *args, **kwargs):
+        try:
+            return super().method(method, values, *args, **kwargs)
+        except ApiError as e:
+            VK_API_ERRORS.inc(method=method, code=e.code)
+            raise
+        except ApiHttpError as e:
+            VK_API_ERRORS.inc(method=method, code=f"http_{e.response.status_code}")
+            raise
+        except requests.RequestException:
+            VK_API_ERRORS.inc(method=method, code="network")
+            raise
 
 
 class VKClient:
-    def __init__(self, token: str = None):
+    def __init__(self, token: str = None, outbox: Optional[OutboundQueue] = None):
         self.token = token or settings.VK_GROUP_TOKEN
-        self.session = vk_api.VkApi(token=self.token)
+        self.session = _InstrumentedVkApi(token=self.token)
+        # Лимит запросов общий для ключа, а процессов-обработчиков BOT_WORKERS
+        self.session.RPS_DELAY = vk_api.VkApi.RPS_DELAY * settings.BOT_WORKERS
         self.api = self.session.get_api()
+        self.outbox = outbox
+        self.groups = GroupFetcher(self.api)
 
+    @timed(VK_API_LATENCY, method='users.get')
     def get_user_info(self, user_id: int) -> dict:
         return self.api.users.get(
             user_ids=user_id,
             fields='bdate,sex,city,interests,music,books,groups'
-        )[0]
\ No newline at end of file
+        )[0]
+
+    @timed(VK_API_LATENCY, method='users.search')
+    def search_users(self, params: Dict) -> Dict:
+        """Одна страница users.search (count/offset задает вызывающий)"""
+        return self.api.users.search(**params)
+
+    @timed(VK_API_LATENCY, method='photos.get')
+    def get_top_photos(self, owner_id: int) -> List[Dict]:
+        """Фотографии профиля с наибольшим количеством лайков (не больше MAX_PHOTOS)"""
+        items = self.api.photos.get(owner_id=owner_id, album_id='profile', extended=1)['items']
+        return self._top_photos(items)
+
+    def get_top_photos_bulk(self, owner_ids: List[int]) -> Dict[int, List[Dict]]:
+        """
+        Лучшие фотографии многих профилей пачками через execute
+
+        Закрытые и удаленные профили получают пустой список.
+        """
+        result: Dict[int, List[Dict]] = {}
+        batch_size = constants.VkConstants.EXECUTE_BATCH_SIZE
+        for start in range(0, len(owner_ids), batch_size):
+            batch = owner_ids[start:start + batch_size]
+            calls = ','.join(
+                'API.photos.get({})'.format(json.dumps({'owner_id': owner_id, 'album_id': 'profile', 'extended': 1}))
+                for owner_id in batch
+            )
+            with VK_API_LATENCY.time(method='execute.photos.get'):
+                responses = self.api.execute(code=f'return [{calls}];')
+            for owner_id, response in zip(batch, responses):
+                # Неудачный вызов внутри execute возвращает false
+                result[owner_id] = self._top_photos(response['items']) if response else []
+        return result
+
+    @staticmethod
+    def _top_photos(items: List[Dict]) -> List[Dict]:
+        return sorted(items, key=lambda photo: photo['likes']['count'],
+                      reverse=True)[:constants.BotConstants.MAX_PHOTOS]
+
+    def get_groups_bulk(self, user_ids: List[int]) -> Dict[int, array]:
+        """Подписки многих пользователей (отсортированные array('I')) через кэш и execute"""
+        return self.groups.fetch(user_ids)
+
+    async def send_message(self,
+                           user_id: int,
+                           message: str,
+                           keyboard: Optional[Dict] = None,
+                           attachment: Optional[Union[str, List[str]]] = None,
+                           priority: Priority = Priority.INTERACTIVE,
+                           random_id: Optional[int] = None,
+                           template: Optional[Dict] = None) -> Optional[int]:
+        """
+        Отправка сообщения пользователю от имени сообщества
+
+        Если задана очередь исходящих, сообщение ставится в нее и метод
+        возвращает его random_id, не дожидаясь отправки (временные ошибки
+        очередь повторяет сама). При прямой отправке возвращается ID
+        сообщения. Повтор того же сообщения (после таймаута или ошибки
+        очереди) должен передать random_id первой попытки, чтобы VK
+        отбросил дубль.
+        """
+        if self.outbox is not None:
+            return self.outbox.send(user_id, message, keyboard=keyboard, attachment=attachment,
+                                    priority=priority, template=template, random_id=random_id).random_id
+
+        params = {
+            'user_id': user_id,
+            'message': message,
+            'random_id': random_ids(reuse=random_id)
+        }
+        if keyboard:
+            params['keyboard'] = json.dumps(keyboard, ensure_ascii=False)
+        if attachment:
+            params['attachment'] = ','.join(attachment) if isinstance(attachment, list) else attachment
+        if template:
+            params['template'] = json.dumps(template, ensure_ascii=False)
+
+        with VK_API_LATENCY.time(method='messages.send'):
+            return self.api.messages.send(**params)
+
+    @timed(VK_API_LATENCY, method='messages.sendMessageEventAnswer')
+    async def answer_event(self,
+                           event_id: str,
+                           user_id: int,
+                           peer_id: int,
+                           snackbar: Optional[str] = None) -> int:
+        """
+        Ответ на нажатие callback-кнопки
+
+        Без текста только снимает индикатор загрузки на кнопке, с текстом
+        показывает всплывающее уведомление (до 90 символов).
+        """
+        params = {'event_id': event_id, 'user_id': user_id, 'peer_id': peer_id}
+        if snackbar:
+            params['event_data'] = json.dumps(
+                {'type': 'show_snackbar', 'text': snackbar[:constants.VkConstants.MAX_SNACKBAR_LENGTH]},
+                ensure_ascii=False
+            )
+        return self.api.messages.sendMessageEventAnswer(**params)
+
+    @timed(VK_API_LATENCY, method='messages.edit')
+    async def edit_message(self,
+                           peer_id: int,
+                           conversation_message_id: int,
+                           message: str,
+                           keyboard: Optional[Dict] = None,
+                           attachment: Optional[Union[str, List[str]]] = None,
+                           template: Optional[Dict] = None) -> int:
+        """Замена текста, вложений, клавиатуры или карусели отправленного ботом сообщения"""
+        params = {
+            'peer_id': peer_id,
+            'conversation_message_id': conversation_message_id,
+            'message': message
+        }
+        if keyboard:
+            params['keyboard'] = json.dumps(keyboard, ensure_ascii=False)
+        if attachment:
+            params['attachment'] = ','.join(attachment) if isinstance(attachment, list) else attachment
+        if template:
+            params['template'] = json.dumps(template, ensure_ascii=False)
+        return self.api.messages.edit(**params)
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 from datetime import datetime
 from ..models.events import ConfirmationEvent, MessageEvent, EventResponse
 from ...exceptions import ConfigurationError
@@ -8,9 +8,14 @@ logger = logging.getLogger(__name__)
 
 
 class VKCallbackHandler:
-    def __init__(self, settings: Dict[str, Any], api_client):
+    # События, которые передаются боту (или супервизору процессов) через dispatcher
+    DISPATCHED_EVENTS = ("message_new", "message_event")
+
+    def __init__(self, settings: Dict[str, Any], api_client,
+                 dispatcher: Optional[Callable[[Dict[str, Any]], Any]] = None):
         self.settings = settings
         self.api_client = api_client
+        self.dispatcher = dispatcher
 
     def _get_confirmation_code(self, group_id: int) -> str:
         """Получает код подтверждения из настроек"""
@@ -48,6 +53,10 @@ class VKCallbackHandler:
                 event = ConfirmationEvent(**event_data)
                 return self._handle_confirmation(event.group_id)
 
+            elif self.dispatcher is not None and event_type in self.DISPATCHED_EVENTS:
+                self.dispatcher(event_data)
+                return {"response": "ok"}
+
             elif event_type == "message_new":
                 event = MessageEvent(**event_data)
                 return self._handle_message(event).dict()
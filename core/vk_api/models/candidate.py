@@ -0,0 +1,161 @@
+"""
+Компактная запись кандидата из результатов users.search
+
+Пачки по 1000 кандидатов и списки, которые хранятся между страницами
+карусели, занимают больше всего памяти бота. Candidate хранит часто
+используемые поля в __slots__, возраст вычисляет один раз при разборе
+JSON, повторяющиеся строки (имена, названия городов) интернирует, а
+редко нужные поля (интересы, музыка, книги, группы, фото) держит в отдельном
+словаре, который отбрасывается после ранжирования (compact()).
+
+Для совместимости с кодом, который работает со словарями ответа VK,
+поддерживаются get(), [] и keys().
+"""
+import sys
+from datetime import date
+from typing import Any, Dict, Iterator, Optional
+
+FLAG_HAS_PHOTO = 1
+FLAG_IS_CLOSED = 2
+FLAG_CAN_WRITE = 4
+
+_HOT_FIELDS = ('id', 'first_name', 'last_name', 'sex', 'bdate', 'city', 'photo_id', 'age')
+# Поля, нужные только для ранжирования и подробной анкеты
+_EXTRA_FIELDS = ('interests', 'music', 'books', 'groups', 'domain', 'counters', 'photos')
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class Candidate:
+    """Кандидат поиска с предвычисленным возрастом"""
+
+    __slots__ = ('id', 'first_name', 'last_name', 'sex', 'city_id', 'city_title',
+                 'birth_ordinal', 'age', 'photo_id', 'flags', '_extra')
+
+    def __init__(self, id: int, first_name: str = '', last_name: str = '', sex: int = 0,
+                 city_id: Optional[int] = None, city_title: Optional[str] = None,
+                 birth_ordinal: int = 0, age: Optional[int] = None, photo_id: Optional[str] = None,
+                 flags: int = 0, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.sex = sex
+        self.city_id = city_id
+        self.city_title = city_title
+        self.birth_ordinal = birth_ordinal
+        self.age = age
+        self.photo_id = photo_id
+        self.flags = flags
+        self._extra = extra
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], today: Optional[date] = None) -> "Candidate":
+        """Разбор элемента ответа users.search / users.get"""
+        birth_ordinal, age = cls._parse_bdate(raw.get('bdate'), today or date.today())
+        city = raw.get('city') or {}
+        flags = (
+            (FLAG_HAS_PHOTO if raw.get('has_photo') or raw.get('photo_id') else 0)
+            | (FLAG_IS_CLOSED if raw.get('is_closed') else 0)
+            | (FLAG_CAN_WRITE if raw.get('can_write_private_message') else 0)
+        )
+        extra = {name: raw[name] for name in _EXTRA_FIELDS if raw.get(name)}
+        return cls(
+            id=raw['id'],
+            first_name=_intern(raw.get('first_name', '')),
+            last_name=raw.get('last_name', ''),
+            sex=raw.get('sex') or 0,
+            city_id=city.get('id'),
+            city_title=_intern(city.get('title')),
+            birth_ordinal=birth_ordinal,
+            age=age,
+            photo_id=raw.get('photo_id'),
+            flags=flags,
+            extra=extra or None
+        )
+
+    @staticmethod
+    def _parse_bdate(bdate: Optional[str], today: date):
+        """Дата рождения D.M.YYYY -> (порядковый номер дня, возраст); без года возраст неизвестен"""
+        parts = (bdate or '').split('.')
+        if len(parts) != 3:
+            return 0, None
+        try:
+            born = date(int(parts[2]), int(parts[1]), int(parts[0]))
+        except ValueError:
+            return 0, None
+        age = today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+        return born.toordinal(), age
+
+    @property
+    def has_photo(self) -> bool:
+        return bool(self.flags & FLAG_HAS_PHOTO)
+
+    @property
+    def is_closed(self) -> bool:
+        return bool(self.flags & FLAG_IS_CLOSED)
+
+    @property
+    def bdate(self) -> Optional[str]:
+        if not self.birth_ordinal:
+            return None
+        born = date.fromordinal(self.birth_ordinal)
+        return f"{born.day}.{born.month}.{born.year}"
+
+    @property
+    def city(self) -> Optional[Dict[str, Any]]:
+        if self.city_id is None:
+            return None
+        return {'id': self.city_id, 'title': self.city_title}
+
+    def compact(self) -> "Candidate":
+        """Копия без полей, нужных только для ранжирования (для хранения между страницами)"""
+        return Candidate(self.id, self.first_name, self.last_name, self.sex, self.city_id, self.city_title,
+                         self.birth_ordinal, self.age, self.photo_id, self.flags)
+
+    def set_extra(self, name: str, value: Any):
+        """Дополняет кандидата данными отдельных запросов (photos.get, groups.get)"""
+        if name not in _EXTRA_FIELDS:
+            raise AttributeError(name)
+        if self._extra is None:
+            self._extra = {}
+        self._extra[name] = value
+
+    def __getattr__(self, name: str) -> Any:
+        # Вызывается только для имен вне __slots__: редкие поля из исходного JSON
+        if name in _EXTRA_FIELDS:
+            extra = object.__getattribute__(self, '_extra')
+            return extra.get(name) if extra else None
+        raise AttributeError(name)
+
+    # Совместимость со словарями ответа VK
+    def get(self, name: str, default: Any = None) -> Any:
+        if name not in _HOT_FIELDS and name not in _EXTRA_FIELDS:
+            return default
+        value = getattr(self, name)
+        return default if value is None else value
+
+    def __getitem__(self, name: str) -> Any:
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def keys(self) -> Iterator[str]:
+        return (name for name in _HOT_FIELDS + _EXTRA_FIELDS if self.get(name) is not None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: self[name] for name in self.keys()}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Candidate) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"Candidate(id={self.id}, age={self.age}, city_id={self.city_id})"
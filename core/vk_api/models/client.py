@@ -9,6 +9,8 @@ from pydantic import BaseModel, json
 
 from core import VKAPIError
 from core.exceptions import APILimitError, InvalidRequestError
+from core.metrics import VK_API_LATENCY, VK_API_ERRORS, VK_RATE_LIMIT_WAIT
+from core.vk_api.random_id import random_ids
 
 logger = logging.getLogger(__name__)
 
@@ -53,20 +55,23 @@ class VKAPIClient:
         try:
             self._rate_limit_delay()
 
-            response = self.session.post(
-                f"{self.BASE_URL}{method}",
-                params=params,
-                timeout=timeout or self.DEFAULT_TIMEOUT
-            )
-            data = response.json()
+            with VK_API_LATENCY.time(method=method):
+                response = self.session.post(
+                    f"{self.BASE_URL}{method}",
+                    params=params,
+                    timeout=timeout or self.DEFAULT_TIMEOUT
+                )
+                data = response.json()
             self.last_call_time = datetime.now()
 
             if 'error' in data:
+                VK_API_ERRORS.inc(method=method, code=data['error'].get('error_code'))
                 self._handle_api_error(data['error'])
 
             return data.get('response', {})
 
         except requests.exceptions.RequestException as e:
+            VK_API_ERRORS.inc(method=method, code="network")
             logger.error(f"Request to VK API failed: {str(e)}")
             raise VKAPIError(f"Request failed: {str(e)}")
 
@@ -88,6 +93,7 @@ class VKAPIClient:
         if self.last_call_time:
             elapsed = (datetime.now() - self.last_call_time).total_seconds()
             if elapsed < 0.34:  # ~3 запроса в секунду
+                VK_RATE_LIMIT_WAIT.observe(0.34 - elapsed)
                 time.sleep(0.34 - elapsed)
 
     # Специфичные методы API
@@ -113,7 +119,8 @@ class VKAPIClient:
                      user_id: int,
                      message: str,
                      keyboard: Optional[Dict] = None,
-                     attachment: Optional[str] = None) -> int:
+                     attachment: Optional[str] = None,
+                     random_id: Optional[int] = None) -> int:
         """
         Отправка сообщения пользователю
 
@@ -122,6 +129,8 @@ class VKAPIClient:
             message: Текст сообщения
             keyboard: Клавиатура в формате VK API
             attachment: Вложения (photo123_456)
+            random_id: random_id первой попытки при повторной отправке того же
+                       сообщения (например, после таймаута), чтобы VK отбросил дубль
 
         Returns:
             ID отправленного сообщения
@@ -129,7 +138,7 @@ class VKAPIClient:
         params = {
             'user_id': user_id,
             'message': message,
-            'random_id': int(datetime.now().timestamp())
+            'random_id': random_ids(reuse=random_id)
         }
 
         if keyboard:
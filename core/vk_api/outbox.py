@@ -0,0 +1,313 @@
+"""
+Очередь исходящих сообщений перед messages.send
+
+Все сообщения бота проходят через один поток отправки, который:
+- отправляет ответы на действия пользователя раньше уведомлений и рассылок;
+- склеивает подряд идущие сообщения одному получателю в один вызов
+  (кроме сообщений с random_id, переданным вызывающим кодом);
+- отправляет рассылки через peer_ids пачками до 100 получателей;
+- повторяет временные ошибки (лимиты, сеть) с экспоненциальной задержкой,
+  сохраняя random_id, чтобы VK не продублировал сообщение; пока повтор
+  ждет, следующие сообщения тому же получателю не отправляются, и
+  порядок сообщений получателя сохраняется.
+
+Частоту запросов ограничивает сессия vk_api (RPS_DELAY). Лимит VK
+действует на ключ сообщества, поэтому в многопроцессном режиме VKClient
+увеличивает RPS_DELAY в BOT_WORKERS раз: процессы вместе не превышают
+лимит одного процесса.
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import requests
+
+from config import constants
+from core.metrics import QUEUE_DEPTH, VK_API_LATENCY
+from core.vk_api.random_id import random_ids
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERROR_CODES = {1, 6, 9, 10}  # Unknown, Too many requests, Flood control, Internal error
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0   # Ответ на сообщение или нажатие кнопки
+    NOTIFICATION = 1  # Уведомления (взаимная симпатия)
+    BULK = 2          # Рассылки
+
+
+class Delivery(Future):
+    """Future отправки сообщения; random_id - идентификатор, назначенный сообщению очередью"""
+
+    def __init__(self, random_id: int):
+        super().__init__()
+        self.random_id = random_id
+
+
+class OutgoingMessage:
+    """Сообщение в очереди; peer_ids задан только у рассылки"""
+
+    __slots__ = ('priority', 'seq', 'peer_id', 'peer_ids', 'message', 'keyboard', 'attachments',
+                 'template', 'random_id', 'pinned', 'attempt', 'not_before', 'futures')
+
+    def __init__(self, priority: Priority, seq: int, peer_id: Optional[int], message: str,
+                 keyboard: Optional[Union[Dict, str]] = None, attachments: Optional[List[str]] = None,
+                 peer_ids: Optional[List[int]] = None, template: Optional[Union[Dict, str]] = None,
+                 random_id: Optional[int] = None):
+        self.priority = priority
+        self.seq = seq
+        self.peer_id = peer_id
+        self.peer_ids = peer_ids
+        self.message = message
+        self.keyboard = keyboard
+        self.attachments = attachments or []
+        self.template = template
+        self.random_id = random_id or random_ids.next_id()
+        # Повтор отправки с random_id первой попытки: текст сообщения не должен меняться
+        self.pinned = bool(random_id)
+        self.attempt = 0
+        self.not_before = 0.0
+        self.futures: List[Future] = [Delivery(self.random_id)]
+
+    def __lt__(self, other: "OutgoingMessage") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def can_merge(self, other: "OutgoingMessage") -> bool:
+        """
+        Можно ли дописать other в это сообщение, не потеряв клавиатуру или вложения
+
+        Сообщения, которые уже пытались отправить, не меняются: повтор идет
+        с тем же random_id, и VK должен получить тот же текст. То же для
+        сообщений с random_id от вызывающего кода: он может отправить
+        сообщение повторно с этим random_id, и VK должен отбросить дубль.
+        """
+        return (
+            self.attempt == 0 and other.attempt == 0
+            and not self.pinned and not other.pinned
+            and self.peer_ids is None and other.peer_ids is None
+            and self.peer_id == other.peer_id
+            and self.priority == other.priority
+            and not (self.keyboard and other.keyboard)
+            and not self.template and not other.template
+            and len(self.message) + len(other.message) + 2 <= constants.VkConstants.MAX_MESSAGE_LENGTH
+            and len(self.attachments) + len(other.attachments) <= constants.VkConstants.MAX_ATTACHMENTS
+        )
+
+    def merge(self, other: "OutgoingMessage"):
+        self.message = "\n\n".join(text for text in (self.message, other.message) if text)
+        self.keyboard = self.keyboard or other.keyboard
+        self.attachments = self.attachments + other.attachments
+        self.futures.extend(other.futures)
+
+    def params(self) -> Dict[str, Any]:
+        params = {'message': self.message, 'random_id': self.random_id}
+        if self.peer_ids is not None:
+            params['peer_ids'] = ','.join(map(str, self.peer_ids))
+        else:
+            params['peer_id'] = self.peer_id
+        if self.keyboard:
+            params['keyboard'] = (self.keyboard if isinstance(self.keyboard, str)
+                                  else json.dumps(self.keyboard, ensure_ascii=False))
+        if self.attachments:
+            params['attachment'] = ','.join(self.attachments)
+        if self.template:
+            params['template'] = (self.template if isinstance(self.template, str)
+                                  else json.dumps(self.template, ensure_ascii=False))
+        return params
+
+
+def _attachments(attachment: Optional[Union[str, List[str]]]) -> List[str]:
+    if not attachment:
+        return []
+    if isinstance(attachment, str):
+        return [item for item in attachment.split(',') if item]
+    return list(attachment)
+
+
+class OutboundQueue:
+    """
+    Поток отправки сообщений с приоритетами
+
+    Args:
+        api: объект vk_api (VkApiMethod) сообщества
+        max_retries: сколько раз повторять временную ошибку
+        backoff: начальная задержка перед повтором, сек (удваивается)
+    """
+
+    def __init__(self, api, max_retries: Optional[int] = None, backoff: Optional[float] = None):
+        self.api = api
+        self.max_retries = constants.VkConstants.SEND_RETRIES if max_retries is None else max_retries
+        self.backoff = constants.VkConstants.SEND_BACKOFF if backoff is None else backoff
+        self._queue: List[OutgoingMessage] = []
+        self._delayed: List[tuple] = []  # (not_before, seq, message) для повторов
+        self._retrying: Dict[int, int] = {}  # peer_id -> seq сообщения, ждущего повтора
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "OutboundQueue":
+        self._thread = threading.Thread(target=self._run, name="vk-outbox", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает поток после отправки уже поставленных сообщений"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def send(self,
+             peer_id: int,
+             message: str,
+             keyboard: Optional[Union[Dict, str]] = None,
+             attachment: Optional[Union[str, List[str]]] = None,
+             priority: Priority = Priority.INTERACTIVE,
+             template: Optional[Union[Dict, str]] = None,
+             random_id: Optional[int] = None) -> Delivery:
+        """
+        Ставит сообщение в очередь
+
+        Args:
+            random_id: random_id первой попытки при повторной отправке того же
+                       сообщения; такое сообщение не склеивается с соседними
+
+        Returns:
+            Delivery (Future с ID отправленного сообщения); назначенный
+            сообщению random_id - в его поле random_id
+        """
+        item = OutgoingMessage(priority, next(self._seq), peer_id, message, keyboard, _attachments(attachment),
+                               template=template, random_id=random_id)
+        self._put(item)
+        return item.futures[0]
+
+    def broadcast(self,
+                  peer_ids: Sequence[int],
+                  message: str,
+                  keyboard: Optional[Union[Dict, str]] = None,
+                  attachment: Optional[Union[str, List[str]]] = None,
+                  priority: Priority = Priority.BULK) -> List[Future]:
+        """Рассылка одного сообщения многим получателям через peer_ids"""
+        chunk = constants.VkConstants.MAX_PEER_IDS
+        futures = []
+        for start in range(0, len(peer_ids), chunk):
+            item = OutgoingMessage(priority, next(self._seq), None, message, keyboard,
+                                   _attachments(attachment), peer_ids=list(peer_ids[start:start + chunk]))
+            self._put(item)
+            futures.append(item.futures[0])
+        return futures
+
+    def _put(self, item: OutgoingMessage):
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Outbound queue is stopped")
+            heapq.heappush(self._queue, item)
+            self._update_depth()
+            self._cond.notify()
+
+    def _update_depth(self):
+        QUEUE_DEPTH.set(len(self._queue) + len(self._delayed), queue="outbox")
+
+    def _next_batch(self) -> Optional[OutgoingMessage]:
+        """Ждет следующее сообщение и склеивает с ним остальные сообщения тому же получателю"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    heapq.heappush(self._queue, heapq.heappop(self._delayed)[2])
+                item = self._pop_ready()
+                if item is not None:
+                    break
+                if self._stopped and not self._delayed and not self._queue:
+                    return None
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+            if item.peer_ids is None:
+                rest = []
+                blocked = False  # после первого несклеиваемого сообщения порядок сохраняем как есть
+                for other in sorted(self._queue):
+                    if not blocked and item.can_merge(other):
+                        item.merge(other)
+                        continue
+                    if other.peer_id == item.peer_id:
+                        blocked = True
+                    rest.append(other)
+                if len(rest) != len(self._queue):
+                    self._queue = rest
+                    heapq.heapify(self._queue)
+            self._update_depth()
+            return item
+
+    def _pop_ready(self) -> Optional[OutgoingMessage]:
+        """
+        Первое по приоритету сообщение, которое можно отправить сейчас
+
+        Если у получателя сообщение ждет повтора, его более поздние сообщения
+        остаются в очереди, пока повтор не будет взят на отправку.
+        """
+        held = []
+        item = None
+        while self._queue:
+            candidate = heapq.heappop(self._queue)
+            blocker = self._retrying.get(candidate.peer_id)
+            if blocker is None or blocker == candidate.seq:
+                item = candidate
+                break
+            held.append(candidate)
+        for other in held:
+            heapq.heappush(self._queue, other)
+        if item is not None and item.peer_id is not None:
+            self._retrying.pop(item.peer_id, None)
+        return item
+
+    def _run(self):
+        while True:
+            item = self._next_batch()
+            if item is None:
+                return
+            self._deliver(item)
+
+    def _deliver(self, item: OutgoingMessage):
+        try:
+            with VK_API_LATENCY.time(method='messages.send'):
+                result = self.api.messages.send(**item.params())
+        except Exception as e:
+            # Ошибку считает сессия VKClient (VK_API_ERRORS)
+            if item.attempt < self.max_retries and self._is_retryable(e):
+                self._retry(item, getattr(e, 'retry_after', None))
+                return
+            logger.error(f"Failed to send message to {item.peer_id or item.peer_ids}: {e}")
+            for future in item.futures:
+                future.set_exception(e)
+            return
+
+        for future in item.futures:
+            future.set_result(result)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, requests.exceptions.RequestException):
+            return True
+        return getattr(error, 'code', None) in RETRYABLE_ERROR_CODES
+
+    def _retry(self, item: OutgoingMessage, retry_after: Optional[float] = None):
+        delay = retry_after or self.backoff * (2 ** item.attempt)
+        item.attempt += 1
+        item.not_before = time.monotonic() + delay
+        logger.warning(f"Retrying message to {item.peer_id or item.peer_ids} in {delay:.2f}s "
+                       f"(attempt {item.attempt})")
+        with self._cond:
+            if item.peer_id is not None:
+                self._retrying[item.peer_id] = item.seq
+            heapq.heappush(self._delayed, (item.not_before, item.seq, item))
+            self._update_depth()
+            self._cond.notify()
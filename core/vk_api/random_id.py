@@ -0,0 +1,77 @@
+"""
+Генерация random_id для messages.send
+
+VK не доставляет повторно сообщение с уже использованным random_id, поэтому
+идентификатор должен быть уникальным для каждого нового сообщения и
+одинаковым для повторной отправки того же сообщения (после таймаута
+или ошибки сети), чтобы VK отбросил дубль, если первая попытка дошла.
+
+random_id - знаковое 32-битное число. Используется 31 бит:
+    [12 бит: секунды по модулю 4096][5 бит: номер процесса][14 бит: счетчик]
+Уникальность гарантирована только в пределах одного процесса и окна
+~68 минут (4096 секунд) при не более 16384 отправках в секунду: после
+оборота 12-битного счетчика секунд идентификаторы могут повториться.
+Для защиты от дублей этого достаточно: повтор отправки идет в течение
+секунд после первой попытки.
+"""
+import itertools
+import threading
+import time
+from typing import Callable, Optional
+
+_TIME_BITS = 12
+_WORKER_BITS = 5
+_COUNTER_BITS = 14
+
+
+class RandomIdGenerator:
+    """
+    Потокобезопасный генератор random_id
+
+    Args:
+        worker_id: номер процесса-обработчика (0..31)
+        clock: источник времени в секундах (для тестов)
+    """
+
+    def __init__(self, worker_id: int = 0, clock: Callable[[], float] = time.time):
+        self.worker_id = worker_id
+        self.clock = clock
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        return self._worker_id
+
+    @worker_id.setter
+    def worker_id(self, value: int):
+        if not 0 <= value < 1 << _WORKER_BITS:
+            raise ValueError(f"worker_id must be in [0, {(1 << _WORKER_BITS) - 1}]")
+        self._worker_id = value
+
+    def next_id(self) -> int:
+        """Новый random_id (никогда не 0: ноль отключает проверку дублей в VK)"""
+        while True:
+            with self._lock:
+                counter = next(self._counter)
+            seconds = int(self.clock()) & ((1 << _TIME_BITS) - 1)
+            random_id = (
+                (seconds << (_WORKER_BITS + _COUNTER_BITS))
+                | (self._worker_id << _COUNTER_BITS)
+                | (counter & ((1 << _COUNTER_BITS) - 1))
+            )
+            if random_id:
+                return random_id
+
+    def __call__(self, reuse: Optional[int] = None) -> int:
+        """
+        random_id для отправки
+
+        Args:
+            reuse: random_id предыдущей попытки того же сообщения; при
+                   повторе после таймаута нужно передать его, а не брать новый
+        """
+        return reuse if reuse else self.next_id()
+
+
+random_ids = RandomIdGenerator()
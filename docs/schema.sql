@@ -3,6 +3,23 @@
 CREATE SCHEMA public AUTHORIZATION pg_database_owner;
 
 COMMENT ON SCHEMA public IS 'standard public schema';
+
+-- Схема соответствует core/db/models.py (init_db создает ее через create_all).
+-- Изменения для уже созданной базы: python -m core.db.migrations
+
+-- public.users определение
+
+-- Drop table
+
+-- DROP TABLE public.users;
+
+CREATE TABLE public.users (
+	id serial4 NOT NULL, -- VK ID of the user
+	CONSTRAINT users_pkey PRIMARY KEY (id)
+);
+COMMENT ON TABLE public.users IS 'Users referenced by the dating bot tables';
+
+
 -- public.blacklist определение
 
 -- Drop table
@@ -10,18 +27,25 @@ COMMENT ON SCHEMA public IS 'standard public schema';
 -- DROP TABLE public.blacklist;
 
 CREATE TABLE public.blacklist (
-	user_id int8 NOT NULL, -- ID of the user who created the ban
-	banned_id int8 NOT NULL, -- ID of the banned user
-	CONSTRAINT blacklist_pkey PRIMARY KEY (user_id, banned_id)
+	id serial4 NOT NULL,
+	user_id int4 NOT NULL, -- ID of the user who created the ban
+	banned_id int4 NOT NULL, -- ID of the banned user
+	created_at timestamp NOT NULL, -- Timestamp when the user was banned
+	reason varchar(255) NULL, -- Optional reason of the ban
+	CONSTRAINT blacklist_pkey PRIMARY KEY (id),
+	CONSTRAINT uq_blacklist_user_banned UNIQUE (user_id, banned_id),
+	CONSTRAINT blacklist_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id),
+	CONSTRAINT blacklist_banned_id_fkey FOREIGN KEY (banned_id) REFERENCES public.users(id)
 );
-CREATE INDEX idx_blacklist_banned_id ON public.blacklist USING btree (banned_id);
-CREATE INDEX idx_blacklist_user_id ON public.blacklist USING btree (user_id);
+CREATE INDEX ix_blacklist_user_created ON public.blacklist USING btree (user_id, created_at, id);
 COMMENT ON TABLE public.blacklist IS 'Table for storing user blacklist in dating bot';
 
 -- Column comments
 
 COMMENT ON COLUMN public.blacklist.user_id IS 'ID of the user who created the ban';
 COMMENT ON COLUMN public.blacklist.banned_id IS 'ID of the banned user';
+COMMENT ON COLUMN public.blacklist.created_at IS 'Timestamp when the user was banned';
+COMMENT ON COLUMN public.blacklist.reason IS 'Optional reason of the ban';
 
 
 -- public.favorites определение
@@ -31,13 +55,18 @@ COMMENT ON COLUMN public.blacklist.banned_id IS 'ID of the banned user';
 -- DROP TABLE public.favorites;
 
 CREATE TABLE public.favorites (
-	user_id int8 NOT NULL, -- ID of the user who added to favorites
-	favorite_id int8 NOT NULL, -- ID of the favorited user
-	added_at timestamp NULL, -- Timestamp when the user was added to favorites
-	CONSTRAINT favorites_pkey PRIMARY KEY (user_id, favorite_id)
+	id serial4 NOT NULL,
+	user_id int4 NOT NULL, -- ID of the user who added to favorites
+	favorite_id int4 NOT NULL, -- ID of the favorited user
+	added_at timestamp NOT NULL, -- Timestamp when the user was added to favorites
+	is_mutual bool NULL, -- Whether the favorited user has also added this user
+	CONSTRAINT favorites_pkey PRIMARY KEY (id),
+	CONSTRAINT uq_favorites_user_favorite UNIQUE (user_id, favorite_id),
+	CONSTRAINT favorites_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id),
+	CONSTRAINT favorites_favorite_id_fkey FOREIGN KEY (favorite_id) REFERENCES public.users(id)
 );
-CREATE INDEX idx_favorites_favorite_id ON public.favorites USING btree (favorite_id);
-CREATE INDEX idx_favorites_user_id ON public.favorites USING btree (user_id);
+CREATE INDEX ix_favorites_user_added ON public.favorites USING btree (user_id, added_at, id);
+CREATE INDEX ix_favorites_user_mutual ON public.favorites USING btree (user_id, favorite_id) WHERE is_mutual;
 COMMENT ON TABLE public.favorites IS 'Table for storing user favorites in dating bot';
 
 -- Column comments
@@ -45,6 +74,7 @@ COMMENT ON TABLE public.favorites IS 'Table for storing user favorites in dating
 COMMENT ON COLUMN public.favorites.user_id IS 'ID of the user who added to favorites';
 COMMENT ON COLUMN public.favorites.favorite_id IS 'ID of the favorited user';
 COMMENT ON COLUMN public.favorites.added_at IS 'Timestamp when the user was added to favorites';
+COMMENT ON COLUMN public.favorites.is_mutual IS 'Whether the favorited user has also added this user';
 
 
 -- public.photo_likes определение
@@ -54,17 +84,95 @@ COMMENT ON COLUMN public.favorites.added_at IS 'Timestamp when the user was adde
 -- DROP TABLE public.photo_likes;
 
 CREATE TABLE public.photo_likes (
-	user_id int8 NOT NULL, -- ID of the user who liked the photo
-	photo_id text NOT NULL, -- ID of the photo that was liked
-	liked bool NULL, -- Boolean flag indicating like status
-	CONSTRAINT photo_likes_pkey PRIMARY KEY (user_id, photo_id)
+	id serial4 NOT NULL,
+	user_id int4 NOT NULL, -- ID of the user who liked the photo
+	photo_id varchar(36) NOT NULL, -- ID of the photo that was liked
+	owner_id int4 NULL, -- ID of the owner of the photo
+	liked bool NOT NULL, -- Boolean flag indicating like status
+	created_at timestamp NOT NULL,
+	updated_at timestamp NOT NULL,
+	CONSTRAINT photo_likes_pkey PRIMARY KEY (id),
+	CONSTRAINT uq_photo_likes_user_photo UNIQUE (user_id, photo_id),
+	CONSTRAINT photo_likes_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id)
 );
-CREATE INDEX idx_photo_likes_photo_id ON public.photo_likes USING btree (photo_id);
-CREATE INDEX idx_photo_likes_user_id ON public.photo_likes USING btree (user_id);
+CREATE INDEX ix_photo_likes_owner_id ON public.photo_likes USING btree (owner_id);
 COMMENT ON TABLE public.photo_likes IS 'Table for storing photo likes in dating bot';
 
 -- Column comments
 
 COMMENT ON COLUMN public.photo_likes.user_id IS 'ID of the user who liked the photo';
 COMMENT ON COLUMN public.photo_likes.photo_id IS 'ID of the photo that was liked';
-COMMENT ON COLUMN public.photo_likes.liked IS 'Boolean flag indicating like status';
\ No newline at end of file
+COMMENT ON COLUMN public.photo_likes.owner_id IS 'ID of the owner of the photo';
+COMMENT ON COLUMN public.photo_likes.liked IS 'Boolean flag indicating like status';
+
+
+-- public.photo_like_edges определение
+
+-- Drop table
+
+-- DROP TABLE public.photo_like_edges;
+
+CREATE TABLE public.photo_like_edges (
+	liker_id int4 NOT NULL, -- ID of the user who liked photos
+	owner_id int4 NOT NULL, -- ID of the owner of the liked photos
+	likes_count int4 NOT NULL, -- Number of currently liked photos of the owner
+	updated_at timestamp NOT NULL,
+	CONSTRAINT photo_like_edges_pkey PRIMARY KEY (liker_id, owner_id)
+);
+CREATE INDEX ix_photo_like_edges_owner_liker ON public.photo_like_edges USING btree (owner_id, liker_id);
+COMMENT ON TABLE public.photo_like_edges IS 'Aggregated photo likes between users, maintained on every like toggle';
+
+
+-- public.match_view_history определение
+
+-- Drop table
+
+-- DROP TABLE public.match_view_history;
+
+CREATE TABLE public.match_view_history (
+	id serial4 NOT NULL,
+	user_id int4 NOT NULL, -- ID of the user who viewed the profile
+	viewed_user_id int4 NOT NULL, -- ID of the viewed profile
+	viewed_at timestamp NOT NULL, -- Timestamp of the view
+	"source" varchar(50) NULL, -- Where the view came from
+	CONSTRAINT match_view_history_pkey PRIMARY KEY (id),
+	CONSTRAINT match_view_history_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id),
+	CONSTRAINT match_view_history_viewed_user_id_fkey FOREIGN KEY (viewed_user_id) REFERENCES public.users(id)
+);
+CREATE INDEX ix_view_history_user_viewed ON public.match_view_history USING btree (user_id, viewed_at, id);
+CREATE INDEX ix_view_history_viewed_at ON public.match_view_history USING btree (viewed_at);
+COMMENT ON TABLE public.match_view_history IS 'Profiles shown to the user, purged after the retention period';
+
+
+-- public.seen_profiles определение
+
+-- Drop table
+
+-- DROP TABLE public.seen_profiles;
+
+CREATE TABLE public.seen_profiles (
+	user_id int4 NOT NULL, -- ID of the user
+	bitmap bytea NOT NULL, -- Serialized RoaringBitmap of viewed profile IDs
+	updated_at timestamp NOT NULL,
+	CONSTRAINT seen_profiles_pkey PRIMARY KEY (user_id),
+	CONSTRAINT seen_profiles_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id)
+);
+COMMENT ON TABLE public.seen_profiles IS 'Viewed profiles of a user in one row, used with SEEN_PROFILES_BITMAP';
+
+
+-- public.user_counters определение
+
+-- Drop table
+
+-- DROP TABLE public.user_counters;
+
+CREATE TABLE public.user_counters (
+	user_id int4 NOT NULL, -- ID of the user
+	favorites int4 NOT NULL, -- Number of favorites
+	blacklist int4 NOT NULL, -- Number of banned users
+	photo_likes int4 NOT NULL, -- Number of liked photos
+	updated_at timestamp NOT NULL,
+	CONSTRAINT user_counters_pkey PRIMARY KEY (user_id),
+	CONSTRAINT user_counters_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id)
+);
+COMMENT ON TABLE public.user_counters IS 'Per-user menu counters, maintained by the repository and reconciled in the background';
@@ -7,9 +7,21 @@ from config import constants
 from core.vk_api.client import VKClient
 from core.db.repositories import UserRepository
 from services.formatter import ProfileFormatter
+from services.search_results import search_results
+from core.metrics import HANDLER_LATENCY, HANDLER_ERRORS
+from core.profiling import profiler
 
 logger = logging.getLogger(__name__)
 
+# Уведомления, которые известны до запуска обработчика (без обращений к базе и VK):
+# ими отвечают на нажатие сразу, остальные команды просто снимают индикатор
+_ACK_SNACKBARS = {
+    'add_favorite': constants.Messages.FAVORITE_ADDED,
+    'like_photo': constants.Messages.PHOTO_LIKED,
+    'confirm_yes': constants.Messages.ACTION_CONFIRMED,
+    'confirm_no': constants.Messages.ACTION_REJECTED,
+}
+
 
 class CallbackPayload(BaseModel):
     """Модель payload данных callback"""
@@ -18,6 +30,7 @@ class CallbackPayload(BaseModel):
     match_id: Optional[int] = None
     photo_id: Optional[str] = None
     favorite_id: Optional[int] = None
+    cursor: Optional[str] = None
 
     @validator('command')
     def validate_command(cls, v):
@@ -26,7 +39,11 @@ class CallbackPayload(BaseModel):
             'add_favorite',
             'like_photo',
             'confirm_yes',
-            'confirm_no'
+            'confirm_no',
+            'favorites_page',
+            'blacklist_page',
+            'history_page',
+            'search_page'
         ]
         if v not in allowed_commands:
             raise ValueError(f"Invalid command. Allowed: {allowed_commands}")
@@ -62,46 +79,94 @@ class CallbackHandler:
             return None
 
     async def _handle_message_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Обработка событий от интерактивных элементов"""
+        """
+        Обработка событий от интерактивных элементов
+
+        На нажатие сразу отвечает messages.sendMessageEventAnswer с
+        уведомлением из _ACK_SNACKBARS, и только потом запускает обработчик:
+        индикатор на кнопке не ждет базы и VK. Если результат отличается от
+        показанного уведомления (ключ notice в ответе обработчика: уже в
+        избранном, лайк снят, ошибка), он отправляется сообщением в чат.
+        """
+        command = "unknown"
+        answered = False
         try:
             payload = self._parse_payload(event_data.get('payload'))
+            command = payload.command
             user_id = event_data['user_id']
 
+            await self._answer_event(event_data, _ACK_SNACKBARS.get(command))
+            answered = True
+
             handlers = {
                 'show_next': self._handle_show_next,
                 'add_favorite': self._handle_add_favorite,
                 'like_photo': self._handle_like_photo,
                 'confirm_yes': self._handle_confirm,
-                'confirm_no': self._handle_reject
+                'confirm_no': self._handle_reject,
+                'favorites_page': self._handle_favorites_page,
+                'blacklist_page': self._handle_blacklist_page,
+                'history_page': self._handle_history_page,
+                'search_page': self._handle_search_page
             }
 
-            if payload.command in handlers:
-                return await handlers[payload.command](user_id, payload)
+            if command in handlers:
+                with HANDLER_LATENCY.time(handler="callback", command=command), \
+                        profiler.tag(f"callback:{command}"):
+                    result = await handlers[command](user_id, payload, event_data)
+            else:
+                result = {"result": "unknown_command"}
 
-            return {"result": "unknown_command"}
+            notice = result.pop("notice", None)
+            if notice:
+                await self._send_notice(event_data, notice)
+            return result
 
         except Exception as e:
+            HANDLER_ERRORS.inc(handler="callback", command=command)
             logger.error(f"Message event handling error: {e}", exc_info=True)
+            if answered:
+                await self._send_notice(event_data, constants.Messages.CALLBACK_ERROR)
+            else:
+                await self._answer_event(event_data, constants.Messages.CALLBACK_ERROR)
             return {"result": "error", "message": str(e)}
 
+    async def _answer_event(self, event_data: Dict[str, Any], snackbar: Optional[str] = None):
+        """Снимает индикатор загрузки с кнопки, при необходимости показывая уведомление"""
+        if not event_data.get('event_id'):
+            return
+        try:
+            await self.vk.answer_event(
+                event_id=event_data['event_id'],
+                user_id=event_data['user_id'],
+                peer_id=event_data.get('peer_id', event_data['user_id']),
+                snackbar=snackbar
+            )
+        except Exception as e:
+            logger.error(f"Failed to answer message event: {e}")
+
+    async def _send_notice(self, event_data: Dict[str, Any], notice: str):
+        """Результат, который не совпал с уведомлением на кнопке, отправляется в чат"""
+        try:
+            await self.vk.send_message(user_id=event_data['user_id'], message=notice)
+        except Exception as e:
+            logger.error(f"Failed to send callback notice: {e}")
+
     def _parse_payload(self, payload: Any) -> CallbackPayload:
         """Парсинг и валидация payload"""
         if isinstance(payload, str):
             payload = json.loads(payload)
         return CallbackPayload(**payload)
 
-    async def _handle_show_next(self, user_id: int, payload: CallbackPayload) -> Dict[str, Any]:
-        """Обработка запроса показа следующего профиля"""
+    async def _handle_show_next(self, user_id: int, payload: CallbackPayload,
+                                event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обработка запроса показа следующего профиля (заменяет текущую карточку)"""
         if not payload.match_id:
             return {"result": "error", "message": "Missing match_id"}
 
         next_match = self.user_repo.get_next_match(user_id, payload.match_id)
         if not next_match:
-            await self.vk.send_message(
-                user_id=user_id,
-                message=constants.Messages.NO_MATCHES
-            )
-            return {"result": "no_more_matches"}
+            return {"result": "no_more_matches", "notice": constants.Messages.NO_MATCHES}
 
         profile_text = self.formatter.format_profile(next_match)
         photos = self.vk.get_top_photos(next_match['id'])
@@ -111,53 +176,132 @@ class CallbackHandler:
             photos=photos
         )
 
-        await self.vk.send_message(
-            user_id=user_id,
-            message=profile_text,
-            attachment=photos,
-            keyboard=keyboard
-        )
-
+        await self._replace_message(user_id, event_data, profile_text, keyboard, photos)
         return {"result": "success"}
 
-    async def _handle_add_favorite(self, user_id: int, payload: CallbackPayload) -> Dict[str, Any]:
+    async def _handle_add_favorite(self, user_id: int, payload: CallbackPayload,
+                                   event_data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка добавления в избранное"""
         if not payload.favorite_id:
             return {"result": "error", "message": "Missing favorite_id"}
 
-        success = self.user_repo.add_favorite(user_id, payload.favorite_id)
+        success, _ = self.user_repo.add_favorite(user_id, payload.favorite_id)
         if success:
-            await self.vk.send_message(
-                user_id=user_id,
-                message=constants.Messages.FAVORITE_ADDED
-            )
             return {"result": "success"}
 
-        return {"result": "already_exists"}
+        return {"result": "already_exists", "notice": constants.Messages.FAVORITE_EXISTS}
+
+    async def _handle_like_photo(self, user_id: int, payload: CallbackPayload,
+                                 event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Обработка лайка фотографии
 
-    async def _handle_like_photo(self, user_id: int, payload: CallbackPayload) -> Dict[str, Any]:
-        """Обработка лайка фотографии"""
+        Лайк хранится только в базе бота (граф лайков, взаимные симпатии):
+        поставить лайк в VK от имени пользователя ключом сообщества нельзя.
+        """
         if not payload.photo_id:
             return {"result": "error", "message": "Missing photo_id"}
 
-        success = await self.vk.like_photo(user_id, payload.photo_id)
-        return {"result": "success" if success else "error"}
+        success, liked = self.user_repo.toggle_photo_like(user_id, payload.photo_id)
+        if not success:
+            return {"result": "error", "notice": constants.Messages.CALLBACK_ERROR}
+        if not liked:
+            return {"result": "success", "notice": constants.Messages.PHOTO_UNLIKED}
+        return {"result": "success"}
 
-    async def _handle_confirm(self, user_id: int, payload: CallbackPayload) -> Dict[str, Any]:
+    async def _handle_confirm(self, user_id: int, payload: CallbackPayload,
+                              event_data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка подтверждающего действия"""
-        await self.vk.send_message(
-            user_id=user_id,
-            message="Действие подтверждено"
-        )
         return {"result": "confirmed"}
 
-    async def _handle_reject(self, user_id: int, payload: CallbackPayload) -> Dict[str, Any]:
+    async def _handle_reject(self, user_id: int, payload: CallbackPayload,
+                             event_data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка отклоняющего действия"""
+        return {"result": "rejected"}
+
+    async def _handle_favorites_page(self, user_id: int, payload: CallbackPayload,
+                                     event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обработка перехода на следующую страницу избранных"""
+        favorites, next_cursor = self.user_repo.get_favorites_page(user_id, cursor=payload.cursor)
+        await self._send_page(user_id, event_data, self.formatter.format_favorites(favorites),
+                              next_cursor, 'favorites_page')
+        return {"result": "success"}
+
+    async def _handle_blacklist_page(self, user_id: int, payload: CallbackPayload,
+                                     event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обработка перехода на следующую страницу черного списка"""
+        blacklist, next_cursor = self.user_repo.get_blacklist_page(user_id, cursor=payload.cursor)
+        message = "\n".join(f"https://vk.com/id{item['banned_id']}" for item in blacklist)
+        await self._send_page(user_id, event_data, message or "Ваш черный список пуст.",
+                              next_cursor, 'blacklist_page')
+        return {"result": "success"}
+
+    async def _handle_history_page(self, user_id: int, payload: CallbackPayload,
+                                   event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Обработка перехода на следующую страницу истории просмотров"""
+        history, next_cursor = self.user_repo.get_view_history_page(user_id, cursor=payload.cursor)
+        await self._send_page(user_id, event_data, self.formatter.format_view_history(history),
+                              next_cursor, 'history_page')
+        return {"result": "success"}
+
+    async def _handle_search_page(self, user_id: int, payload: CallbackPayload,
+                                  event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Следующая страница результатов поиска из сохраненного списка (без нового поиска)"""
+        page = search_results.next_page(user_id)
+        if not page.items:
+            return {"result": "no_more_matches", "notice": constants.Messages.NO_MATCHES}
+
+        await self._replace_message(
+            user_id, event_data,
+            self.formatter.format_search_page(page),
+            template=self.formatter.create_carousel(page.items, page.has_more)
+        )
+        self.user_repo.record_views(user_id, [match['id'] for match in page.items], source="search")
+        return {"result": "success"}
+
+    async def _send_page(self, user_id: int, event_data: Dict[str, Any], message: str,
+                         next_cursor: Optional[str], page_command: str):
+        """Показ страницы списка с кнопкой перехода к следующей на месте предыдущей"""
+        keyboard = None
+        if next_cursor:
+            keyboard = self.formatter.create_keyboard(
+                keyboard_type="list",
+                cursor=next_cursor,
+                page_command=page_command
+            )
+        await self._replace_message(user_id, event_data, message, keyboard)
+
+    async def _replace_message(self, user_id: int, event_data: Dict[str, Any], message: str,
+                               keyboard: Optional[Dict] = None, attachment: Any = None,
+                               template: Optional[Dict] = None):
+        """
+        Редактирует сообщение с нажатой кнопкой (messages.edit)
+
+        Если сообщение нельзя отредактировать (нет conversation_message_id
+        или VK вернул ошибку), отправляет новое.
+        """
+        conversation_message_id = event_data.get('conversation_message_id')
+        if conversation_message_id:
+            try:
+                await self.vk.edit_message(
+                    peer_id=event_data.get('peer_id', user_id),
+                    conversation_message_id=conversation_message_id,
+                    message=message,
+                    keyboard=keyboard,
+                    attachment=attachment,
+                    template=template
+                )
+                return
+            except Exception as e:
+                logger.warning(f"Failed to edit message {conversation_message_id}, sending new one: {e}")
+
         await self.vk.send_message(
             user_id=user_id,
-            message="Действие отменено"
+            message=message,
+            attachment=attachment,
+            keyboard=keyboard,
+            template=template
         )
-        return {"result": "rejected"}
 
     def _handle_confirmation(self, group_id: int) -> Dict[str, Any]:
         """Обработка подтверждения сервера"""
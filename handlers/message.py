@@ -4,24 +4,31 @@ from vk_api.bot_longpoll import VkBotEventType
 from config import constants
 from core.vk_api.client import VKClient
 from core.db.repositories import UserRepository
+from core.matching import MatchFinder
 from services.formatter import ProfileFormatter
-from services.analyzer import InterestAnalyzer
+from services.analyzer import analyzer
+from services.search_results import search_results
+from core.metrics import HANDLER_LATENCY, HANDLER_ERRORS
+from core.profiling import profiler
+from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
 class MessageHandler:
-    def __init__(self, vk_client: VKClient, user_repo: UserRepository):
+    def __init__(self, vk_client: VKClient, user_repo: UserRepository, match_finder: Optional[MatchFinder] = None):
         self.vk = vk_client
         self.user_repo = user_repo
+        self.match_finder = match_finder or MatchFinder(vk_client, vk_client, user_repo)
         self.formatter = ProfileFormatter()
-        self.analyzer = InterestAnalyzer()
+        self.analyzer = analyzer
         self.command_handlers = {
             "начать": self._handle_start,
             "привет": self._handle_start,
             "найти": self._handle_search,
             "избранные": self._handle_show_favorites,
             "черный список": self._handle_blacklist,
+            "история": self._handle_view_history,
             "помощь": self._handle_help,
             "help": self._handle_help
         }
@@ -36,6 +43,7 @@ class MessageHandler:
         Returns:
             bool: Успешность обработки сообщения
         """
+        command = "unknown"
         try:
             if event['type'] != VkBotEventType.MESSAGE_NEW:
                 return False
@@ -44,15 +52,21 @@ class MessageHandler:
             user_id = message['from_id']
             text = message['text'].lower()
 
+            if text.startswith("/profile") and user_id in settings.ADMIN_IDS:
+                return await self._handle_profile(user_id, text)
+
             # Обработка команды
             handler = self.command_handlers.get(text)
-            if handler:
-                return await handler(user_id)
+            command = text if handler else "text"
+            with HANDLER_LATENCY.time(handler="message", command=command), profiler.tag(f"message:{command}"):
+                if handler:
+                    return await handler(user_id)
 
-            # Обработка произвольного текста
-            return await self._handle_text_message(user_id, text)
+                # Обработка произвольного текста
+                return await self._handle_text_message(user_id, text)
 
         except Exception as e:
+            HANDLER_ERRORS.inc(handler="message", command=command)
             logger.error(f"Message handling error: {e}", exc_info=True)
             return False
 
@@ -76,8 +90,8 @@ class MessageHandler:
             )
             return False
 
-        # Ищем совпадения
-        matches = self.user_repo.find_matches(current_user)
+        # Ищем совпадения: поиск по стадиям, фото и группы только для короткого списка
+        matches = await self.match_finder.find_matches_async(user_id, current_user)
         if not matches:
             await self.vk.send_message(
                 user_id=user_id,
@@ -85,51 +99,86 @@ class MessageHandler:
             )
             return True
 
-        # Показываем первое совпадение
-        match = matches[0][1]
-        profile_text = self.formatter.format_profile(match, current_user)
-        photos = self.vk.get_top_photos(match['id'])
-        keyboard = self.formatter.create_keyboard(
-            keyboard_type="main",
-            match_id=match['id'],
-            photos=photos
-        )
-
-        return await self.vk.send_message(
+        # Первая страница уходит одной каруселью, остальные кандидаты ждут кнопки "Ещё"
+        search_results.save(user_id, [match for _, match in matches])
+        page = search_results.next_page(user_id)
+        sent = await self.vk.send_message(
             user_id=user_id,
-            message=profile_text,
-            attachment=photos,
-            keyboard=keyboard
+            message=self.formatter.format_search_page(page),
+            template=self.formatter.create_carousel(page.items, page.has_more)
         )
+        # Показанные карточки попадают в историю и больше не выдаются поиском
+        self.user_repo.record_views(user_id, [match['id'] for match in page.items], source="search")
+        return sent
 
     async def _handle_show_favorites(self, user_id: int) -> bool:
         """Обработка команды показа избранных"""
-        favorites = self.user_repo.get_favorites(user_id)
+        favorites, next_cursor = self.user_repo.get_favorites_page(user_id)
         message = self.formatter.format_favorites(favorites)
+        keyboard = None
+        if next_cursor:
+            keyboard = self.formatter.create_keyboard(
+                keyboard_type="list",
+                cursor=next_cursor,
+                page_command="favorites_page"
+            )
         return await self.vk.send_message(
             user_id=user_id,
-            message=message
+            message=message,
+            keyboard=keyboard
         )
 
     async def _handle_blacklist(self, user_id: int) -> bool:
         """Обработка команды работы с черным списком"""
-        blacklist = self.user_repo.get_blacklist(user_id)
+        blacklist, next_cursor = self.user_repo.get_blacklist_page(user_id)
         if not blacklist:
             message = "Ваш черный список пуст."
         else:
-            users_info = self.vk.get_users_info(blacklist)
+            users_info = self.vk.get_users_info([item['banned_id'] for item in blacklist])
             message = "Черный список:\n" + "\n".join(
                 f"{i + 1}. {user['first_name']} {user['last_name']}"
                 for i, user in enumerate(users_info)
             )
 
-        keyboard = self.formatter.create_keyboard(keyboard_type="confirm")
+        keyboard = self.formatter.create_keyboard(
+            keyboard_type="confirm",
+            cursor=next_cursor,
+            page_command="blacklist_page"
+        )
         return await self.vk.send_message(
             user_id=user_id,
             message=message,
             keyboard=keyboard
         )
 
+    async def _handle_view_history(self, user_id: int) -> bool:
+        """Обработка команды показа истории просмотров"""
+        history, next_cursor = self.user_repo.get_view_history_page(user_id)
+        keyboard = None
+        if next_cursor:
+            keyboard = self.formatter.create_keyboard(
+                keyboard_type="list",
+                cursor=next_cursor,
+                page_command="history_page"
+            )
+        return await self.vk.send_message(
+            user_id=user_id,
+            message=self.formatter.format_view_history(history),
+            keyboard=keyboard
+        )
+
+    async def _handle_profile(self, user_id: int, text: str) -> bool:
+        """Админская команда "/profile [секунд]": запись профиля без перезапуска"""
+        parts = text.split()
+        duration = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else settings.PROFILE_DURATION
+        path = profiler.start(duration)
+        message = (f"Профилирование запущено на {duration} сек.\nФайл: {path}" if path
+                   else f"Профилирование уже идет. Последний профиль: {profiler.last_output}")
+        return await self.vk.send_message(
+            user_id=user_id,
+            message=message
+        )
+
     async def _handle_help(self, user_id: int) -> bool:
         """Обработка команды помощи"""
         help_text = (
@@ -137,6 +186,7 @@ class MessageHandler:
             "• Найти - начать поиск партнеров\n"
             "• Избранные - показать ваш список избранных\n"
             "• Черный список - управление черным списком\n"
+            "• История - показать просмотренные профили\n"
             "• Помощь - показать это сообщение"
         )
         return await self.vk.send_message(
@@ -1,14 +1,70 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Any, Iterable, List
+
+from services.interests import CommonInterestEngine, tokenize
+
+
+def _cosine_similarity(a, b):
+    # scikit-learn импортируется около секунды, поэтому только при первом расчете TF-IDF
+    from sklearn.metrics.pairwise import cosine_similarity
+    return cosine_similarity(a, b)
 
 
 class InterestAnalyzer:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer()
+    def __init__(self, vectorizer=None):
+        self._vectorizer = vectorizer
+        self.interests = CommonInterestEngine()
+
+    @property
+    def vectorizer(self):
+        """TfidfVectorizer, создается при первом обращении"""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._vectorizer = TfidfVectorizer()
+        return self._vectorizer
+
+    @property
+    def fitted(self) -> bool:
+        return self._vectorizer is not None and hasattr(self._vectorizer, 'vocabulary_')
+
+    def fit(self, corpus: Iterable[str]):
+        """Обучает словарь и IDF на корпусе анкет, чтобы дальше только трансформировать"""
+        self.vectorizer.fit([text for text in corpus if text])
+        return self.vectorizer
 
     def calculate_similarity(self, text1: str, text2: str) -> float:
         if not text1 or not text2:
             return 0.0
 
-        vectors = self.vectorizer.fit_transform([text1, text2])
-        return cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
\ No newline at end of file
+        if self.fitted:
+            vectors = self.vectorizer.transform([text1, text2])
+        else:
+            vectors = self.vectorizer.fit_transform([text1, text2])
+        return _cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
+
+    def text_similarities(self, text: str, texts: List[str]) -> List[float]:
+        """
+        TF-IDF близость текста к каждому тексту пачки одним матричным умножением
+
+        Без обученного словаря возвращает нули: обучение на каждой пачке
+        давало бы несравнимые между запросами оценки.
+        """
+        if not text or not texts or not self.fitted:
+            return [0.0] * len(texts)
+        vectors = self.vectorizer.transform(texts)
+        return _cosine_similarity(self.vectorizer.transform([text]), vectors)[0].tolist()
+
+    def find_common_items(self, text1: str, text2: str) -> List[str]:
+        """Общие слова двух текстовых полей после нормализации"""
+        tokens1 = tokenize(text1)
+        tokens2 = tokenize(text2)
+        return sorted(tokens1.surface[lemma] for lemma in tokens1.lemmas & tokens2.lemmas)
+
+    @staticmethod
+    def profile_text(profile: Any) -> str:
+        """Текст анкеты для TF-IDF: все текстовые поля интересов через пробел"""
+        get = profile.get if isinstance(profile, dict) else lambda name: getattr(profile, name, None)
+        return ' '.join(get(name) or '' for name in CommonInterestEngine.TEXT_FIELDS).strip()
+
+
+# Общий экземпляр для обработчиков, форматтера и поиска: один кэш нормализованных анкет на процесс
+analyzer = InterestAnalyzer()
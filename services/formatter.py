@@ -2,8 +2,9 @@ import json
 from typing import Dict, List, Optional, Union
 from datetime import datetime
 from config import constants
+from core.matching import MatchFinder
 from core.vk_api.models.user import VkUser
-from services.analyzer import InterestAnalyzer
+from services.analyzer import analyzer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,7 +14,7 @@ class ProfileFormatter:
     """Класс для форматирования данных профилей и сообщений бота"""
 
     def __init__(self):
-        self.analyzer = InterestAnalyzer()
+        self.analyzer = analyzer
         self.photo_template = "photo{owner_id}_{photo_id}"
 
     def format_profile(
@@ -62,36 +63,17 @@ class ProfileFormatter:
     ) -> str:
         """Находит и форматирует общие интересы между двумя профилями"""
         try:
-            fields_to_compare = ['interests', 'music', 'books', 'groups']
-            common = []
-
-            for field in fields_to_compare:
-                data1 = getattr(profile1, field, None) if isinstance(profile1, VkUser) else profile1.get(field)
-                data2 = getattr(profile2, field, None) if isinstance(profile2, VkUser) else profile2.get(field)
-
-                if data1 and data2:
-                    if field == 'groups':
-                        common.extend(self._compare_groups(data1, data2))
-                    else:
-                        common.extend(self.analyzer.find_common_items(data1, data2))
-
-            return ", ".join(set(filter(None, common))) if common else ""
+            common = self.analyzer.interests.common_items(profile1, profile2)
+            labels = dict.fromkeys(label for _, label in common)
+            return ", ".join(labels)
         except Exception as e:
             logger.error(f"Error finding common interests: {e}")
             return ""
 
     def _compare_groups(self, groups1: List[Dict], groups2: List[Dict]) -> List[str]:
         """Сравнивает группы двух пользователей"""
-        group_ids1 = {g['id'] for g in groups1}
-        group_ids2 = {g['id'] for g in groups2}
-        common_ids = group_ids1 & group_ids2
-
-        common_groups = []
-        for group in groups1 + groups2:
-            if group['id'] in common_ids and group['name'] not in common_groups:
-                common_groups.append(group['name'])
-
-        return common_groups
+        common = self.analyzer.interests.common_items({'groups': groups1}, {'groups': groups2})
+        return [label for field, label in common if field == 'groups']
 
     def format_photos(self, photos: List[Dict]) -> List[str]:
         """Форматирует фотографии для отправки через VK API"""
@@ -137,16 +119,35 @@ class ProfileFormatter:
         formatted = []
         for i, fav in enumerate(favorites, 1):
             profile = self.format_profile(fav, show_common_interests=False)
-            added_at = fav['added_at'].strftime('%d.%m.%Y %H:%M')
+            added_at = self._parse_datetime(fav['added_at']).strftime('%d.%m.%Y %H:%M')
             formatted.append(f"{i}. {profile}\nДобавлен: {added_at}")
 
         return "\n\n".join(formatted)
 
+    def format_view_history(self, history: List[Dict]) -> str:
+        """Форматирует историю просмотренных профилей"""
+        if not history:
+            return "История просмотров пуста."
+
+        formatted = []
+        for i, item in enumerate(history, 1):
+            viewed_at = self._parse_datetime(item['viewed_at']).strftime('%d.%m.%Y %H:%M')
+            formatted.append(f"{i}. https://vk.com/id{item['viewed_user_id']} ({viewed_at})")
+
+        return "\n".join(formatted)
+
+    @staticmethod
+    def _parse_datetime(value: Union[str, datetime]) -> datetime:
+        """Репозиторий отдает даты в ISO-формате, старый код - объектами datetime"""
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+
     def create_keyboard(
             self,
             keyboard_type: str = "main",
             match_id: Optional[int] = None,
-            photos: Optional[List[Dict]] = None
+            photos: Optional[List[Dict]] = None,
+            cursor: Optional[str] = None,
+            page_command: Optional[str] = None
     ) -> Dict:
         """
         Создает интерактивную клавиатуру для бота
@@ -155,6 +156,8 @@ class ProfileFormatter:
             keyboard_type: Тип клавиатуры (main, photos, confirm)
             match_id: ID текущего совпадения (для callback)
             photos: Список фотографий (для кнопок лайков)
+            cursor: Курсор следующей страницы списка (добавляет кнопку "Далее")
+            page_command: Команда callback для загрузки следующей страницы
         """
         keyboard = {"inline": True, "buttons": []}
 
@@ -191,8 +194,77 @@ class ProfileFormatter:
                 self._create_button("Нет", "confirm_no", {}, "negative")
             ])
 
+        if cursor and page_command:
+            keyboard["buttons"].append([
+                self._create_button("➡️ Далее", page_command, {"cursor": cursor}, "secondary")
+            ])
+
         return keyboard
 
+    @staticmethod
+    def format_search_page(page) -> str:
+        """Подпись к карусели: какие по счету анкеты показаны"""
+        return constants.Messages.SEARCH_RESULTS.format(
+            start=page.start, end=page.start + len(page.items) - 1, total=page.total
+        )
+
+    def create_carousel(self, matches: List[Dict], has_more: bool = False) -> Dict:
+        """
+        Создает шаблон карусели (до 10 карточек) для одного messages.send
+
+        У всех карточек одинаковый набор кнопок: VK требует одинаковую
+        структуру элементов, поэтому фото добавляется, только если оно есть
+        у каждого кандидата.
+
+        Args:
+            matches: Кандидаты страницы по убыванию рейтинга
+            has_more: Есть ли следующая страница (кнопка "Ещё" на карточках)
+        """
+        matches = matches[:constants.BotConstants.CAROUSEL_SIZE]
+        with_photos = all(match.get('photo_id') for match in matches)
+        elements = []
+
+        for match in matches:
+            buttons = [
+                self._create_button("❤️ В избранное", "add_favorite", {"favorite_id": match['id']}),
+            ]
+            if with_photos:
+                buttons.append(self._create_button(
+                    "👍 Фото", "like_photo", {"photo_id": f"photo{match['photo_id']}"}, "secondary"
+                ))
+            if has_more:
+                buttons.append(self._create_button("➡️ Ещё", "search_page", {}, "secondary"))
+
+            element = {
+                "title": f"{match.get('first_name', '')} {match.get('last_name', '')}".strip()[:80],
+                "description": self._card_description(match)[:80],
+                "action": {"type": "open_link", "link": f"https://vk.com/id{match['id']}"},
+                "buttons": buttons
+            }
+            if with_photos:
+                element["photo_id"] = match['photo_id']
+            elements.append(element)
+
+        return {"type": "carousel", "elements": elements}
+
+    @staticmethod
+    def _card_description(match: Dict) -> str:
+        """Возраст и город для подписи карточки"""
+        parts = []
+        age = MatchFinder._get_age(match)
+        if age:
+            if age % 10 == 1 and age % 100 != 11:
+                suffix = "год"
+            elif 2 <= age % 10 <= 4 and not 12 <= age % 100 <= 14:
+                suffix = "года"
+            else:
+                suffix = "лет"
+            parts.append(f"{age} {suffix}")
+        city = match.get('city')
+        if isinstance(city, dict) and city.get('title'):
+            parts.append(city['title'])
+        return ", ".join(parts) or "Профиль ВКонтакте"
+
     def _create_button(
             self,
             label: str,
@@ -0,0 +1,273 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union, FrozenSet, NamedTuple, Any
+
+from config import constants
+
+try:
+    import pymorphy2
+except ImportError:  # Лемматизация по словарю необязательна
+    pymorphy2 = None
+
+logger = logging.getLogger(__name__)
+
+RUSSIAN_STOPWORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она',
+    'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее',
+    'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда',
+    'даже', 'ну', 'вдруг', 'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него', 'до',
+    'вас', 'нибудь', 'опять', 'уж', 'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей',
+    'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней', 'для', 'мы', 'тебя', 'их', 'чем',
+    'была', 'сам', 'чтоб', 'без', 'будто', 'чего', 'раз', 'тоже', 'себе', 'под', 'будет',
+    'ж', 'тогда', 'кто', 'этот', 'того', 'потому', 'этого', 'какой', 'совсем', 'ним',
+    'здесь', 'этом', 'один', 'почти', 'мой', 'тем', 'чтобы', 'нее', 'сейчас', 'были',
+    'куда', 'зачем', 'всех', 'никогда', 'можно', 'при', 'наконец', 'два', 'об', 'другой',
+    'это', 'эта', 'хоть', 'после', 'над', 'больше', 'тот', 'через', 'эти', 'нас', 'про',
+    'всего', 'них',
+    'какая', 'много', 'разве', 'три', 'эту', 'моя', 'впрочем', 'хорошо', 'свою', 'этой',
+    'перед', 'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'им', 'более', 'всегда',
+    'конечно', 'всю', 'между', 'люблю', 'нравится', 'очень',
+    'the', 'and', 'of', 'a', 'an', 'in', 'to', 'is', 'i', 'my', 'love',
+})
+
+# Окончания для упрощенного стемминга, когда pymorphy2 не установлен.
+# Отсортированы по убыванию длины, чтобы отрезалось самое длинное совпадение.
+_RUSSIAN_ENDINGS = tuple(sorted({
+    'иями', 'ией', 'иям', 'иях', 'ием', 'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми',
+    'ими', 'ая', 'яя', 'ое', 'ее', 'ие', 'ые', 'ой', 'ей', 'ий', 'ый', 'ую', 'юю', 'ах', 'ях', 'ом', 'ем', 'ам', 'ям', 'ов',
+    'ев', 'ию', 'ия', 'ии', 'ье', 'ья', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+}, key=len, reverse=True))
+
+_TOKEN_RE = re.compile(r"[\w][\w\-+#]*", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-я]")
+_MIN_STEM_LENGTH = 3
+
+_morph = None
+_hasher = None
+
+
+class TokenSet(NamedTuple):
+    """Нормализованные токены поля: леммы и исходное написание для вывода"""
+    lemmas: FrozenSet[str]
+    surface: Dict[str, str]
+
+
+def _get_morph():
+    """Ленивая инициализация морфологического анализатора"""
+    global _morph
+    if _morph is None and pymorphy2 is not None:
+        _morph = pymorphy2.MorphAnalyzer()
+    return _morph
+
+
+def _get_hasher():
+    """Ленивая инициализация MinHash-сигнатур (numpy не нужен до первого расчета)"""
+    global _hasher
+    if _hasher is None:
+        from services.minhash import MinHasher
+        _hasher = MinHasher()
+    return _hasher
+
+
+@lru_cache(maxsize=65536)
+def normalize_word(word: str) -> str:
+    """Приводит слово к нормальной форме (лемме или основе)"""
+    word = word.lower().replace('ё', 'е')
+    if not _CYRILLIC_RE.search(word):
+        return word
+
+    morph = _get_morph()
+    if morph is not None:
+        return morph.parse(word)[0].normal_form.replace('ё', 'е')
+
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def tokenize(text: str) -> TokenSet:
+    """
+    Разбивает текстовое поле профиля на нормализованные токены
+
+    Результат кэшируется по тексту, поэтому одинаковые поля разных
+    запросов разбираются только один раз.
+    """
+    surface: Dict[str, str] = {}
+    for match in _TOKEN_RE.finditer(text or ''):
+        word = match.group(0).strip('-').lower()
+        if len(word) < 2 or word.isdigit() or word in RUSSIAN_STOPWORDS:
+            continue
+        lemma = normalize_word(word)
+        if lemma in RUSSIAN_STOPWORDS:
+            continue
+        surface.setdefault(lemma, word)
+    return TokenSet(frozenset(surface), surface)
+
+
+def _field(profile: Any, name: str) -> Any:
+    """Достает поле из словаря или модели профиля"""
+    if isinstance(profile, dict):
+        return profile.get(name)
+    return getattr(profile, name, None)
+
+
+def _group_items(groups: Any) -> List[Any]:
+    """Приводит ответ VK с группами к списку элементов"""
+    if not groups:
+        return []
+    if isinstance(groups, dict):
+        return groups.get('items', [])
+    return list(groups)
+
+
+def _group_id(value: Any) -> Optional[int]:
+    """ID группы как int; нечисловые значения (screen_name и т.п.) пропускаются"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logger.debug(f"Skipping non-numeric group id: {value!r}")
+        return None
+
+
+class CommonInterestEngine:
+    """
+    Поиск общих интересов между профилями
+
+    Текстовые поля (interests, music, books) нормализуются один раз на
+    пользователя в frozenset лемм, группы сравниваются по множествам id.
+    Используется и для вывода профиля, и для расчета рейтинга совпадения.
+    """
+
+    TEXT_FIELDS = ('interests', 'music', 'books')
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, cache_size: Optional[int] = None):
+        self.weights = weights or constants.BotConstants.WEIGHTS
+        self.cache_size = cache_size or constants.BotConstants.INTEREST_CACHE_SIZE
+        self._profiles: "OrderedDict[Any, Tuple[Tuple, Dict[str, Any]]]" = OrderedDict()
+        # Поиски разных пользователей считают признаки в потоках пула цикла событий
+        self._lock = threading.Lock()
+
+    def profile_features(self, profile: Any) -> Dict[str, Any]:
+        """
+        Возвращает нормализованные признаки профиля (с кэшированием по id)
+
+        Returns:
+            Словарь: текстовое поле -> TokenSet, 'groups' -> frozenset id,
+            'group_names' -> словарь id -> название, 'group_signature' ->
+            MinHash-сигнатура групп для оценки сходства
+        """
+        raw = tuple(_field(profile, name) or '' for name in self.TEXT_FIELDS)
+        group_ids = set()
+        group_names = {}
+        for group in _group_items(_field(profile, 'groups')):
+            group_id = _group_id(group.get('id') if isinstance(group, dict) else group)
+            if group_id is None:
+                continue
+            group_ids.add(group_id)
+            if isinstance(group, dict) and group.get('name'):
+                group_names.setdefault(group_id, group['name'])
+        group_ids = frozenset(group_ids)
+        key = _field(profile, 'id')
+        # Хэш состава групп: другие группы в том же количестве не должны отдавать старые признаки
+        fingerprint = (raw, hash(group_ids))
+
+        if key is not None:
+            with self._lock:
+                cached = self._profiles.get(key)
+                if cached is not None and cached[0] == fingerprint:
+                    self._profiles.move_to_end(key)
+                    return cached[1]
+
+        features: Dict[str, Any] = {
+            name: tokenize(text) for name, text in zip(self.TEXT_FIELDS, raw)
+        }
+        features['groups'] = group_ids
+        features['group_names'] = group_names
+        features['group_signature'] = _get_hasher().signature(group_ids)
+
+        if key is not None:
+            with self._lock:
+                self._profiles[key] = (fingerprint, features)
+                self._profiles.move_to_end(key)
+                if len(self._profiles) > self.cache_size:
+                    self._profiles.popitem(last=False)
+        return features
+
+    def common_items(self, profile1: Any, profile2: Any) -> List[Tuple[str, str]]:
+        """
+        Находит общие элементы профилей, отсортированные по значимости
+
+        Порядок определяется весом поля в BotConstants.WEIGHTS, внутри
+        поля - по алфавиту, чтобы вывод был стабильным.
+
+        Returns:
+            Список пар (поле, подпись для вывода)
+        """
+        features1 = self.profile_features(profile1)
+        features2 = self.profile_features(profile2)
+        ranked = []
+
+        for name in self.TEXT_FIELDS:
+            tokens1, tokens2 = features1[name], features2[name]
+            for lemma in tokens1.lemmas & tokens2.lemmas:
+                ranked.append((self.weights.get(name, 0), name, tokens1.surface[lemma]))
+
+        names = features1['group_names']
+        names2 = features2['group_names']
+        for group_id in features1['groups'] & features2['groups']:
+            label = names.get(group_id) or names2.get(group_id)
+            if label:
+                ranked.append((self.weights.get('groups', 0), 'groups', label))
+
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return [(name, label) for _, name, label in ranked]
+
+    def similarity(self, profile1: Any, profile2: Any, group_similarity: Optional[float] = None) -> Dict[str, float]:
+        """
+        Коэффициент Жаккара по каждому полю интересов и по группам
+
+        Для групп - оценка по MinHash-сигнатурам (или group_similarity,
+        если она уже посчитана для всей пачки в group_similarities).
+        Точное пересечение групп считает common_items для вывода анкеты.
+        """
+        features1 = self.profile_features(profile1)
+        features2 = self.profile_features(profile2)
+        result = {}
+
+        for name in self.TEXT_FIELDS:
+            result[name] = self._jaccard(features1[name].lemmas, features2[name].lemmas)
+        if group_similarity is None:
+            group_similarity = _get_hasher().jaccard(features1['group_signature'], features2['group_signature'])
+        result['groups'] = group_similarity
+        return result
+
+    def group_similarities(self, profile: Any, candidates: List[Any]) -> List[float]:
+        """Оценки сходства групп профиля со всей пачкой кандидатов одной векторной операцией"""
+        signature = self.profile_features(profile)['group_signature']
+        signatures = [self.profile_features(candidate)['group_signature'] for candidate in candidates]
+        return _get_hasher().batch_jaccard(signature, signatures).tolist()
+
+    def score(self, profile1: Any, profile2: Any, group_similarity: Optional[float] = None) -> float:
+        """Взвешенная оценка общих интересов для рейтинга совпадений"""
+        return sum(
+            self.weights.get(name, 0) * value
+            for name, value in self.similarity(profile1, profile2, group_similarity).items()
+        )
+
+    def clear_cache(self, user_id: Optional[int] = None):
+        """Сброс кэша признаков (целиком или для одного пользователя)"""
+        if user_id is None:
+            self._profiles.clear()
+        else:
+            self._profiles.pop(user_id, None)
+
+    @staticmethod
+    def _jaccard(set1: Union[FrozenSet, set], set2: Union[FrozenSet, set]) -> float:
+        if not set1 or not set2:
+            return 0.0
+        return len(set1 & set2) / len(set1 | set2)
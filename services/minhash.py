@@ -0,0 +1,66 @@
+"""
+MinHash-сигнатуры подписок на сообщества
+
+Точный коэффициент Жаккара по группам требует пересечения списков из
+сотен ID для каждой пары пользователь-кандидат. Вместо этого для каждого
+профиля один раз (при получении групп) считается сигнатура - массив из
+num_perm минимальных хэшей uint32, и сходство оценивается как доля
+совпавших позиций, в том числе сразу для всей пачки кандидатов.
+Погрешность оценки ~1/sqrt(num_perm).
+"""
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from config import constants
+
+_PRIME = np.uint64((1 << 31) - 1)
+# Хэши меньше _PRIME, поэтому максимальное значение uint32 помечает пустую сигнатуру
+EMPTY = np.uint32(0xFFFFFFFF)
+
+
+class MinHasher:
+    """
+    Сигнатуры множеств ID по семейству хэшей (a * x + b) mod p
+
+    Args:
+        num_perm: длина сигнатуры
+        seed: зерно для коэффициентов; сигнатуры сравнимы только при одинаковых параметрах
+    """
+
+    def __init__(self, num_perm: Optional[int] = None, seed: int = 1):
+        self.num_perm = num_perm or constants.BotConstants.MINHASH_PERMUTATIONS
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, ids: Iterable[int]) -> np.ndarray:
+        """Сигнатура множества ID (uint32[num_perm]); для пустого множества - все EMPTY"""
+        values = np.fromiter(ids, dtype=np.uint64)
+        if not values.size:
+            return np.full(self.num_perm, EMPTY, dtype=np.uint32)
+        # a < 2^31 и x < 2^32, поэтому произведение помещается в uint64
+        values &= np.uint64(0xFFFFFFFF)
+        hashed = (np.multiply.outer(values, self._a) + self._b) % _PRIME
+        return hashed.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def is_empty(signature: np.ndarray) -> bool:
+        return bool(signature[0] == EMPTY)
+
+    @staticmethod
+    def jaccard(signature1: np.ndarray, signature2: np.ndarray) -> float:
+        """Оценка коэффициента Жаккара по двум сигнатурам"""
+        if MinHasher.is_empty(signature1) or MinHasher.is_empty(signature2):
+            return 0.0
+        return float(np.count_nonzero(signature1 == signature2)) / len(signature1)
+
+    @staticmethod
+    def batch_jaccard(signature: np.ndarray, signatures: Sequence[np.ndarray]) -> np.ndarray:
+        """Оценки коэффициента Жаккара одной сигнатуры со всеми сигнатурами пачки"""
+        if not len(signatures) or MinHasher.is_empty(signature):
+            return np.zeros(len(signatures))
+        matrix = np.vstack(signatures)
+        result = np.count_nonzero(matrix == signature, axis=1) / matrix.shape[1]
+        result[matrix[:, 0] == EMPTY] = 0.0
+        return result
@@ -0,0 +1,78 @@
+"""
+Хранение ранжированных результатов поиска между страницами карусели
+
+После поиска пользователю отправляется только первая страница, остальной
+отсортированный список остается в памяти процесса и выдается по кнопке
+"Ещё" без повторного поиска и ранжирования. В многопроцессном режиме все
+события пользователя попадают в один процесс, поэтому список доступен.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import constants
+from core.vk_api.models.candidate import Candidate
+
+
+class SearchPage(NamedTuple):
+    items: List[Dict[str, Any]]
+    start: int       # Номер первого кандидата страницы (с 1)
+    total: int       # Всего кандидатов в результатах поиска
+    has_more: bool
+
+
+class SearchResultsStore:
+    """
+    LRU-хранилище оставшихся кандидатов по пользователям
+
+    Args:
+        max_users: сколько пользователей хранить одновременно
+        ttl: время жизни результатов поиска, сек
+    """
+
+    def __init__(self, max_users: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_users = max_users or constants.BotConstants.SEARCH_RESULTS_CACHE_SIZE
+        self.ttl = ttl or constants.BotConstants.SEARCH_RESULTS_TTL
+        # user_id -> (срок жизни, кандидаты, позиция следующей страницы)
+        self._results: "OrderedDict[int, Tuple[float, List[Dict[str, Any]], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, user_id: int, candidates: List[Dict[str, Any]]):
+        """
+        Заменяет результаты поиска пользователя (кандидаты по убыванию рейтинга)
+
+        Поля, нужные только для ранжирования, не сохраняются.
+        """
+        candidates = [c.compact() if isinstance(c, Candidate) else c for c in candidates]
+        with self._lock:
+            self._results[user_id] = (time.monotonic() + self.ttl, candidates, 0)
+            self._results.move_to_end(user_id)
+            while len(self._results) > self.max_users:
+                self._results.popitem(last=False)
+
+    def next_page(self, user_id: int, size: Optional[int] = None) -> SearchPage:
+        """Забирает следующую страницу кандидатов (пустую, если результатов нет или они устарели)"""
+        size = size or constants.BotConstants.CAROUSEL_SIZE
+        with self._lock:
+            entry = self._results.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._results.pop(user_id, None)
+                return SearchPage([], 0, 0, False)
+
+            expires, candidates, position = entry
+            end = position + size
+            has_more = end < len(candidates)
+            if has_more:
+                self._results[user_id] = (expires, candidates, end)
+                self._results.move_to_end(user_id)
+            else:
+                del self._results[user_id]
+            return SearchPage(candidates[position:end], position + 1, len(candidates), has_more)
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._results.pop(user_id, None)
+
+
+search_results = SearchResultsStore()
@@ -0,0 +1,159 @@
+import random
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from core.db.bitmap import RoaringBitmap
+from core.db.models import Base, MatchViewHistory, SeenProfiles, User
+from core.db.repositories import UserRepository
+from core.db.retention import ViewHistoryRetention
+
+
+class TestRoaringBitmap:
+
+    def test_membership_sparse_and_dense_blocks(self):
+        values = set(random.Random(1).sample(range(10 ** 9), 3000)) | set(range(500000, 510000))
+        bitmap = RoaringBitmap(values)
+
+        assert len(bitmap) == len(values)
+        assert all(value in bitmap for value in values)
+        assert 499999 not in bitmap and 10 ** 9 + 1 not in bitmap and None not in bitmap
+        assert list(bitmap) == sorted(values)
+
+    def test_batched_update_merges(self):
+        bitmap = RoaringBitmap([1, 5])
+        bitmap.update([3, 5, 70000])
+        bitmap.add(2)
+        assert list(bitmap) == [1, 2, 3, 5, 70000]
+
+    def test_roundtrip_is_compact(self):
+        values = range(600000000, 600000000 + 50000 * 3, 3)
+        data = RoaringBitmap(values).to_bytes()
+
+        assert RoaringBitmap.from_bytes(data) == RoaringBitmap(values)
+        # 50000 ID: плотные блоки по 8 КБ вместо 50000 строк истории
+        assert len(data) < 30000
+
+    def test_rejects_out_of_range(self):
+        with pytest.raises(ValueError):
+            RoaringBitmap([2 ** 32])
+
+
+@pytest.fixture
+def repo():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add_all([User(id=user_id) for user_id in range(1, 40)])
+    session.commit()
+    with patch('core.db.repositories.settings.SEEN_PROFILES_BITMAP', True), \
+            patch('core.db.repositories.settings.VIEW_HISTORY_RETENTION_DAYS', None):
+        yield UserRepository(session)
+    session.close()
+    engine.dispose()
+
+
+class TestSeenProfilesMode:
+
+    def test_view_history_updates_bitmap(self, repo):
+        for viewed_id in (5, 6, 7):
+            assert repo.add_to_view_history(1, viewed_id)
+
+        assert list(repo.get_seen_profiles(1)) == [5, 6, 7]
+        assert repo.session.query(MatchViewHistory).count() == 3  # история для вывода сохраняется
+        assert repo.session.query(SeenProfiles).count() == 1
+
+    def test_excluded_ids_from_one_row(self, repo):
+        repo.mark_seen(1, range(10, 30))
+        repo.add_to_blacklist(1, 35)
+
+        with patch.object(repo.session, 'query', wraps=repo.session.query) as query:
+            excluded = repo.get_excluded_ids(1)
+
+        assert isinstance(excluded, RoaringBitmap)
+        assert 1 in excluded and 35 in excluded and 15 in excluded and 31 not in excluded
+        # черный список, избранное и одна строка seen_profiles
+        assert query.call_count == 3
+
+    def test_rebuild_after_retention_purge(self, repo):
+        now = datetime.now()
+        repo.session.add_all([
+            MatchViewHistory(user_id=1, viewed_user_id=viewed_id, viewed_at=now - timedelta(days=days))
+            for viewed_id, days in ((10, 1), (11, 100), (12, 200))
+        ])
+        repo.session.commit()
+        repo.mark_seen(1, [10, 11, 12])
+
+        session = repo.session
+        retention = ViewHistoryRetention(30, pause=0, session_factory=lambda: session, rebuild_seen=True)
+        with patch.object(session, 'close'):
+            assert retention.purge(now=now) == 2
+
+        assert list(repo.get_seen_profiles(1)) == [10]
+
+    def test_clear_view_history_drops_bitmap(self, repo):
+        repo.add_to_view_history(1, 5)
+        assert repo.clear_view_history(1)
+        assert len(repo.get_seen_profiles(1)) == 0
+
+    def test_rebuild_locks_row_before_reading_history(self, repo):
+        repo.add_to_view_history(1, 5)
+        statements = []
+        event.listen(repo.session.get_bind(), "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        assert repo.rebuild_seen_profiles(1) == 1
+
+        tables = [("seen_profiles" if "FROM seen_profiles" in statement else "match_view_history")
+                  for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+        assert tables[:2] == ["seen_profiles", "match_view_history"]
+
+    def test_first_merge_tolerates_concurrent_insert(self, repo):
+        engine = repo.session.get_bind()
+        statements = []
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def concurrent_search(conn, cursor, statement, parameters, context, executemany):
+            if "seen_profiles" not in statement or statements:
+                return
+            statements.append(statement)
+            # Другой поиск создает строку сразу после первого обращения к seen_profiles
+            cursor.connection.execute(
+                "INSERT OR IGNORE INTO seen_profiles (user_id, bitmap, updated_at) VALUES (?, ?, ?)",
+                (1, RoaringBitmap([3]).to_bytes(), datetime.now().isoformat(" "))
+            )
+
+        assert repo.mark_seen(1, [5])
+
+        assert statements[0].lstrip().upper().startswith("INSERT")
+        assert 5 in repo.get_seen_profiles(1)
+        assert repo.session.query(SeenProfiles).count() == 1
+
+    def test_record_views_of_carousel_page(self, repo):
+        repo.add_to_view_history(1, 5)
+
+        assert repo.record_views(1, [5, 6, 1, 100, 6], source="search")
+
+        history = repo.session.query(MatchViewHistory).order_by(MatchViewHistory.viewed_user_id).all()
+        assert [(view.viewed_user_id, view.source) for view in history] == [(5, None), (6, "search"), (100, "search")]
+        assert list(repo.get_seen_profiles(1)) == [5, 6, 100]
+        assert repo.session.get(User, 100) is not None  # найденный в VK профиль без строки users
+
+    def test_backfill_creates_missing_rows(self, repo):
+        now = datetime.now()
+        # История, накопленная до включения SEEN_PROFILES_BITMAP
+        repo.session.add_all([MatchViewHistory(user_id=user_id, viewed_user_id=viewed_id, viewed_at=now)
+                               for user_id, viewed_id in ((1, 5), (1, 6), (2, 7), (3, 8))])
+        repo.session.commit()
+        repo.mark_seen(3, [9])
+
+        assert repo.backfill_seen_profiles(batch_size=1) == 2
+        assert repo.backfill_seen_profiles() == 0
+
+        assert list(repo.get_seen_profiles(1)) == [5, 6]
+        assert list(repo.get_seen_profiles(2)) == [7]
+        assert list(repo.get_seen_profiles(3)) == [9]  # существующее множество не трогается
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from config.settings import settings
+from core.bot_core import DatingBot
+
+
+def _message(user_id, text):
+    return {'type': 'message_new', 'object': {'message': {'from_id': user_id, 'text': text}}}
+
+
+class _Handler:
+    """Обработчик-заглушка: записывает порядок событий, текст "ждать" ждет событие другого пользователя"""
+
+    def __init__(self):
+        self.order = []
+        self.released = None
+
+    async def handle(self, event):
+        message = event['object']['message']
+        if self.released is None:
+            self.released = asyncio.Event()
+        if message['text'] == "ждать":
+            await asyncio.wait_for(self.released.wait(), timeout=5)
+        elif message['text'] == "медленно":
+            await asyncio.sleep(0.05)
+        else:
+            self.released.set()
+        self.order.append((message['from_id'], message['text']))
+        return True
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    for name in ('VKClient', 'OutboundQueue', 'UserRepository'):
+        monkeypatch.setattr(f'core.bot_core.{name}', MagicMock())
+    monkeypatch.setattr(settings, 'RANKING_WORKERS', 0)
+    bot = DatingBot()
+    bot.message_handler = _Handler()
+    yield bot
+    if bot._loop_thread.is_alive():
+        bot.close()
+
+
+class TestEventLoop:
+
+    def test_users_are_handled_concurrently(self, bot):
+        waiting = bot.handle_raw(_message(1, "ждать"))
+        # Если бы события шли по одному, первое ждало бы второе до таймаута
+        assert bot.handle_raw(_message(2, "отпустить")).result(timeout=5)
+        assert waiting.result(timeout=5)
+        assert bot.message_handler.order == [(2, "отпустить"), (1, "ждать")]
+
+    def test_same_user_keeps_order(self, bot):
+        futures = [bot.handle_raw(_message(1, text)) for text in ("медленно", "второе", "медленно", "третье")]
+        for future in futures:
+            future.result(timeout=5)
+        assert [text for _, text in bot.message_handler.order] == ["медленно", "второе", "медленно", "третье"]
+        assert bot._user_tails == {}
+
+    def test_unknown_event_ignored(self, bot):
+        assert bot.handle_raw({'type': 'group_join', 'object': {}}) is None
+
+    def test_close_waits_for_accepted_events(self, bot):
+        futures = [bot.handle_raw(_message(user_id, "медленно")) for user_id in range(5)]
+        bot.close()
+        assert all(future.done() for future in futures)
+        assert len(bot.message_handler.order) == 5
+        assert not bot._loop_thread.is_alive()
+        bot.outbox.stop.assert_called_once()
+
+    def test_concurrency_is_bounded(self, bot):
+        bot._slots = threading.BoundedSemaphore(1)
+        first = bot.handle_raw(_message(1, "медленно"))
+        started = time.perf_counter()
+        bot.handle_raw(_message(2, "медленно")).result(timeout=5)
+        assert first.done()
+        assert time.perf_counter() - started >= 0.05
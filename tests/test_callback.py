@@ -0,0 +1,173 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from config import constants
+from handlers.callback import CallbackHandler
+
+
+def _event(payload, **extra):
+    return {
+        'type': 'message_event',
+        'object': {
+            'user_id': 1, 'peer_id': 1, 'event_id': 'abc', 'conversation_message_id': 77,
+            'payload': json.dumps(payload), **extra
+        }
+    }
+
+
+class TestCallbackHandler:
+
+    def _handler(self):
+        vk = MagicMock()
+        vk.send_message = AsyncMock()
+        vk.answer_event = AsyncMock()
+        vk.edit_message = AsyncMock()
+        vk.get_top_photos.return_value = ['photo2_1']
+        repo = MagicMock()
+        return CallbackHandler(vk, repo), vk, repo
+
+    def test_add_favorite_answers_with_snackbar(self):
+        handler, vk, repo = self._handler()
+        repo.add_favorite.return_value = (True, True)
+
+        result = asyncio.run(handler.handle(_event({'command': 'add_favorite', 'favorite_id': 2})))
+
+        assert result == {"result": "success"}
+        vk.answer_event.assert_awaited_once_with(
+            event_id='abc', user_id=1, peer_id=1, snackbar=constants.Messages.FAVORITE_ADDED)
+        vk.send_message.assert_not_called()
+
+    def test_show_next_edits_in_place(self):
+        handler, vk, repo = self._handler()
+        repo.get_next_match.return_value = {'id': 2, 'first_name': 'Анна', 'last_name': 'Иванова'}
+
+        asyncio.run(handler.handle(_event({'command': 'show_next', 'match_id': 5})))
+
+        vk.edit_message.assert_awaited_once()
+        assert vk.edit_message.await_args.kwargs['conversation_message_id'] == 77
+        vk.send_message.assert_not_called()
+        vk.answer_event.assert_awaited_once_with(event_id='abc', user_id=1, peer_id=1, snackbar=None)
+
+    def test_show_next_falls_back_to_new_message(self):
+        handler, vk, repo = self._handler()
+        repo.get_next_match.return_value = {'id': 2, 'first_name': 'Анна', 'last_name': 'Иванова'}
+        vk.edit_message.side_effect = Exception("message can't be edited")
+
+        asyncio.run(handler.handle(_event({'command': 'show_next', 'match_id': 5})))
+
+        vk.send_message.assert_awaited_once()
+
+    def test_like_photo_recorded_without_vk_call(self):
+        handler, vk, repo = self._handler()
+        repo.toggle_photo_like.return_value = (True, True)
+
+        result = asyncio.run(handler.handle(_event({'command': 'like_photo', 'photo_id': 'photo2_1'})))
+
+        assert result == {"result": "success"}
+        repo.toggle_photo_like.assert_called_once_with(1, 'photo2_1')
+        assert not vk.like_photo.called
+        vk.answer_event.assert_awaited_once_with(
+            event_id='abc', user_id=1, peer_id=1, snackbar=constants.Messages.PHOTO_LIKED)
+        vk.send_message.assert_not_called()
+
+    def test_unlike_photo_sends_notice(self):
+        handler, vk, repo = self._handler()
+        repo.toggle_photo_like.return_value = (True, False)
+
+        asyncio.run(handler.handle(_event({'command': 'like_photo', 'photo_id': 'photo2_1'})))
+
+        assert vk.answer_event.await_args.kwargs['snackbar'] == constants.Messages.PHOTO_LIKED
+        vk.send_message.assert_awaited_once_with(user_id=1, message=constants.Messages.PHOTO_UNLIKED)
+
+    def test_like_photo_rejected(self):
+        handler, vk, repo = self._handler()
+        repo.toggle_photo_like.return_value = (False, False)
+
+        result = asyncio.run(handler.handle(_event({'command': 'like_photo', 'photo_id': 'photo2_1'})))
+
+        assert result == {"result": "error"}
+        vk.send_message.assert_awaited_once_with(user_id=1, message=constants.Messages.CALLBACK_ERROR)
+
+    def test_error_still_acknowledged(self):
+        handler, vk, repo = self._handler()
+        repo.toggle_photo_like.side_effect = RuntimeError("db down")
+
+        result = asyncio.run(handler.handle(_event({'command': 'like_photo', 'photo_id': 'photo2_1'})))
+
+        assert result["result"] == "error"
+        vk.answer_event.assert_awaited_once()
+        vk.send_message.assert_awaited_once_with(user_id=1, message=constants.Messages.CALLBACK_ERROR)
+
+    def test_invalid_payload_answered_with_error(self):
+        handler, vk, repo = self._handler()
+
+        result = asyncio.run(handler.handle(_event({'command': 'drop_tables'})))
+
+        assert result["result"] == "error"
+        vk.answer_event.assert_awaited_once_with(
+            event_id='abc', user_id=1, peer_id=1, snackbar=constants.Messages.CALLBACK_ERROR)
+
+    def test_event_answered_before_handler_runs(self):
+        handler, vk, repo = self._handler()
+        calls = []
+        vk.answer_event.side_effect = lambda **kwargs: calls.append('answer')
+        repo.get_next_match.side_effect = lambda *args: calls.append('db') or None
+
+        result = asyncio.run(handler.handle(_event({'command': 'show_next', 'match_id': 5})))
+
+        assert calls == ['answer', 'db']
+        assert result == {"result": "no_more_matches"}
+        vk.send_message.assert_awaited_once_with(user_id=1, message=constants.Messages.NO_MATCHES)
+
+    def test_existing_favorite_sends_notice(self):
+        handler, vk, repo = self._handler()
+        repo.add_favorite.return_value = (False, "Пользователь уже в избранном")
+
+        result = asyncio.run(handler.handle(_event({'command': 'add_favorite', 'favorite_id': 2})))
+
+        assert result == {"result": "already_exists"}
+        vk.send_message.assert_awaited_once_with(user_id=1, message=constants.Messages.FAVORITE_EXISTS)
+
+    def test_search_page_edits_carousel(self):
+        from services.search_results import search_results
+        handler, vk, repo = self._handler()
+        search_results.save(1, [{'id': i, 'first_name': 'Анна', 'last_name': 'Иванова'} for i in range(15)])
+        search_results.next_page(1)
+
+        asyncio.run(handler.handle(_event({'command': 'search_page'})))
+
+        template = vk.edit_message.await_args.kwargs['template']
+        assert len(template['elements']) == 5
+        repo.record_views.assert_called_once_with(1, list(range(10, 15)), source="search")
+        search_results.discard(1)
+
+    @pytest.mark.parametrize("command, method", [
+        ('favorites_page', 'get_favorites_page'),
+        ('blacklist_page', 'get_blacklist_page'),
+        ('history_page', 'get_view_history_page'),
+    ])
+    def test_list_page_passes_cursor_and_adds_next_button(self, command, method):
+        handler, vk, repo = self._handler()
+        getattr(repo, method).return_value = ([], 'NEXT')
+
+        result = asyncio.run(handler.handle(_event({'command': command, 'cursor': 'CUR'})))
+
+        assert result == {"result": "success"}
+        getattr(repo, method).assert_called_once_with(1, cursor='CUR')
+        keyboard = vk.edit_message.await_args.kwargs['keyboard']
+        button = keyboard['buttons'][-1][0]['action']
+        assert json.loads(button['payload']) == {'command': command, 'cursor': 'NEXT'}
+        vk.send_message.assert_not_called()
+
+    def test_last_list_page_has_no_next_button(self):
+        handler, vk, repo = self._handler()
+        repo.get_blacklist_page.return_value = ([{'user_id': 1, 'banned_id': 5, 'created_at': '2026-01-01'}], None)
+
+        asyncio.run(handler.handle(_event({'command': 'blacklist_page', 'cursor': 'CUR'})))
+
+        kwargs = vk.edit_message.await_args.kwargs
+        assert kwargs['keyboard'] is None
+        assert kwargs['message'] == 'https://vk.com/id5'
@@ -0,0 +1,48 @@
+import pickle
+from datetime import date
+
+from core.matching import MatchFinder
+from core.vk_api.models.candidate import Candidate
+from services.interests import CommonInterestEngine
+
+RAW = {
+    'id': 42, 'first_name': 'Анна', 'last_name': 'Иванова', 'sex': 1, 'bdate': '15.6.1995',
+    'city': {'id': 2, 'title': 'Санкт-Петербург'}, 'photo_id': '42_456239017',
+    'interests': 'фотография, путешествия', 'music': 'джаз', 'groups': [{'id': 10}],
+    'is_closed': False, 'can_write_private_message': 1,
+}
+
+
+class TestCandidate:
+
+    def test_age_precomputed_from_bdate(self):
+        candidate = Candidate.from_raw(RAW, today=date(2024, 6, 14))
+        assert candidate.age == 28
+        assert Candidate.from_raw(RAW, today=date(2024, 6, 15)).age == 29
+        assert candidate.bdate == '15.6.1995'
+        assert Candidate.from_raw({**RAW, 'bdate': '15.6'}).age is None
+
+    def test_dict_compatible_access(self):
+        candidate = Candidate.from_raw(RAW)
+        assert candidate['id'] == 42
+        assert candidate.get('city') == {'id': 2, 'title': 'Санкт-Петербург'}
+        assert candidate.get('books', '') == ''
+        assert 'photo_id' in candidate and 'domain' not in candidate
+        assert candidate.has_photo and not candidate.is_closed
+        assert MatchFinder._get_city_id(candidate) == 2
+
+    def test_slots_and_compact(self):
+        candidate = Candidate.from_raw(RAW)
+        assert not hasattr(candidate, '__dict__')
+        compact = candidate.compact()
+        assert compact.interests is None and compact.age == candidate.age
+        assert candidate.interests == 'фотография, путешествия'
+
+    def test_interest_engine_reads_candidate(self):
+        engine = CommonInterestEngine()
+        user = {'id': 1, 'interests': 'путешествия', 'music': 'джаз', 'groups': [{'id': 10}]}
+        assert engine.score(user, Candidate.from_raw(RAW)) == engine.score(user, RAW)
+
+    def test_pickle_roundtrip(self):
+        candidate = pickle.loads(pickle.dumps(Candidate.from_raw(RAW)))
+        assert candidate.age == Candidate.from_raw(RAW).age and candidate.music == 'джаз'
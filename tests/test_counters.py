@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from core.db.counters import CounterReconciliation, reconcile_counters
+from core.db.models import Base, Blacklist, Favorite, PhotoLike, User, UserCounters
+from core.db.repositories import UserRepository
+
+
+@pytest.fixture
+def factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add_all([User(id=user_id) for user_id in range(1, 20)])
+    session.commit()
+    session.close()
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def repo(factory):
+    repo = UserRepository(factory())
+    yield repo
+    repo.close()
+
+
+class TestMaintainedCounters:
+
+    def test_counters_follow_writes(self, repo):
+        for target in (2, 3, 4):
+            repo.add_favorite(1, target)
+        repo.remove_favorite(1, 3)
+        repo.add_to_blacklist(1, 5)
+        repo.toggle_photo_like(1, "a")
+        repo.toggle_photo_like(1, "b")
+        repo.toggle_photo_like(1, "b")
+
+        assert repo.get_counters(1) == {"favorites": 2, "blacklist": 1, "photo_likes": 1}
+        assert repo.remove_from_blacklist(1, 5)
+        assert repo.count_blacklist(1) == 0
+        assert repo.get_counters(2) == {"favorites": 0, "blacklist": 0, "photo_likes": 0}
+
+    def test_rejected_write_keeps_counter(self, repo):
+        repo.add_favorite(1, 2)
+        assert not repo.add_favorite(1, 2)[0]
+        assert not repo.add_favorite(1, 1)[0]
+        assert not repo.remove_favorite(1, 9)
+        assert repo.count_favorites(1) == 1
+
+    def test_count_is_primary_key_lookup(self, repo):
+        repo.add_favorite(1, 2)
+        statements = []
+        event.listen(repo.session.get_bind(), "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        assert repo.count_favorites(1) == 1
+        assert repo.count_photo_likes(1) == 0
+
+        assert len(statements) == 2
+        assert all("count(" not in statement.lower() and "user_counters" in statement for statement in statements)
+
+
+class TestReconciliation:
+
+    def test_fixes_drift_and_missing_rows(self, factory, repo):
+        repo.add_favorite(1, 2)
+        session = factory()
+        # Записи в обход репозитория
+        session.add_all([Favorite(user_id=1, favorite_id=3), Blacklist(user_id=4, banned_id=5),
+                         PhotoLike(user_id=4, photo_id="x", liked=True), PhotoLike(user_id=4, photo_id="y", liked=False)])
+        session.commit()
+
+        assert reconcile_counters(session, batch_size=3) == 2
+        assert reconcile_counters(session, batch_size=3) == 0
+        session.close()
+
+        assert repo.get_counters(1) == {"favorites": 2, "blacklist": 0, "photo_likes": 0}
+        assert repo.get_counters(4) == {"favorites": 0, "blacklist": 1, "photo_likes": 1}
+
+    def test_selected_users_only(self, factory):
+        session = factory()
+        session.add_all([Favorite(user_id=1, favorite_id=2), Favorite(user_id=3, favorite_id=2)])
+        session.commit()
+
+        assert reconcile_counters(session, user_ids=[3]) == 1
+        assert [row.user_id for row in session.query(UserCounters)] == [3]
+        session.close()
+
+    def test_background_job(self, factory):
+        session = factory()
+        session.add(Blacklist(user_id=2, banned_id=3))
+        session.commit()
+        session.close()
+
+        assert CounterReconciliation(session_factory=factory).reconcile() == 1
@@ -0,0 +1,74 @@
+import json
+import re
+from array import array
+from unittest.mock import MagicMock, patch
+
+from core.vk_api.groups import GroupCache, GroupFetcher, intersection, intersection_size, jaccard, to_group_array
+
+
+def _api(groups):
+    """api.execute, выполняющий сгенерированные вызовы API.groups.get"""
+    api = MagicMock()
+
+    def execute(code):
+        calls = re.findall(r"API\.groups\.get\((\{.*?\})\)", code)
+        return [
+            {'count': len(groups[args['user_id']]), 'items': groups[args['user_id']]}
+            if args['user_id'] in groups else False
+            for args in map(json.loads, calls)
+        ]
+
+    api.execute.side_effect = execute
+    return api
+
+
+class TestGroupArrays:
+
+    def test_sorted_unique_uint32(self):
+        groups = to_group_array([30, 10, 20, 10])
+        assert groups.typecode == 'I' and list(groups) == [10, 20, 30]
+
+    def test_intersection_merge_and_bisect_paths(self):
+        small, large = to_group_array([5, 500, 1999]), to_group_array(range(0, 2000, 5))
+        assert list(intersection(small, large)) == [5, 500]
+        assert list(intersection(large, small)) == [5, 500]
+        other = to_group_array(range(0, 2000, 3))
+        assert intersection_size(large, other) == len(set(range(0, 2000, 5)) & set(range(0, 2000, 3)))
+
+    def test_jaccard(self):
+        assert jaccard(to_group_array([1, 2, 3]), to_group_array([2, 3, 4])) == 0.5
+        assert jaccard(array('I'), to_group_array([1])) == 0.0
+
+
+class TestGroupFetcher:
+
+    def test_batches_through_execute(self):
+        api = _api({user_id: [user_id % 7, 100 + user_id % 3] for user_id in range(60)})
+        fetcher = GroupFetcher(api, cache=GroupCache())
+
+        result = fetcher.fetch(range(60))
+
+        assert api.execute.call_count == 3  # пачки по 25
+        assert list(result[10]) == [3, 101]
+        assert all(groups.typecode == 'I' for groups in result.values())
+
+    def test_uses_cache_and_caches_private_profiles(self):
+        api = _api({1: [10, 20]})
+        fetcher = GroupFetcher(api, cache=GroupCache())
+
+        first = fetcher.fetch([1, 2])
+        second = fetcher.fetch([2, 1, 1])
+
+        assert api.execute.call_count == 1
+        assert list(first[2]) == [] and second[1] is first[1]
+
+    def test_cache_ttl_and_lru(self):
+        cache = GroupCache(max_users=2, ttl=10)
+        with patch('core.vk_api.groups.time.monotonic', return_value=100.0):
+            cache.put(1, array('I', [1]))
+            cache.put(2, array('I', [2]))
+            cache.get(1)
+            cache.put(3, array('I', [3]))
+            assert cache.get(2) is None and list(cache.get(1)) == [1]
+        with patch('core.vk_api.groups.time.monotonic', return_value=111.0):
+            assert cache.get(1) is None
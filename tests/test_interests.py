@@ -0,0 +1,58 @@
+from services.interests import CommonInterestEngine, tokenize
+
+
+class TestCommonInterestEngine:
+
+    def test_tokenize_normalizes_and_drops_stopwords(self):
+        tokens = tokenize("Люблю музыку и книги, музыка - это жизнь")
+
+        assert 'и' not in tokens.lemmas
+        assert 'это' not in tokens.lemmas
+        # Разные формы одного слова сводятся к одной основе
+        assert len({lemma for lemma in tokens.lemmas if lemma.startswith('музык')}) == 1
+
+    def test_tokenize_is_cached(self):
+        assert tokenize("рок, джаз") is tokenize("рок, джаз")
+
+    def test_common_items_ranked_by_field_weight(self):
+        engine = CommonInterestEngine()
+        user = {'id': 1, 'interests': 'путешествия, фотография', 'music': 'рок',
+                'groups': [{'id': 10, 'name': 'Python'}, {'id': 11, 'name': 'Кино'}]}
+        match = {'id': 2, 'interests': 'фотографии', 'music': 'рок, джаз',
+                 'groups': [{'id': 10, 'name': 'Python'}]}
+
+        common = engine.common_items(user, match)
+
+        assert common[0] == ('interests', 'фотография')
+        assert ('music', 'рок') in common
+        assert ('groups', 'Python') in common
+        assert ('groups', 'Кино') not in common
+
+    def test_profile_features_cached_per_user(self):
+        engine = CommonInterestEngine()
+        profile = {'id': 1, 'interests': 'спорт'}
+
+        assert engine.profile_features(profile) is engine.profile_features(profile)
+
+        profile['interests'] = 'кино'
+        assert engine.profile_features(profile)['interests'] == tokenize('кино')
+
+    def test_cache_tracks_group_ids_not_count(self):
+        engine = CommonInterestEngine()
+        profile = {'id': 1, 'interests': 'спорт', 'groups': [10, 20]}
+        assert engine.profile_features(profile)['groups'] == {10, 20}
+
+        profile['groups'] = [10, 30]
+        assert engine.profile_features(profile)['groups'] == {10, 30}
+
+    def test_non_numeric_group_ids_skipped(self):
+        engine = CommonInterestEngine()
+        features = engine.profile_features({'groups': [10, 'club_name', None, {'id': '20', 'name': 'Кино'}, {}]})
+
+        assert features['groups'] == {10, 20}
+        assert features['group_names'] == {20: 'Кино'}
+
+    def test_score_without_overlap_is_zero(self):
+        engine = CommonInterestEngine()
+        assert engine.score({'interests': 'спорт'}, {'interests': 'кино'}) == 0
+        assert engine.score({'interests': ''}, {}) == 0
@@ -0,0 +1,35 @@
+import json
+import logging
+
+from benchmarks import load
+
+
+class TestLoadSmoke:
+
+    def test_help_command_report(self, tmp_path, capsys):
+        output = tmp_path / "load.json"
+
+        load.main(["--chatters", "2", "--messages", "2", "--commands", "помощь", "--population", "50",
+                   "--timeout", "5", "--no-client-throttle", "--output", str(output)])
+
+        report = json.loads(output.read_text(encoding="utf-8"))
+        assert json.loads(capsys.readouterr().out) == report
+        assert (report["completed"], report["timeouts"], report["errors"]) == (4, 0, {})
+        assert set(report["latency_ms"]) == {"p50", "p95", "p99", "max"}
+        assert report["latency_ms"]["p50"] is not None and report["events_per_sec"] > 0
+        assert report["api_calls"]["messages.send"] == 4
+
+    def test_handler_errors_are_reported(self):
+        collector = load.ErrorCollector()
+        logger = logging.getLogger("handlers.message")
+        logger.addHandler(collector)
+        try:
+            try:
+                raise ConnectionError("connection refused\nIs the server running?")
+            except ConnectionError as e:
+                logger.error(f"Message handling error: {e}", exc_info=True)
+            logger.warning("not an error")
+        finally:
+            logger.removeHandler(collector)
+
+        assert collector.errors == {"ConnectionError: connection refused": 1}
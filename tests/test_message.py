@@ -0,0 +1,71 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from vk_api.bot_longpoll import VkBotEventType
+
+from benchmarks.fake_vk import FakeVKServer, SyntheticPopulation, redirect_session
+from core.matching import MatchFinder
+from core.vk_api.client import VKClient
+from handlers.message import MessageHandler
+from services.analyzer import InterestAnalyzer
+from services.search_results import search_results
+
+USER_ID = 500000000
+
+
+def _message(text, user_id=USER_ID):
+    return {'type': VkBotEventType.MESSAGE_NEW, 'object': {'message': {'from_id': user_id, 'text': text}}}
+
+
+@pytest.fixture
+def server():
+    with FakeVKServer(population=SyntheticPopulation(size=300)) as server:
+        yield server
+
+
+def _client(server):
+    client = VKClient("x" * 85)
+    redirect_session(client.session.http, server.base_url)
+    client.session.RPS_DELAY = 0
+    return client
+
+
+class TestSearchCommand:
+
+    def test_search_sends_one_carousel(self, server):
+        vk, user_vk = _client(server), _client(server)
+        repo = MagicMock()
+        repo.get_excluded_ids.return_value = {USER_ID}
+        repo.get_like_counts.return_value = {}
+        finder = MatchFinder(user_vk, user_vk, repo)
+        finder.analyzer = InterestAnalyzer()
+        handler = MessageHandler(vk, repo, finder)
+
+        try:
+            assert asyncio.run(handler.handle(_message("найти")))
+        finally:
+            search_results.discard(USER_ID)
+
+        assert len(server.sent_messages) == 1
+        template = json.loads(server.sent_messages[0]["template"])
+        assert template["type"] == "carousel" and template["elements"]
+        # Фото и группы короткого списка - пакетно через execute
+        assert server.stats.get("photos.get", 0) == 0
+        assert server.stats["execute"] <= 4
+        assert server.stats["users.search"] == 1
+        # Карточки карусели записаны как просмотренные
+        shown = [int(element["action"]["link"].rsplit("id", 1)[1]) for element in template["elements"]]
+        repo.record_views.assert_called_once_with(USER_ID, shown, source="search")
+
+    def test_no_matches_message(self, server):
+        vk = _client(server)
+        finder = MagicMock()
+        finder.find_matches_async = MagicMock(return_value=asyncio.sleep(0, result=[]))
+        handler = MessageHandler(vk, MagicMock(), finder)
+
+        assert asyncio.run(handler.handle(_message("найти")))
+
+        assert [message["template"] for message in server.sent_messages] == [None]
+        assert finder.find_matches_async.call_args.args[0] == USER_ID
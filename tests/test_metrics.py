@@ -0,0 +1,110 @@
+import asyncio
+import os
+from unittest.mock import MagicMock
+
+import pytest
+from vk_api.exceptions import ApiError
+
+from core.metrics import MetricsRegistry, timed, VK_API_ERRORS, VK_RATE_LIMIT_WAIT
+from core.vk_api.client import VKClient
+
+
+class TestMetrics:
+
+    def test_histogram_render(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_latency_seconds", "test", ("method",), buckets=(0.1, 1.0))
+
+        histogram.observe(0.05, method="get")
+        histogram.observe(0.5, method="get")
+        histogram.observe(5, method="get")
+
+        text = registry.render()
+        assert '# TYPE test_latency_seconds histogram' in text
+        assert 'test_latency_seconds_bucket{method="get",le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{method="get",le="1.0"} 2' in text
+        assert 'test_latency_seconds_bucket{method="get",le="+Inf"} 3' in text
+        assert 'test_latency_seconds_count{method="get"} 3' in text
+
+    def test_timed_sync_and_async(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("calls_seconds", "test", ("method",))
+        errors = registry.counter("calls_errors_total", "test", ("method",))
+
+        @timed(histogram, errors)
+        def sync_call():
+            raise ValueError
+
+        @timed(histogram, errors)
+        async def async_call():
+            return 42
+
+        try:
+            sync_call()
+        except ValueError:
+            pass
+        assert asyncio.run(async_call()) == 42
+
+        assert histogram.count(method="sync_call") == 1
+        assert histogram.count(method="async_call") == 1
+        assert errors.value(method="sync_call") == 1
+
+
+class TestWorkerObservability:
+
+    def _start(self, monkeypatch, worker_id):
+        import bot
+        monkeypatch.setattr(bot.settings, 'METRICS_PORT', 9100)
+        monkeypatch.setattr(bot.settings, 'METRICS_DUMP_PATH', '/tmp/metrics.prom')
+        monkeypatch.setattr(bot.settings, 'PROFILE_DIR', 'profiles')
+        server, dumper, profiler = MagicMock(), MagicMock(), MagicMock()
+        monkeypatch.setattr(bot, 'start_metrics_server', server)
+        monkeypatch.setattr(bot, 'MetricsDumper', dumper)
+        monkeypatch.setattr(bot, 'profiler', profiler)
+        assert bot.start_observability(worker_id) is dumper.return_value
+        return server, dumper, profiler
+
+    def test_single_process(self, monkeypatch):
+        server, dumper, profiler = self._start(monkeypatch, None)
+        server.assert_called_once_with(9100)
+        assert dumper.call_args.args[0] == '/tmp/metrics.prom'
+        assert profiler.output_dir == 'profiles'
+        profiler.install_signal_handler.assert_called_once()
+
+    def test_worker_gets_own_port_dump_and_profiles(self, monkeypatch):
+        server, dumper, profiler = self._start(monkeypatch, 2)
+        server.assert_called_once_with(9103)
+        assert dumper.call_args.args[0] == '/tmp/metrics.prom.worker-2'
+        assert profiler.output_dir == os.path.join('profiles', 'worker-2')
+        profiler.install_signal_handler.assert_called_once()
+
+
+def _response(payload):
+    response = MagicMock(ok=True)
+    response.json.return_value = payload
+    return response
+
+
+class TestVkSessionMetrics:
+
+    def test_api_errors_are_counted(self):
+        client = VKClient("x" * 85)
+        client.session.http.post = MagicMock(return_value=_response(
+            {'error': {'error_code': 100, 'error_msg': 'bad param'}}))
+        before = VK_API_ERRORS.value(method='users.search', code=100)
+
+        with pytest.raises(ApiError):
+            client.search_users({'count': 1})
+
+        assert VK_API_ERRORS.value(method='users.search', code=100) == before + 1
+
+    def test_rate_limit_wait_is_recorded(self):
+        client = VKClient("x" * 85)
+        client.session.RPS_DELAY = 0.05
+        client.session.http.post = MagicMock(return_value=_response({'response': {'items': []}}))
+        before = VK_RATE_LIMIT_WAIT.count()
+
+        client.search_users({'count': 1})
+        client.search_users({'count': 1})
+
+        assert VK_RATE_LIMIT_WAIT.count() == before + 1
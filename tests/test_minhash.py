@@ -0,0 +1,62 @@
+import numpy as np
+
+from services.interests import CommonInterestEngine
+from services.minhash import EMPTY, MinHasher
+
+
+class TestMinHasher:
+
+    def test_signature_is_fixed_size_uint32(self):
+        hasher = MinHasher(num_perm=64)
+        signature = hasher.signature(range(500))
+        assert signature.dtype == np.uint32 and signature.shape == (64,)
+        assert np.array_equal(signature, hasher.signature(reversed(range(500))))
+
+    def test_estimate_close_to_exact_jaccard(self):
+        hasher = MinHasher(num_perm=256)
+        groups1, groups2 = set(range(0, 300)), set(range(150, 450))
+        exact = len(groups1 & groups2) / len(groups1 | groups2)
+        estimate = hasher.jaccard(hasher.signature(groups1), hasher.signature(groups2))
+        assert abs(estimate - exact) < 0.1
+
+    def test_identical_disjoint_and_empty(self):
+        hasher = MinHasher()
+        signature = hasher.signature([1, 2, 3])
+        assert hasher.jaccard(signature, hasher.signature([3, 2, 1])) == 1.0
+        assert hasher.jaccard(signature, hasher.signature(range(1000, 1100))) < 0.05
+        empty = hasher.signature([])
+        assert hasher.is_empty(empty) and empty[0] == EMPTY
+        assert hasher.jaccard(empty, empty) == 0.0
+
+    def test_batch_matches_pairwise(self):
+        hasher = MinHasher()
+        signature = hasher.signature(range(100))
+        signatures = [hasher.signature(range(start, start + 100)) for start in (0, 30, 60, 200)]
+        signatures.append(hasher.signature([]))
+
+        batch = hasher.batch_jaccard(signature, signatures)
+
+        assert batch.tolist() == [hasher.jaccard(signature, other) for other in signatures]
+        assert batch[0] == 1.0 and batch[-1] == 0.0
+        assert hasher.batch_jaccard(signature, []).tolist() == []
+
+
+class TestGroupSimilarity:
+
+    def test_engine_batch_equals_pairwise_score(self):
+        engine = CommonInterestEngine()
+        user = {'id': 1, 'groups': list(range(100))}
+        candidates = [{'id': 10 + i, 'groups': list(range(i * 20, i * 20 + 100))} for i in range(5)]
+
+        batch = engine.group_similarities(user, candidates)
+
+        assert batch[0] == 1.0
+        assert batch == sorted(batch, reverse=True)
+        for candidate, group_similarity in zip(candidates, batch):
+            assert engine.score(user, candidate, group_similarity) == engine.score(user, candidate)
+
+    def test_exact_overlap_for_display(self):
+        engine = CommonInterestEngine()
+        user = {'id': 1, 'groups': [{'id': 10, 'name': 'Python'}, {'id': 11, 'name': 'Кино'}]}
+        candidate = {'id': 2, 'groups': [{'id': 10, 'name': 'Python'}]}
+        assert engine.common_items(user, candidate) == [('groups', 'Python')]
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.db.migrations import (backfill_like_edges, backfill_mutual_favorites, backfill_photo_owners,
+                                backfill_user_counters)
+from core.db.models import Base, Blacklist, Favorite, PhotoLike, PhotoLikeEdge, User
+from core.db.repositories import UserRepository
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=user_id) for user_id in range(1, 10)])
+    session.commit()
+    session.close()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def repo(engine):
+    repo = UserRepository(sessionmaker(bind=engine)())
+    yield repo
+    repo.close()
+
+
+def _flags(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        return {(fav.user_id, fav.favorite_id): fav.is_mutual for fav in session.query(Favorite)}
+    finally:
+        session.close()
+
+
+class TestMutualFlag:
+
+    def test_reverse_add_marks_both(self, engine, repo):
+        repo.add_favorite(1, 2)
+        assert _flags(engine) == {(1, 2): False}
+
+        repo.add_favorite(2, 1)
+        assert _flags(engine) == {(1, 2): True, (2, 1): True}
+        assert repo.get_mutual_favorites(1) == [2]
+
+    def test_remove_clears_reverse(self, engine, repo):
+        repo.add_favorite(1, 2)
+        repo.add_favorite(2, 1)
+
+        assert repo.remove_favorite(1, 2)
+        assert _flags(engine) == {(2, 1): False}
+        assert repo.get_mutual_favorites(2) == []
+
+    def test_listener_called_once_per_pair(self, repo):
+        calls = []
+        repo.add_mutual_listener(lambda user_id, favorite_id: calls.append((user_id, favorite_id)))
+
+        repo.add_favorite(1, 2)
+        repo.add_favorite(3, 2)
+        assert calls == []
+
+        repo.add_favorite(2, 1)
+        assert calls == [(2, 1)]
+
+    def test_failing_listener_keeps_favorite(self, engine, repo):
+        repo.add_mutual_listener(lambda *_: 1 / 0)
+        repo.add_favorite(1, 2)
+
+        assert repo.add_favorite(2, 1)[0]
+        assert _flags(engine)[(2, 1)]
+
+
+class TestMutualBackfill:
+
+    def test_marks_existing_pairs_and_clears_stale_flags(self, engine):
+        session = sessionmaker(bind=engine)()
+        # Записи до появления флага и флаг, оставшийся без обратной записи
+        session.add_all([Favorite(user_id=1, favorite_id=2), Favorite(user_id=2, favorite_id=1),
+                         Favorite(user_id=3, favorite_id=4), Favorite(user_id=5, favorite_id=6, is_mutual=True)])
+        session.commit()
+        session.close()
+
+        with engine.begin() as connection:
+            assert backfill_mutual_favorites(connection) == 3
+        with engine.begin() as connection:
+            assert backfill_mutual_favorites(connection) == 0
+
+        assert _flags(engine) == {(1, 2): True, (2, 1): True, (3, 4): False, (5, 6): False}
+
+
+class TestDerivedDataBackfill:
+
+    def test_owners_edges_and_counters(self, engine):
+        session = sessionmaker(bind=engine)()
+        # Данные до появления owner_id, photo_like_edges и user_counters
+        session.add_all([
+            PhotoLike(user_id=1, photo_id="photo2_1", liked=True),
+            PhotoLike(user_id=1, photo_id="photo2_2", liked=True),
+            PhotoLike(user_id=1, photo_id="photo3_1", liked=False),
+            PhotoLike(user_id=2, photo_id="photo-5_1", liked=True),
+            PhotoLike(user_id=2, photo_id="не фото", liked=True),
+            PhotoLikeEdge(liker_id=3, owner_id=4, likes_count=2, updated_at=datetime(2026, 1, 1)),
+            Favorite(user_id=1, favorite_id=2), Blacklist(user_id=1, banned_id=3),
+        ])
+        session.commit()
+        session.close()
+
+        with engine.begin() as connection:
+            assert backfill_photo_owners(connection, batch_size=2) == 4
+            assert backfill_like_edges(connection) == 3
+            assert backfill_user_counters(connection) == 9
+        with engine.begin() as connection:
+            assert backfill_photo_owners(connection) == 0
+            assert backfill_like_edges(connection) == 0
+            assert backfill_user_counters(connection) == 0
+
+        repo = UserRepository(sessionmaker(bind=engine)())
+        edges = {(edge.liker_id, edge.owner_id): edge.likes_count for edge in repo.session.query(PhotoLikeEdge)}
+        assert edges == {(1, 2): 2, (2, -5): 1, (3, 4): 0}
+        assert repo.get_counters(1) == {"favorites": 1, "blacklist": 1, "photo_likes": 2}
+        assert repo.get_counters(2) == {"favorites": 0, "blacklist": 0, "photo_likes": 2}
+        repo.close()
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+
+import pytest
+from vk_api.exceptions import ApiError
+
+from config.settings import settings
+from core.vk_api.client import VKClient
+from core.vk_api.outbox import OutboundQueue, Priority
+
+
+class _FakeMessages:
+    """messages.send, который держит первый вызов до сигнала и может падать по сценарию"""
+
+    def __init__(self, failures=()):
+        self.calls = []
+        self.failures = list(failures)
+        self.release = threading.Event()
+        self.first_call = threading.Event()
+
+    def send(self, **params):
+        self.calls.append(params)
+        self.first_call.set()
+        self.release.wait(5)
+        if self.failures:
+            raise self.failures.pop(0)
+        return len(self.calls)
+
+
+class _FakeApi:
+    def __init__(self, failures=()):
+        self.messages = _FakeMessages(failures)
+
+
+def _api_error(code):
+    return ApiError(None, 'messages.send', {}, {}, {'error_code': code, 'error_msg': 'error'})
+
+
+class TestOutboundQueue:
+
+    def test_interactive_first_and_coalesced(self):
+        api = _FakeApi()
+        outbox = OutboundQueue(api, backoff=0).start()
+
+        outbox.send(1, "первое")
+        assert api.messages.first_call.wait(5)
+        outbox.send(2, "уведомление", priority=Priority.NOTIFICATION)
+        outbox.send(3, "ответ 1", attachment="photo1_1")
+        outbox.send(3, "ответ 2", keyboard={"buttons": []}, attachment=["photo1_2"])
+        api.messages.release.set()
+        outbox.stop(5)
+
+        assert [call.get('peer_id') for call in api.messages.calls] == [1, 3, 2]
+        merged = api.messages.calls[1]
+        assert merged['message'] == "ответ 1\n\nответ 2"
+        assert merged['attachment'] == "photo1_1,photo1_2"
+        assert 'keyboard' in merged
+
+    def test_keyboards_are_not_merged(self):
+        api = _FakeApi()
+        api.messages.release.set()
+        outbox = OutboundQueue(api)
+        outbox.send(1, "a", keyboard={"one_time": True})
+        outbox.send(1, "b", keyboard={"one_time": False})
+        outbox.send(1, "c")
+        outbox.start().stop(5)
+
+        assert [call['message'] for call in api.messages.calls] == ["a", "b\n\nc"]
+
+    def test_retry_keeps_random_id(self):
+        api = _FakeApi(failures=[_api_error(6)])
+        api.messages.release.set()
+        outbox = OutboundQueue(api, backoff=0.01).start()
+        future = outbox.send(1, "привет")
+
+        assert future.result(5) == 2
+        outbox.stop(5)
+        assert api.messages.calls[0]['random_id'] == api.messages.calls[1]['random_id']
+
+    def test_permanent_error_is_not_retried(self):
+        api = _FakeApi(failures=[_api_error(901)])
+        api.messages.release.set()
+        outbox = OutboundQueue(api, backoff=0.01).start()
+        future = outbox.send(1, "привет")
+
+        with pytest.raises(ApiError):
+            future.result(5)
+        outbox.stop(5)
+        assert len(api.messages.calls) == 1
+
+    def test_broadcast_uses_peer_ids(self):
+        api = _FakeApi()
+        api.messages.release.set()
+        outbox = OutboundQueue(api).start()
+        futures = outbox.broadcast(list(range(1, 251)), "новости")
+        outbox.stop(5)
+
+        assert len(futures) == 3
+        assert [len(call['peer_ids'].split(',')) for call in api.messages.calls] == [100, 100, 50]
+
+    def test_retried_message_is_not_merged(self):
+        api = _FakeApi(failures=[_api_error(6)])
+        outbox = OutboundQueue(api, backoff=0.05).start()
+
+        outbox.send(1, "первое")
+        assert api.messages.first_call.wait(5)
+        api.messages.release.set()
+        outbox.send(1, "второе")
+        outbox.stop(5)
+
+        first = [call for call in api.messages.calls if call['message'] == "первое"]
+        assert len(first) == 2
+        assert first[0]['random_id'] == first[1]['random_id']
+
+    def test_pending_retry_holds_same_peer_only(self):
+        api = _FakeApi(failures=[_api_error(6)])
+        outbox = OutboundQueue(api, backoff=0.1).start()
+
+        outbox.send(1, "первое")
+        assert api.messages.first_call.wait(5)
+        outbox.send(1, "второе", keyboard={"buttons": []})
+        outbox.send(2, "другому")
+        api.messages.release.set()
+        outbox.stop(5)
+
+        assert [call['message'] for call in api.messages.calls] == ["первое", "другому", "первое", "второе"]
+
+    def test_caller_random_id_is_kept_and_not_merged(self):
+        api = _FakeApi()
+        api.messages.release.set()
+        outbox = OutboundQueue(api)
+        outbox.send(1, "a")
+        outbox.send(1, "b", random_id=12345)
+        outbox.send(1, "c")
+        outbox.start().stop(5)
+
+        assert [call['message'] for call in api.messages.calls] == ["a", "b", "c"]
+        assert api.messages.calls[1]['random_id'] == 12345
+
+
+class TestClientWithOutbox:
+
+    def test_send_message_returns_queued_random_id(self):
+        api = _FakeApi()
+        api.messages.release.set()
+        outbox = OutboundQueue(api)
+        client = VKClient("x" * 85, outbox=outbox)
+
+        random_id = asyncio.run(client.send_message(1, "привет"))
+        # Повтор после ошибки очереди уходит с тем же random_id
+        assert asyncio.run(client.send_message(1, "привет", random_id=random_id)) == random_id
+        outbox.start().stop(5)
+
+        assert [call['random_id'] for call in api.messages.calls] == [random_id, random_id]
+
+    def test_messages_without_random_id_are_merged(self):
+        api = _FakeApi()
+        api.messages.release.set()
+        outbox = OutboundQueue(api)
+        client = VKClient("x" * 85, outbox=outbox)
+
+        random_ids = [asyncio.run(client.send_message(1, text)) for text in ("a", "b", "c")]
+        outbox.start().stop(5)
+
+        assert [call['message'] for call in api.messages.calls] == ["a\n\nb\n\nc"]
+        assert api.messages.calls[0]['random_id'] == random_ids[0]
+
+
+class TestSendRate:
+
+    def test_rate_is_shared_between_workers(self, monkeypatch):
+        single = VKClient("x" * 85).session.RPS_DELAY
+        monkeypatch.setattr(settings, 'BOT_WORKERS', 4)
+        assert VKClient("x" * 85).session.RPS_DELAY == pytest.approx(single * 4)
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.db.models import Base, Favorite, MatchViewHistory, User
+from core.db.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from core.db.records import FavoriteRecord
+from core.db.repositories import UserRepository, _FAVORITES_PAGE
+
+
+class TestKeysetCursor:
+
+    def test_round_trip(self):
+        timestamp = datetime(2025, 5, 29, 23, 56, 26, 123456)
+
+        cursor = encode_cursor(timestamp, 987654)
+
+        assert decode_cursor(cursor) == (timestamp, 987654)
+
+    def test_cursor_fits_button_payload(self):
+        cursor = encode_cursor(datetime(2099, 12, 31, 23, 59, 59, 999999), 2 ** 31 - 1)
+
+        assert len(cursor) < 40
+        assert cursor.replace('-', '').replace('_', '').isalnum()
+
+    def test_empty_cursor_means_first_page(self):
+        assert decode_cursor(None) is None
+        assert decode_cursor('') is None
+
+    def test_invalid_cursor(self):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('не-курсор')
+
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def repo():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=user_id) for user_id in range(1, 10)])
+    # Избранные 2 и 3 добавлены в одну и ту же секунду: порядок между ними решает id
+    session.add_all([Favorite(user_id=1, favorite_id=target, added_at=added_at) for target, added_at in (
+        (2, NOW), (3, NOW), (4, NOW - timedelta(hours=1)), (5, NOW + timedelta(hours=1)), (6, NOW - timedelta(days=1))
+    )])
+    session.add_all([MatchViewHistory(user_id=1, viewed_user_id=target, viewed_at=NOW) for target in (7, 8, 9)])
+    session.commit()
+    repo = UserRepository(session)
+    yield repo
+    repo.close()
+    engine.dispose()
+
+
+def _favorites_pages(repo, limit):
+    pages, cursor = [], None
+    while True:
+        items, cursor = repo.get_favorites_page(1, limit=limit, cursor=cursor)
+        pages.append([item["favorite_id"] for item in items])
+        if cursor is None:
+            return pages
+
+
+class TestKeysetPage:
+
+    def test_pages_in_descending_order(self, repo):
+        # Среди равных added_at первой идет запись с большим id
+        assert _favorites_pages(repo, limit=2) == [[5, 3], [2, 4], [6]]
+
+    def test_timestamp_ties_split_across_pages(self, repo):
+        history = [repo.get_view_history_page(1, limit=1)]
+        while history[-1][1]:
+            history.append(repo.get_view_history_page(1, limit=1, cursor=history[-1][1]))
+
+        assert [item["viewed_user_id"] for items, _ in history for item in items] == [9, 8, 7]
+
+    def test_last_page_has_no_cursor(self, repo):
+        items, cursor = repo.get_favorites_page(1, limit=5)
+
+        assert len(items) == 5
+        assert cursor is None
+
+    def test_empty_list(self, repo):
+        assert repo.get_blacklist_page(1) == ([], None)
+
+    def test_invalid_cursor_rejected(self, repo):
+        with pytest.raises(InvalidCursorError):
+            repo._get_page(1, _FAVORITES_PAGE, FavoriteRecord, 2, 'не-курсор')
+        # Публичный метод не падает, а отдает пустую страницу
+        assert repo.get_favorites_page(1, cursor='не-курсор') == ([], None)
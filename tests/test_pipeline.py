@@ -0,0 +1,167 @@
+import asyncio
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from vk_api.exceptions import ApiError
+
+from core.matching import MatchFinder
+from services.analyzer import InterestAnalyzer
+
+USER = {'id': 1, 'age': 27, 'sex': 1, 'city': {'id': 2, 'title': 'Санкт-Петербург'},
+        'interests': 'фотография, путешествия', 'music': 'джаз', 'books': ''}
+
+
+def _raw(user_id, age=27, city=2, **fields):
+    raw = {'id': user_id, 'first_name': 'Имя', 'last_name': 'Фамилия', 'sex': 2,
+           'bdate': f'1.1.{datetime.now().year - age - 1}', 'city': {'id': city, 'title': 'Город'},
+           'interests': 'путешествия', 'music': 'рок'}
+    raw.update(fields)
+    return raw
+
+
+def _finder(pages, excluded=(), photos=None, groups=None):
+    vk = MagicMock()
+    vk.search_users.side_effect = lambda params: {
+        'items': pages[params['offset'] // 100] if params['offset'] // 100 < len(pages) else []
+    }
+    user_vk = MagicMock()
+    user_vk.get_user_info.return_value = USER
+    photos = photos or (lambda owner_id: [{'id': 1, 'owner_id': owner_id}])
+    user_vk.get_top_photos_bulk.side_effect = lambda user_ids: {user_id: photos(user_id) for user_id in user_ids}
+    groups = groups or (lambda user_id: [])
+    user_vk.get_groups_bulk.side_effect = lambda user_ids: {user_id: groups(user_id) for user_id in user_ids}
+    repo = MagicMock()
+    repo.get_excluded_ids.return_value = set(excluded) | {USER['id']}
+    repo.get_like_counts.return_value = {}
+    finder = MatchFinder(vk, user_vk, user_repo=repo)
+    finder.analyzer = InterestAnalyzer()  # словарь обучается при поиске, общий анализатор не трогаем
+    return finder
+
+
+class TestCandidatePipeline:
+
+    def test_cheap_filters_run_before_fetches(self):
+        page = [
+            _raw(10), _raw(11, is_closed=True), _raw(12, bdate='1.1'), _raw(13, city=99),
+            _raw(14), _raw(10), _raw(15),
+        ]
+        finder = _finder([page], excluded={14})
+
+        matches = finder.find_matches(USER['id'])
+
+        assert sorted(candidate.id for _, candidate in matches) == [10, 15]
+        finder.user_vk.get_top_photos_bulk.assert_called_once()
+        assert sorted(finder.user_vk.get_top_photos_bulk.call_args.args[0]) == [10, 15]
+
+    def test_stops_paging_when_enough_good_candidates(self):
+        pages = [[_raw(100 + i) for i in range(100)], [_raw(200 + i) for i in range(100)]]
+        finder = _finder(pages)
+
+        matches = finder.find_matches(USER['id'])
+
+        assert finder.vk.search_users.call_count == 1
+        assert len(matches) == 30
+        assert len(finder.user_vk.get_top_photos_bulk.call_args.args[0]) == 30
+
+    def test_only_shortlist_gets_expensive_calls(self):
+        # Близкие по возрасту лучше по предварительному рейтингу и попадают в короткий список
+        page = [_raw(100 + i, age=22 + i % 11) for i in range(100)]
+        finder = _finder([page])
+
+        matches = finder.find_matches(USER['id'])
+
+        # Фото и группы короткого списка и самого пользователя - пакетными запросами
+        finder.user_vk.get_top_photos_bulk.assert_called_once()
+        assert len(finder.user_vk.get_top_photos_bulk.call_args.args[0]) == 30
+        # Группы короткого списка и самого пользователя - одним пакетным запросом
+        finder.user_vk.get_groups_bulk.assert_called_once()
+        assert len(finder.user_vk.get_groups_bulk.call_args.args[0]) == 31
+        assert all(abs(candidate.age - USER['age']) <= 3 for _, candidate in matches)
+
+    def test_groups_from_enrichment_affect_final_score(self):
+        finder = _finder([[_raw(10), _raw(11)]],
+                         groups=lambda user_id: [7] if user_id in (USER['id'], 11) else [])
+
+        matches = finder.find_matches(USER['id'])
+
+        assert [candidate.id for _, candidate in matches] == [11, 10]
+        assert matches[0][1].groups == [7]
+
+    def test_candidates_without_photos_are_skipped(self):
+        finder = _finder([[_raw(10), _raw(11)]],
+                         photos=lambda owner_id: [] if owner_id == 11 else [{'id': 5, 'owner_id': owner_id}])
+
+        matches = finder.find_matches(USER['id'])
+
+        assert [candidate.id for _, candidate in matches] == [10]
+        assert matches[0][1].photos == [{'id': 5, 'owner_id': 10}]
+
+    def test_top_photo_becomes_card_photo(self):
+        finder = _finder([[_raw(10, photo_id='10_1')]], photos=lambda owner_id: [{'id': 7, 'owner_id': owner_id}])
+
+        candidate = finder.find_matches(USER['id'])[0][1]
+
+        # photo_id - горячее поле и переживает compact() в результатах поиска
+        assert candidate.compact().photo_id == '10_7'
+
+    def test_failed_photo_request_keeps_search_photo(self):
+        finder = _finder([[_raw(10, photo_id='10_1'), _raw(11)]])
+        finder.user_vk.get_top_photos_bulk.side_effect = ApiError(
+            None, 'execute', {}, {}, {'error_code': 6, 'error_msg': 'too many requests'})
+
+        matches = finder.find_matches(USER['id'])
+
+        assert [(candidate.id, candidate.photo_id) for _, candidate in matches] == [(10, '10_1')]
+
+    def test_async_search_does_not_block_event_loop(self):
+        finder = _finder([[_raw(10), _raw(11)]])
+        search = finder.vk.search_users.side_effect
+
+        def slow_search(params):
+            time.sleep(0.2)
+            return search(params)
+
+        finder.vk.search_users.side_effect = slow_search
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.02)
+
+        async def main():
+            return (await asyncio.gather(finder.find_matches_async(USER['id']), ticker()))[0]
+
+        matches = asyncio.run(main())
+
+        assert sorted(candidate.id for _, candidate in matches) == [10, 11]
+        # Цикл событий обслуживал другие задачи, пока шел запрос к VK
+        assert ticks[-1] - ticks[0] < 0.2
+
+    def test_shortlist_keeps_search_order_on_ties(self):
+        scored = iter([(0.2, 'a'), (0.9, 'b'), (0.2, 'c'), (0.5, 'd'), (0.1, 'e')])
+        assert MatchFinder._shortlist(scored, size=3, good_score=1.0) == ['b', 'd', 'a']
+
+    def test_shortlist_stops_consuming_stream(self):
+        scored = iter([(0.9, 'a'), (0.8, 'b'), (0.1, 'c')])
+        assert MatchFinder._shortlist(scored, size=2, good_score=0.5) == ['a', 'b']
+        assert next(scored) == (0.1, 'c')
+
+
+class TestProfileParsing:
+
+    def test_malformed_bdate_has_no_age(self):
+        for bdate in ('1.1', '1.1.19xx', '..', '', None):
+            assert MatchFinder._get_age({'bdate': bdate}) is None
+        assert MatchFinder._get_age({'bdate': '1.1.2000'}) == datetime.now().year - 2000
+
+    def test_search_params_from_users_get_profile(self):
+        finder = _finder([])
+        profile = {'id': 1, 'sex': 2, 'bdate': '5.6.1995', 'city': {'id': 2, 'title': 'Санкт-Петербург'}}
+
+        params = finder._search_params(profile)
+        age = datetime.now().year - 1995
+        assert (params['age_from'], params['age_to'], params['sex'], params['city']) == (age - 5, age + 5, 1, 2)
+        # Без года рождения и города поиск идет без этих ограничений
+        assert {'age_from', 'age_to', 'city'}.isdisjoint(finder._search_params({'id': 1, 'bdate': '5.6'}))
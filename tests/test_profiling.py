@@ -0,0 +1,162 @@
+import asyncio
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.profiling import SamplingProfiler
+
+
+def _busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def _spin(duration: float):
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        sum(range(100))
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = SamplingProfiler(output_dir=str(tmp_path), interval=0.001)
+    yield profiler
+    profiler.stop()
+
+
+class TestCollapsedOutput:
+
+    def test_write_sorts_by_count(self, tmp_path):
+        path = os.path.join(tmp_path, "out.collapsed")
+
+        SamplingProfiler._write(path, Counter({"main;a (x.py:1)": 2, "main;b (x.py:5)": 5}))
+
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "main;b (x.py:5) 5\nmain;a (x.py:1) 2\n"
+
+    def test_collapse_goes_from_root_to_leaf(self, profiler):
+        def leaf():
+            return profiler._collapse(sys._getframe())
+
+        stack = leaf()
+
+        assert stack[-1] == f"leaf (test_profiling.py:{leaf.__code__.co_firstlineno})"
+        assert "test_collapse_goes_from_root_to_leaf" in stack[-2]
+
+    def test_samples_are_tagged_with_command(self, profiler):
+        stop = threading.Event()
+        path = profiler.start(0.1)
+
+        def worker():
+            with profiler.tag("найти"):
+                _busy(stop)
+
+        thread = threading.Thread(target=worker, name="tagged-worker")
+        thread.start()
+        time.sleep(0.05)
+        profiler.stop()
+        stop.set()
+        thread.join()
+
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines and all(re.fullmatch(r".+ \d+", line) for line in lines)
+        tagged = [line for line in lines if line.startswith("tagged-worker;[найти];")]
+        assert tagged and any("_busy (test_profiling.py:" in line for line in tagged)
+        assert profiler.last_output == path
+        assert not profiler.active and profiler._tags == {}
+
+    def test_tags_follow_coroutines_on_shared_loop(self, profiler):
+        def tagged_work():
+            _spin(0.05)
+
+        def untagged_work():
+            _spin(0.05)
+
+        async def tagged():
+            with profiler.tag("найти"):
+                tagged_work()
+                # Пока метка открыта, задача ждет, а цикл выполняет другую
+                await asyncio.sleep(0.1)
+
+        async def untagged():
+            await asyncio.sleep(0)
+            untagged_work()
+
+        async def main():
+            await asyncio.gather(tagged(), untagged())
+
+        path = profiler.start(5)
+        asyncio.run(main())
+        profiler.stop()
+
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f.read().splitlines() if line.startswith("MainThread;")]
+        assert any("tagged_work" in line and "untagged_work" not in line for line in lines)
+        for line in lines:
+            if "untagged_work" in line:
+                assert "[найти]" not in line
+            elif "tagged_work" in line:
+                assert line.startswith("MainThread;[найти];")
+
+    def test_tag_is_noop_while_inactive(self, profiler):
+        with profiler.tag("найти"):
+            assert profiler._tags == {}
+
+
+class TestSignalHandler:
+
+    @pytest.fixture
+    def restore_sigusr1(self):
+        if not hasattr(signal, "SIGUSR1"):
+            pytest.skip("SIGUSR1 is not available")
+        previous = signal.getsignal(signal.SIGUSR1)
+        yield signal.SIGUSR1
+        signal.signal(signal.SIGUSR1, previous)
+
+    def test_recording_starts_outside_handler(self, profiler, restore_sigusr1):
+        threads = []
+        profiler.start = MagicMock(side_effect=lambda duration: threads.append(threading.current_thread().name))
+        forwarded = MagicMock()
+        assert profiler.install_signal_handler(0.1, on_signal=forwarded)
+
+        signal.getsignal(restore_sigusr1)(restore_sigusr1, None)
+        # Обработчик только взводит событие, запись запускает отдельный поток
+        deadline = time.monotonic() + 5
+        while not threads and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert threads == ["profiler-trigger"]
+        profiler.start.assert_called_once_with(0.1)
+        forwarded.assert_called_once()
+
+    def test_signal_writes_profile(self, profiler, restore_sigusr1):
+        profiler.install_signal_handler(0.05)
+
+        os.kill(os.getpid(), restore_sigusr1)
+        deadline = time.monotonic() + 5
+        while profiler.last_output is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert profiler.last_output and os.path.exists(profiler.last_output)
+
+    def test_second_install_replaces_forwarding(self, profiler, restore_sigusr1):
+        started = threading.Event()
+        profiler.start = MagicMock(side_effect=lambda duration: started.set())
+        forwarded = MagicMock()
+        # Как в bot.py: сначала start_observability, затем run_supervisor с пересылкой
+        profiler.install_signal_handler(0.1)
+        profiler.install_signal_handler(0.2, on_signal=forwarded)
+
+        signal.getsignal(restore_sigusr1)(restore_sigusr1, None)
+
+        assert started.wait(5)
+        forwarded.assert_called_once()
+        profiler.start.assert_called_once_with(0.2)
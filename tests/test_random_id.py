@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from core.vk_api.random_id import RandomIdGenerator
+
+
+class TestRandomIdGenerator:
+
+    def test_unique_within_same_second(self):
+        generator = RandomIdGenerator(clock=lambda: 1700000000)
+        ids = [generator.next_id() for _ in range(10000)]
+        assert len(set(ids)) == len(ids)
+        assert all(0 < random_id < 2 ** 31 for random_id in ids)
+
+    def test_unique_across_threads(self):
+        generator = RandomIdGenerator(clock=lambda: 1700000000)
+        results = []
+
+        def worker():
+            results.extend(generator.next_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(results)) == 8000
+
+    def test_workers_do_not_collide(self):
+        first = RandomIdGenerator(worker_id=1, clock=lambda: 1700000000)
+        second = RandomIdGenerator(worker_id=2, clock=lambda: 1700000000)
+        assert not {first.next_id() for _ in range(1000)} & {second.next_id() for _ in range(1000)}
+
+    def test_reuse_for_retry(self):
+        generator = RandomIdGenerator()
+        original = generator()
+        assert generator(reuse=original) == original
+        assert generator() != original
+
+    def test_worker_id_range(self):
+        with pytest.raises(ValueError):
+            RandomIdGenerator(worker_id=32)
@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from core.matching import MatchFinder
+from core.ranking import RankingExecutor
+from services.analyzer import InterestAnalyzer
+
+USER = {'id': 1, 'age': 27, 'sex': 1, 'city': {'id': 2, 'title': 'Санкт-Петербург'},
+        'interests': 'фотография, путешествия', 'music': 'джаз', 'books': 'фантастика',
+        'groups': [{'id': 10, 'name': 'Фотоклуб'}]}
+
+
+def _candidates():
+    candidates = []
+    for i in range(60):
+        candidates.append({
+            'id': 100 + i,
+            'bdate': f'1.1.{1990 + i % 15}',
+            'city': {'id': 2 if i % 3 else 1},
+            'interests': ['путешествия', 'кино', 'фотографии'][i % 3],
+            'music': 'джаз' if i % 4 == 0 else 'рок',
+            'books': '',
+            'groups': [{'id': 10}] if i % 5 == 0 else [],
+        })
+    return candidates
+
+
+class TestRankingExecutor:
+
+    def _inline(self, like_counts, analyzer=None):
+        repo = MagicMock()
+        repo.get_like_counts.return_value = like_counts
+        finder = MatchFinder(None, None, user_repo=repo)
+        finder.analyzer = analyzer or InterestAnalyzer()
+        return finder._rank_candidates(USER, _candidates())
+
+    def test_matches_inline_ranking(self):
+        like_counts = {100: 3, 107: 1}
+        with RankingExecutor(workers=2, chunk_size=7) as executor:
+            ranked = asyncio.run(executor.rank(USER, _candidates(), like_counts))
+
+        expected = self._inline(like_counts)
+        assert [c['id'] for _, c in ranked] == [c['id'] for _, c in expected]
+        assert [round(s, 9) for s, _ in ranked] == [round(s, 9) for s, _ in expected]
+
+    def test_uses_preloaded_vectorizer(self):
+        analyzer = InterestAnalyzer()
+        vectorizer = analyzer.fit(InterestAnalyzer.profile_text(c) for c in _candidates() + [USER])
+
+        with RankingExecutor(workers=1, vectorizer=vectorizer) as executor:
+            ranked = asyncio.run(executor.rank(USER, _candidates()))
+
+        expected = self._inline({}, analyzer)
+        assert [c['id'] for _, c in ranked] == [c['id'] for _, c in expected]
+
+    def test_pool_does_not_fork_threaded_process(self):
+        with RankingExecutor(workers=1) as executor:
+            assert executor._get_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+    def test_empty_candidates(self):
+        with RankingExecutor(workers=1) as executor:
+            assert asyncio.run(executor.rank(USER, [])) == []
+
+    def test_fits_vectorizer_before_starting_pool(self):
+        analyzer = InterestAnalyzer()
+        repo = MagicMock()
+        repo.get_like_counts.return_value = {}
+        with RankingExecutor(workers=1, analyzer=analyzer) as executor:
+            finder = MatchFinder(None, None, user_repo=repo, executor=executor)
+            finder.analyzer = analyzer
+            finder._collect_candidates = lambda user_info, excluded=None: (user_info, _candidates())
+            ranked = asyncio.run(finder.find_matches_async(USER['id'], USER))
+
+            assert analyzer.fitted
+            assert executor._pool_vectorizer is analyzer.vectorizer
+
+        expected = self._inline({}, analyzer)
+        assert [round(s, 9) for s, _ in ranked] == [round(s, 9) for s, _ in expected]
+        # Вес 'text' действительно участвует в рейтинге
+        assert [round(s, 9) for s, _ in ranked] != [round(s, 9) for s, _ in self._inline({}, InterestAnalyzer())]
+
+    def test_pool_restarts_once_vectorizer_is_fitted(self):
+        analyzer = InterestAnalyzer()
+        with RankingExecutor(workers=1, analyzer=analyzer) as executor:
+            asyncio.run(executor.rank(USER, _candidates()))
+            assert executor._pool_vectorizer is None
+
+            analyzer.fit(InterestAnalyzer.profile_text(c) for c in _candidates() + [USER])
+            ranked = asyncio.run(executor.rank(USER, _candidates()))
+            assert executor._pool_vectorizer is analyzer.vectorizer
+
+        assert [c['id'] for _, c in ranked] == [c['id'] for _, c in self._inline({}, analyzer)]
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.repositories import identity_map_entries, orm_favorites, orm_favorites_page, walk_pages
+from core.db.models import Base, Blacklist, Favorite, MatchViewHistory, PhotoLike, User
+from core.db.records import FavoriteRecord
+from core.db.repositories import UserRepository
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def repo():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=user_id) for user_id in range(1, 30)])
+    session.add_all([
+        Favorite(user_id=1, favorite_id=target, added_at=NOW - timedelta(hours=target))
+        for target in range(2, 22)
+    ])
+    session.add_all([Blacklist(user_id=1, banned_id=25, created_at=NOW)])
+    session.add_all([MatchViewHistory(user_id=1, viewed_user_id=26, viewed_at=NOW)])
+    session.add_all([
+        PhotoLike(user_id=1, photo_id="photo5_1", owner_id=5, liked=True, created_at=NOW),
+        PhotoLike(user_id=1, photo_id="photo6_1", owner_id=6, liked=False, created_at=NOW),
+    ])
+    session.commit()
+    session.expunge_all()
+    yield UserRepository(session)
+    session.close()
+    engine.dispose()
+
+
+class TestCoreReadPath:
+
+    def test_favorites_records(self, repo):
+        favorites = repo.get_favorites(1, limit=5, offset=2)
+
+        assert all(isinstance(fav, FavoriteRecord) for fav in favorites)
+        assert [fav.favorite_id for fav in favorites] == [4, 5, 6, 7, 8]
+        assert favorites[0].as_dict() == {
+            "user_id": 1, "favorite_id": 4, "added_at": (NOW - timedelta(hours=4)).isoformat()
+        }
+
+    def test_same_result_as_orm_path(self, repo):
+        assert [fav.as_dict() for fav in repo.get_favorites(1, limit=100)] == orm_favorites(repo.session, 1, 100)
+
+    def test_no_identity_map_entries(self, repo):
+        assert identity_map_entries(repo.session, lambda: repo.get_favorites(1)) == 0
+        assert identity_map_entries(repo.session, lambda: orm_favorites(repo.session, 1, 100)) == 20
+
+    def test_other_lists(self, repo):
+        assert [item.banned_id for item in repo.get_blacklist(1)] == [25]
+        assert repo.get_view_history(1)[0].as_dict() == {"viewed_user_id": 26, "viewed_at": NOW.isoformat()}
+        assert repo.get_photo_likes(1) == {"photo5_1": True, "photo6_1": False}
+        assert len(repo.session.identity_map) == 0
+
+    def test_statement_compiled_once(self, repo):
+        hits = []
+        engine = repo.session.get_bind()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            hits.append(context.cache_hit)
+
+        repo.get_favorites(1, limit=3)
+        repo.get_favorites(1, limit=7, offset=1)
+        repo.get_favorites(2, limit=10)
+
+        assert hits[1:] == [CacheStats.CACHE_HIT, CacheStats.CACHE_HIT]
+
+    def test_page_same_result_as_orm_path(self, repo):
+        first, cursor = repo.get_favorites_page(1, limit=7)
+
+        assert (first, cursor) == orm_favorites_page(repo.session, 1, 7, None)
+        assert repo.get_favorites_page(1, limit=7, cursor=cursor) == orm_favorites_page(repo.session, 1, 7, cursor)
+        assert walk_pages(lambda page: repo.get_favorites_page(1, limit=7, cursor=page)) == 3
+
+    def test_page_statements_compiled_once(self, repo):
+        hits = []
+        engine = repo.session.get_bind()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            hits.append(context.cache_hit)
+
+        _, cursor = repo.get_favorites_page(1, limit=3)
+        repo.get_favorites_page(1, limit=3, cursor=cursor)
+        repo.get_favorites_page(2, limit=5)
+        repo.get_favorites_page(1, limit=5, cursor=cursor)
+
+        # Первый вызов каждого из двух запросов компилируется, остальные берутся из кэша
+        assert hits[2:] == [CacheStats.CACHE_HIT, CacheStats.CACHE_HIT]
+        assert identity_map_entries(repo.session, lambda: repo.get_blacklist_page(1)) == 0
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.db.models import Base, MatchViewHistory, User
+from core.db.repositories import UserRepository
+from core.db.retention import ViewHistoryRetention, delete_in_batches
+
+NOW = datetime.now()
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add_all([User(id=user_id) for user_id in range(1, 31)])
+    # Пользователь 1 смотрел 2..21 с интервалом в 10 дней, пользователь 2 - 22..30 сегодня
+    session.add_all([
+        MatchViewHistory(user_id=1, viewed_user_id=viewed_id, viewed_at=NOW - timedelta(days=10 * (viewed_id - 2)))
+        for viewed_id in range(2, 22)
+    ])
+    session.add_all([MatchViewHistory(user_id=2, viewed_user_id=viewed_id, viewed_at=NOW) for viewed_id in range(22, 31)])
+    session.commit()
+    session.close()
+    yield factory
+    engine.dispose()
+
+
+def _count(factory, **filters):
+    session = factory()
+    try:
+        return session.query(MatchViewHistory).filter_by(**filters).count()
+    finally:
+        session.close()
+
+
+class TestViewHistoryRetention:
+
+    def test_purge_deletes_only_expired_rows(self, session_factory):
+        retention = ViewHistoryRetention(45, batch_size=4, pause=0, session_factory=session_factory)
+        deleted = retention.purge(now=NOW)
+
+        # Старше 45 дней: просмотры 50, 60, ..., 190 дней назад
+        assert deleted == 15
+        assert _count(session_factory, user_id=1) == 5
+        assert _count(session_factory, user_id=2) == 9
+
+    def test_batches_are_bounded(self, session_factory):
+        session = session_factory()
+        statements = []
+        original = session.execute
+
+        def execute(statement, *args, **kwargs):
+            result = original(statement, *args, **kwargs)
+            statements.append(result.rowcount)
+            return result
+
+        with patch.object(session, 'execute', side_effect=execute):
+            deleted = delete_in_batches(session, MatchViewHistory, MatchViewHistory.user_id == 1, batch_size=6)
+
+        assert deleted == 20
+        assert statements == [6, 6, 6, 2]
+        session.close()
+
+    def test_forgotten_views_resurface_in_search(self, session_factory):
+        repo = UserRepository(session_factory())
+        with patch('core.db.repositories.settings.VIEW_HISTORY_RETENTION_DAYS', 45):
+            excluded = repo.get_excluded_ids(1)
+        with patch('core.db.repositories.settings.VIEW_HISTORY_RETENTION_DAYS', None):
+            excluded_forever = repo.get_excluded_ids(1)
+        repo.session.close()
+
+        assert excluded_forever == set(range(1, 22))
+        assert excluded == set(range(1, 7))
+
+    def test_clear_view_history(self, session_factory):
+        repo = UserRepository(session_factory())
+        assert repo.clear_view_history(2)
+        repo.session.close()
+        assert _count(session_factory, user_id=2) == 0
+        assert _count(session_factory, user_id=1) == 20
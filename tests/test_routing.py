@@ -0,0 +1,158 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.db.counters import reconcile_counters
+from core.db.models import Base, Blacklist, User
+from core.db.repositories import UserRepository
+from core.db.routing import ReplicaRouter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _lag_engine(lag):
+    """Движок, на котором запрос отставания возвращает lag (или бросает исключение)"""
+    engine = MagicMock()
+    connection = engine.connect.return_value.__enter__.return_value
+    if isinstance(lag, Exception):
+        connection.execute.side_effect = lag
+    else:
+        connection.execute.return_value.scalar.return_value = lag
+    return engine
+
+
+def _router(lags, clock, **kwargs):
+    engines = {f"postgresql://u:p@replica{i}/db": _lag_engine(lag) for i, lag in enumerate(lags)}
+    kwargs.setdefault('lag_check_interval', 5)
+    kwargs.setdefault('retry_after', 30)
+    return ReplicaRouter(list(engines), sticky_seconds=5, max_lag=10, clock=clock,
+                         engine_factory=lambda dsn, **_: engines[dsn], **kwargs)
+
+
+class TestReplicaRouter:
+
+    def test_no_replicas_means_primary(self):
+        router = ReplicaRouter([])
+        router.record_write(1)
+        assert router.choose(1) is None
+
+    def test_round_robin(self):
+        router = _router([0, 0], FakeClock())
+        chosen = [router.choose(1).dsn for _ in range(4)]
+        assert chosen[0] != chosen[1] and chosen[:2] == chosen[2:]
+
+    def test_read_your_writes_window(self):
+        clock = FakeClock()
+        router = _router([0], clock)
+
+        router.record_write(1)
+        assert router.choose(1) is None
+        assert router.choose(2) is not None  # окно только для писавшего пользователя
+
+        clock.now += 5
+        assert router.choose(1) is not None
+
+    def test_expired_windows_are_pruned(self):
+        clock = FakeClock()
+        router = _router([0], clock)
+        for user_id in range(100):
+            router.record_write(user_id)
+        clock.now += 6
+        router.record_write(500)
+        assert list(router._sticky) == [500]
+
+    def test_lagging_replica_skipped(self):
+        clock = FakeClock()
+        router = _router([30, 0], clock)
+        assert {router.choose(1).dsn for _ in range(4)} == {"postgresql://u:p@replica1/db"}
+
+        lagging = router.replicas[0]
+        lagging.engine.connect.return_value.__enter__.return_value.execute.return_value.scalar.return_value = 0
+        router.choose(1)
+        assert lagging.lag == 30  # отставание перепроверяется не чаще lag_check_interval
+        clock.now += 5
+        assert {router.choose(1).dsn for _ in range(2)} == {replica.dsn for replica in router.replicas}
+        assert lagging.lag == 0
+
+    def test_all_lagging_means_primary(self):
+        router = _router([30, 60], FakeClock())
+        assert router.choose(1) is None
+
+    def test_failed_replica_cooldown(self):
+        clock = FakeClock()
+        router = _router([ConnectionError("down")], clock)
+        assert router.choose(1) is None
+
+        replica = router.replicas[0]
+        replica.engine.connect.return_value.__enter__.return_value.execute.side_effect = None
+        replica.engine.connect.return_value.__enter__.return_value.execute.return_value.scalar.return_value = 0
+        clock.now += 10
+        assert router.choose(1) is None
+        clock.now += 20
+        assert router.choose(1) is replica
+
+
+def _database(blacklisted):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id=user_id) for user_id in range(1, 10)])
+    session.add_all([Blacklist(user_id=1, banned_id=banned_id) for banned_id in blacklisted])
+    session.commit()
+    reconcile_counters(session)
+    session.close()
+    return engine
+
+
+@pytest.fixture
+def routed():
+    primary = _database([2, 3, 4])
+    replica = _database([2, 3])  # реплика еще не получила последнюю запись
+    clock = FakeClock()
+    router = ReplicaRouter(["sqlite://replica"], sticky_seconds=5, max_lag=10, clock=clock,
+                           lag_check_interval=float('inf'), retry_after=30,
+                           engine_factory=lambda dsn, **_: replica)
+    router.replicas[0].lag_checked_at = clock.now
+    repo = UserRepository(sessionmaker(bind=primary)(), router=router)
+    yield repo, router, clock, replica
+    repo.close()
+    primary.dispose()
+    replica.dispose()
+
+
+class TestRepositoryRouting:
+
+    def test_reads_go_to_replica(self, routed):
+        repo, *_ = routed
+        assert repo.count_blacklist(1) == 2
+        assert [item["banned_id"] for item in repo.get_blacklist_page(1)[0]] in ([2, 3], [3, 2])
+
+    def test_own_write_read_from_primary(self, routed):
+        repo, router, clock, _ = routed
+        assert repo.add_to_blacklist(1, 5)[0]
+
+        assert repo.count_blacklist(1) == 4
+        assert repo.count_blacklist(2) == 0
+        clock.now += 5
+        assert repo.count_blacklist(1) == 2  # окно закончилось, снова реплика
+
+    def test_replica_failure_falls_back(self, routed):
+        repo, router, clock, replica = routed
+        Base.metadata.drop_all(replica)
+
+        assert repo.count_blacklist(1) == 3
+        assert router.choose(1) is None  # реплика на паузе retry_after
+
+    def test_explicit_session_uses_primary_only(self, routed):
+        repo, *_ = routed
+        assert UserRepository(repo.session).router is None
@@ -0,0 +1,65 @@
+import json
+
+from services.formatter import ProfileFormatter
+from services.search_results import SearchResultsStore
+
+
+def _candidates(count, with_photo=True):
+    return [
+        {'id': i, 'first_name': 'Анна', 'last_name': f'№{i}', 'bdate': '1.1.2000',
+         'city': {'id': 1, 'title': 'Москва'}, **({'photo_id': f'{i}_1'} if with_photo else {})}
+        for i in range(1, count + 1)
+    ]
+
+
+class TestSearchResultsStore:
+
+    def test_pages_in_rank_order(self):
+        store = SearchResultsStore()
+        store.save(1, _candidates(23))
+
+        first = store.next_page(1)
+        second = store.next_page(1)
+        third = store.next_page(1)
+
+        assert [c['id'] for c in first.items] == list(range(1, 11))
+        assert (second.start, second.total, second.has_more) == (11, 23, True)
+        assert [c['id'] for c in third.items] == [21, 22, 23] and not third.has_more
+        assert store.next_page(1).items == []
+
+    def test_expired_and_evicted(self):
+        store = SearchResultsStore(max_users=1, ttl=0.0001)
+        store.save(1, _candidates(3))
+        store.save(2, _candidates(3))
+        assert store.next_page(1).items == []
+
+
+class TestCarousel:
+
+    def test_one_card_per_candidate(self):
+        carousel = ProfileFormatter().create_carousel(_candidates(12), has_more=True)
+
+        assert carousel['type'] == 'carousel'
+        assert len(carousel['elements']) == 10
+        card = carousel['elements'][0]
+        assert card['photo_id'] == '1_1'
+        assert card['action']['link'] == 'https://vk.com/id1'
+        commands = [json.loads(button['action']['payload'])['command'] for button in card['buttons']]
+        assert commands == ['add_favorite', 'like_photo', 'search_page']
+
+    def test_same_structure_without_photos(self):
+        candidates = _candidates(2) + _candidates(1, with_photo=False)
+        elements = ProfileFormatter().create_carousel(candidates)['elements']
+
+        assert all('photo_id' not in element for element in elements)
+        assert len({len(element['buttons']) for element in elements}) == 1
+
+    def test_bad_bdate_does_not_break_carousel(self):
+        candidates = _candidates(3)
+        candidates[0]['bdate'] = '1.1.19xx'
+        candidates[1]['bdate'] = '1.1'
+
+        elements = ProfileFormatter().create_carousel(candidates)['elements']
+
+        assert [element['description'] for element in elements[:2]] == ['Москва', 'Москва']
+        assert elements[2]['description'].endswith('лет, Москва')
@@ -0,0 +1,115 @@
+import functools
+import multiprocessing
+import os
+
+from core.sharding import ConsistentHashRing, WorkerSupervisor, event_user_id
+
+
+class _RecordingBot:
+    """Бот-заглушка: пересылает (pid, событие) в общую очередь, падает на событии crash"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def handle_raw(self, raw_event):
+        if raw_event.get("crash"):
+            os._exit(1)
+        self.results.put((os.getpid(), raw_event["object"]["user_id"], raw_event["seq"]))
+
+
+class _WorkerResources:
+    """Ресурсы процесса-обработчика из worker_init (метрики, профилировщик)"""
+
+    def __init__(self, results, worker_id):
+        self.results = results
+        self.worker_id = worker_id
+
+    def stop(self):
+        self.results.put(("stop", self.worker_id, os.getpid()))
+
+
+def _init_worker(results, worker_id):
+    results.put(("init", worker_id, os.getpid()))
+    return _WorkerResources(results, worker_id)
+
+
+def _event(user_id, seq, **extra):
+    return {"type": "message_event", "object": {"user_id": user_id}, "seq": seq, **extra}
+
+
+class TestConsistentHashRing:
+
+    def test_mapping_is_stable(self):
+        assert ConsistentHashRing([0, 1, 2]).get_node(12345) == ConsistentHashRing([0, 1, 2]).get_node(12345)
+
+    def test_keys_are_spread_across_nodes(self):
+        ring = ConsistentHashRing([0, 1, 2, 3])
+        counts = [0] * 4
+        for user_id in range(10000):
+            counts[ring.get_node(user_id)] += 1
+        assert min(counts) > 1500
+
+    def test_adding_node_moves_few_keys(self):
+        ring = ConsistentHashRing([0, 1, 2, 3])
+        before = {user_id: ring.get_node(user_id) for user_id in range(10000)}
+        ring.add_node(4)
+        moved = [user_id for user_id in before if ring.get_node(user_id) != before[user_id]]
+        assert len(moved) < 3500
+        assert all(ring.get_node(user_id) == 4 for user_id in moved)
+
+    def test_event_user_id(self):
+        assert event_user_id({"type": "message_new", "object": {"message": {"from_id": 7, "peer_id": 7}}}) == 7
+        assert event_user_id({"type": "message_event", "object": {"user_id": 8, "peer_id": 8}}) == 8
+
+
+class TestWorkerSupervisor:
+
+    def _collect(self, results, count):
+        return [results.get(timeout=10) for _ in range(count)]
+
+    def test_per_user_ordering_and_affinity(self):
+        results = multiprocessing.Queue()
+        supervisor = WorkerSupervisor(3, functools.partial(_RecordingBot, results)).start()
+        try:
+            for seq in range(20):
+                for user_id in (1, 2, 3, 4):
+                    supervisor.dispatch(_event(user_id, seq))
+            received = self._collect(results, 80)
+        finally:
+            supervisor.shutdown(timeout=10)
+
+        for user_id in (1, 2, 3, 4):
+            rows = [row for row in received if row[1] == user_id]
+            assert [seq for _, _, seq in rows] == list(range(20))
+            assert len({pid for pid, _, _ in rows}) == 1
+
+    def test_crashed_worker_is_restarted(self):
+        results = multiprocessing.Queue()
+        supervisor = WorkerSupervisor(2, functools.partial(_RecordingBot, results), check_interval=0.1).start()
+        try:
+            supervisor.dispatch(_event(1, 0, crash=True))
+            supervisor.dispatch(_event(1, 1))
+            pid, user_id, seq = results.get(timeout=10)
+        finally:
+            supervisor.shutdown(timeout=10)
+        assert (user_id, seq) == (1, 1)
+
+    def test_shutdown_drains_queues(self):
+        results = multiprocessing.Queue()
+        supervisor = WorkerSupervisor(2, functools.partial(_RecordingBot, results)).start()
+        for seq in range(50):
+            supervisor.dispatch(_event(seq, seq))
+        supervisor.shutdown(timeout=10)
+        assert len(self._collect(results, 50)) == 50
+
+    def test_worker_init_runs_in_each_worker(self):
+        results = multiprocessing.Queue()
+        supervisor = WorkerSupervisor(2, functools.partial(_RecordingBot, multiprocessing.Queue()),
+                                      worker_init=functools.partial(_init_worker, results)).start()
+        started = self._collect(results, 2)
+        supervisor.shutdown(timeout=10)
+        stopped = self._collect(results, 2)
+
+        assert sorted(worker_id for _, worker_id, _ in started) == [0, 1]
+        assert {pid for _, _, pid in started} == {pid for _, _, pid in stopped}
+        assert os.getpid() not in {pid for _, _, pid in started}
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+from benchmarks.startup import parse_importtime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLazyImports:
+
+    def test_entry_point_does_not_import_sklearn(self):
+        code = "import sys, bot; assert 'sklearn' not in sys.modules, 'sklearn imported at startup'"
+        env = dict(os.environ, POSTGRES_DB="test", POSTGRES_USER="test", POSTGRES_PASSWORD="test",
+                   VK_GROUP_TOKEN="x" * 85, VK_USER_TOKEN="x" * 85, VK_GROUP_ID="1")
+        result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+    def test_sklearn_loaded_on_first_similarity(self):
+        from services.analyzer import InterestAnalyzer
+
+        analyzer = InterestAnalyzer()
+        assert not analyzer.fitted
+        assert analyzer.calculate_similarity("музыка кино", "кино книги") > 0
+        assert 'sklearn' in sys.modules
+
+    def test_shared_analyzer(self):
+        from core.matching import MatchFinder
+        from handlers.message import MessageHandler
+        from services.analyzer import analyzer
+        from services.formatter import ProfileFormatter
+
+        assert ProfileFormatter().analyzer is analyzer
+        assert MatchFinder(MagicMock(), MagicMock()).analyzer is analyzer
+        assert MessageHandler(MagicMock(), MagicMock()).analyzer is analyzer
+
+
+class TestParseImporttime:
+
+    def test_sorted_by_self_time(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:      5000 |      80000 | sklearn\n"
+            "some other output\n"
+            "import time:       900 |       1020 | json\n"
+        )
+        assert parse_importtime(stderr, top=2) == [("sklearn", 5.0), ("json", 0.9)]
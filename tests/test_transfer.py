@@ -0,0 +1,97 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.db.models import Base, Blacklist, Favorite, PhotoLike, PhotoLikeEdge, User
+from core.db.repositories import UserRepository
+from core.db.transfer import UserDataTransfer
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def factory():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add_all([User(id=user_id) for user_id in range(1, 10)])
+    session.add_all([Favorite(user_id=1, favorite_id=target, added_at=NOW - timedelta(hours=target))
+                     for target in (2, 3, 4)])
+    session.add_all([Blacklist(user_id=1, banned_id=5, created_at=NOW)])
+    session.add_all([
+        PhotoLike(user_id=1, photo_id="photo2_1", owner_id=2, liked=True, created_at=NOW, updated_at=NOW),
+        PhotoLike(user_id=1, photo_id="photo2_2", owner_id=2, liked=True, created_at=NOW, updated_at=NOW),
+        PhotoLike(user_id=1, photo_id="photo3_1", owner_id=3, liked=False, created_at=NOW, updated_at=NOW),
+        # Встречные записи для пользователя 9, на которого переносятся данные
+        Favorite(user_id=2, favorite_id=9, added_at=NOW),
+        PhotoLike(user_id=2, photo_id="photo9_1", owner_id=9, liked=True, created_at=NOW, updated_at=NOW),
+        PhotoLikeEdge(liker_id=2, owner_id=9, likes_count=1, updated_at=NOW),
+    ])
+    session.commit()
+    session.close()
+    yield factory
+    engine.dispose()
+
+
+def _export(factory, user_id, fmt="jsonl"):
+    stream = io.StringIO()
+    with UserDataTransfer(factory(), batch_size=2) as transfer:
+        transfer.export_user_data(user_id, stream, fmt)
+    return stream.getvalue()
+
+
+def _import(factory, user_id, data, fmt="jsonl"):
+    with UserDataTransfer(factory(), batch_size=2) as transfer:
+        return transfer.import_user_data(user_id, io.StringIO(data), fmt)
+
+
+def _records(factory, user_id):
+    with UserDataTransfer(factory()) as transfer:
+        return sorted((record["kind"], str(record["target_id"]), record["created_at"], record["liked"])
+                      for record in transfer.iter_user_data(user_id))
+
+
+class TestRoundTrip:
+
+    @pytest.mark.parametrize("fmt", UserDataTransfer.FORMATS)
+    def test_export_then_import(self, factory, fmt):
+        stats = _import(factory, 9, _export(factory, 1, fmt), fmt)
+
+        assert stats == {"favorite": 3, "blacklist": 1, "photo_like": 3}
+        assert _records(factory, 9) == _records(factory, 1)
+
+    def test_repeated_import_inserts_nothing_new(self, factory):
+        data = _export(factory, 1)
+        _import(factory, 9, data)
+
+        stats = _import(factory, 9, data)
+
+        assert stats["favorite"] == 0 and stats["blacklist"] == 0
+        assert _records(factory, 9) == _records(factory, 1)
+
+    def test_derived_data_is_maintained(self, factory):
+        _import(factory, 9, _export(factory, 1))
+        repo = UserRepository(factory())
+
+        assert repo.get_mutual_favorites(9) == [2]
+        assert repo.get_mutual_favorites(2) == [9]
+        assert repo.get_mutual_likes(9) == [2]
+        assert repo.get_counters(9) == {"favorites": 3, "blacklist": 1, "photo_likes": 2}
+        edges = {edge.owner_id: edge.likes_count for edge in repo.session.query(PhotoLikeEdge).filter_by(liker_id=9)}
+        assert edges == {2: 2}
+        assert {like.photo_id: like.owner_id for like in repo.session.query(PhotoLike).filter_by(user_id=9)} == {
+            "photo2_1": 2, "photo2_2": 2, "photo3_1": 3
+        }
+        repo.close()
+
+    def test_failed_import_leaves_nothing(self, factory):
+        data = _export(factory, 1) + '{"kind": "favorite", "target_id": "не число"}\n'
+
+        with pytest.raises(ValueError):
+            _import(factory, 9, data)
+
+        assert _records(factory, 9) == []